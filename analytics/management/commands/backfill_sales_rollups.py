@@ -0,0 +1,22 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.rollups import backfill, rebuild_sales_scores
+
+
+class Command(BaseCommand):
+    help = "Recalculer les totaux de ventes journaliers depuis les commandes (toute la période par défaut)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat, help="Première date (AAAA-MM-JJ)")
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat, help="Dernière date (AAAA-MM-JJ)")
+
+    def handle(self, *args, **options):
+        date_from, date_to = options['date_from'], options['date_to']
+        if date_from and date_to and date_from > date_to:
+            raise CommandError("--from doit précéder --to")
+        counted = backfill(date_from, date_to)
+        self.stdout.write(self.style.SUCCESS(f"{counted} commande(s) comptée(s) dans les totaux journaliers."))
+        products = rebuild_sales_scores()
+        self.stdout.write(self.style.SUCCESS(f"Score des meilleures ventes recalculé pour {products} produit(s)."))
@@ -0,0 +1,25 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from analytics.search import rollup_searches
+
+
+class Command(BaseCommand):
+    help = "Regrouper les journaux de recherche par jour (hier et aujourd'hui par défaut, à lancer par cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat, help="Première date (AAAA-MM-JJ)")
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat, help="Dernière date (AAAA-MM-JJ)")
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        date_from = options['date_from'] or today - timedelta(days=1)
+        date_to = options['date_to'] or today
+        if date_from > date_to:
+            raise CommandError("--from doit précéder --to")
+        rows = rollup_searches(date_from, date_to)
+        self.stdout.write(self.style.SUCCESS(
+            f"{rows} recherche(s) distincte(s) comptée(s) du {date_from:%d/%m/%Y} au {date_to:%d/%m/%Y}."
+        ))
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(max_length=200)),
+                ('source', models.CharField(choices=[('search', 'Recherche instantanée'), ('suggestions', 'Recherche par lettre'), ('catalog', 'Catalogue')], max_length=20)),
+                ('results', models.PositiveIntegerField()),
+                ('latency_ms', models.FloatField()),
+                ('created', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailySearchQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('source', models.CharField(choices=[('search', 'Recherche instantanée'), ('suggestions', 'Recherche par lettre'), ('catalog', 'Catalogue')], max_length=20)),
+                ('query', models.CharField(max_length=200)),
+                ('searches', models.PositiveIntegerField(default=0)),
+                ('zero_results', models.PositiveIntegerField(default=0)),
+                ('total_latency_ms', models.FloatField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'source', 'query'), name='unique_daily_search_query')],
+            },
+        ),
+    ]
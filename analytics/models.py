@@ -0,0 +1,101 @@
+from django.db import models
+from orders.models import Order
+from products.models import Category, Product
+
+
+class SalesRollup(models.Model):
+    """Totaux de ventes d'une journée (date de la commande)"""
+    day = models.DateField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.PositiveIntegerField(default=0)
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class DailyProductSales(SalesRollup):
+    product = models.ForeignKey(Product, related_name='daily_sales', on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='unique_daily_product_sales'),
+        ]
+
+    def __str__(self):
+        return f'{self.day} : {self.product_id}'
+
+
+class DailyCategorySales(SalesRollup):
+    category = models.ForeignKey(Category, related_name='daily_sales', on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category'], name='unique_daily_category_sales'),
+        ]
+
+    def __str__(self):
+        return f'{self.day} : {self.category_id}'
+
+
+class DailyPaymentSales(SalesRollup):
+    payment_method = models.CharField(max_length=20, choices=Order.PAYMENT_METHOD_CHOICES)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'payment_method'], name='unique_daily_payment_sales'),
+        ]
+
+    def __str__(self):
+        return f'{self.day} : {self.payment_method}'
+
+
+class RolledUpOrder(models.Model):
+    """
+    Commande déjà comptée dans les totaux journaliers : garantit qu'une commande
+    n'est ajoutée qu'une fois, quel que soit le nombre d'enregistrements
+    """
+    order = models.OneToOneField(Order, primary_key=True, related_name='rollup', on_delete=models.CASCADE)
+    day = models.DateField(db_index=True)
+
+    def __str__(self):
+        return f'{self.order_id} ({self.day})'
+
+
+class SearchLog(models.Model):
+    """Recherche d'un client, écrite par lots (voir analytics/search.py)"""
+    SEARCH = 'search'
+    SUGGESTIONS = 'suggestions'
+    CATALOG = 'catalog'
+    SOURCE_CHOICES = [
+        (SEARCH, 'Recherche instantanée'),
+        (SUGGESTIONS, 'Recherche par lettre'),
+        (CATALOG, 'Catalogue'),
+    ]
+
+    query = models.CharField(max_length=200)
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    results = models.PositiveIntegerField()
+    latency_ms = models.FloatField()
+    created = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f'{self.query} ({self.source})'
+
+
+class DailySearchQuery(models.Model):
+    """Totaux journaliers d'une recherche normalisée"""
+    day = models.DateField()
+    source = models.CharField(max_length=20, choices=SearchLog.SOURCE_CHOICES)
+    query = models.CharField(max_length=200)
+    searches = models.PositiveIntegerField(default=0)
+    zero_results = models.PositiveIntegerField(default=0)
+    total_latency_ms = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'source', 'query'], name='unique_daily_search_query'),
+        ]
+
+    def __str__(self):
+        return f'{self.day} : {self.query} ({self.source})'
@@ -0,0 +1,43 @@
+"""
+Rapports de ventes lus uniquement dans les totaux journaliers : le coût d'un
+rapport dépend du nombre de journées et de produits vendus, pas du nombre de
+commandes.
+"""
+from django.db.models import Sum
+
+from orders.models import Order
+from .models import DailyCategorySales, DailyPaymentSales, DailyProductSales
+
+
+def _totals(queryset, *keys):
+    return queryset.values(*keys).annotate(
+        total_revenue=Sum('revenue'), total_units=Sum('units'), total_orders=Sum('orders')
+    )
+
+
+def sales_report(date_from, date_to, top=10):
+    """
+    Chiffre d'affaires, unités et commandes entre deux dates (incluses) :
+    totaux, par jour, par mode de paiement, par catégorie et meilleurs produits
+    """
+    days = {'day__gte': date_from, 'day__lte': date_to}
+    payments = DailyPaymentSales.objects.filter(**days)
+    methods = dict(Order.PAYMENT_METHOD_CHOICES)
+
+    by_payment_method = list(_totals(payments, 'payment_method').order_by('-total_revenue'))
+    for row in by_payment_method:
+        row['label'] = methods.get(row['payment_method'], row['payment_method'])
+
+    return {
+        'totals': payments.aggregate(
+            total_revenue=Sum('revenue'), total_units=Sum('units'), total_orders=Sum('orders')
+        ),
+        'daily': list(_totals(payments, 'day').order_by('day')),
+        'by_payment_method': by_payment_method,
+        'by_category': list(_totals(
+            DailyCategorySales.objects.filter(**days), 'category_id', 'category__name'
+        ).order_by('-total_revenue')),
+        'top_products': list(_totals(
+            DailyProductSales.objects.filter(**days), 'product_id', 'product__name'
+        ).order_by('-total_revenue', 'product_id')[:top]),
+    }
@@ -0,0 +1,158 @@
+"""
+Totaux de ventes journaliers par produit, catégorie et mode de paiement.
+
+Une commande est comptée dès qu'elle est payée, ou dès sa création pour le
+paiement à la livraison, à la date où elle a été passée. Elle est ajoutée aux
+totaux par incréments ``F('revenue') + ...`` (pas de lecture puis réécriture)
+et marquée dans ``RolledUpOrder`` dans la même transaction : un second
+enregistrement de la commande ne la compte pas deux fois.
+
+Le rattrapage (``backfill``) recalcule une période entière en SQL ensembliste :
+``INSERT INTO ... SELECT ... GROUP BY`` depuis les lignes de commande.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from products.models import Product
+from products.popularity import add_scores, decay_weight, record_sales
+from .models import DailyCategorySales, DailyPaymentSales, DailyProductSales, RolledUpOrder
+
+
+BATCH_SIZE = 5000
+REVENUE = Sum(F('price') * F('quantity'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def counted_orders():
+    """Commandes à compter : payées, ou à payer à la livraison"""
+    return Order.objects.filter(Q(paid=True) | Q(payment_method='cash_on_delivery'))
+
+
+def is_counted(order):
+    return order.paid or order.payment_method == 'cash_on_delivery'
+
+
+def _increment(model, lookup, revenue, units, orders):
+    """Ajouter des ventes à une ligne de totaux, créée si besoin"""
+    values = {
+        'revenue': F('revenue') + revenue,
+        'units': F('units') + units,
+        'orders': F('orders') + orders,
+    }
+    if model.objects.filter(**lookup).update(**values):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(revenue=revenue, units=units, orders=orders, **lookup)
+    except IntegrityError:
+        # Ligne créée entre-temps par une autre commande du même jour
+        model.objects.filter(**lookup).update(**values)
+
+
+def record_order(order):
+    """
+    Ajouter une commande aux totaux journaliers si elle doit être comptée et
+    ne l'a pas encore été. Retourne True si elle a été ajoutée.
+    """
+    if not is_counted(order):
+        return False
+    day = timezone.localdate(order.created)
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                RolledUpOrder.objects.create(order_id=order.pk, day=day)
+        except IntegrityError:
+            return False
+
+        lines = list(OrderItem.objects.filter(order_id=order.pk).values(
+            'product_id', 'product__category_id'
+        ).annotate(revenue=REVENUE, units=Sum('quantity')).order_by('product_id'))
+        categories = {}
+        for line in lines:
+            _increment(DailyProductSales, {'day': day, 'product_id': line['product_id']},
+                       line['revenue'], line['units'], 1)
+            totals = categories.setdefault(line['product__category_id'], [0, 0])
+            totals[0] += line['revenue']
+            totals[1] += line['units']
+        for category_id, (revenue, units) in sorted(categories.items()):
+            _increment(DailyCategorySales, {'day': day, 'category_id': category_id}, revenue, units, 1)
+        if lines:
+            _increment(DailyPaymentSales, {'day': day, 'payment_method': order.payment_method},
+                       sum(line['revenue'] for line in lines), sum(line['units'] for line in lines), 1)
+        # Score "Meilleures ventes"
+        record_sales([(line['product_id'], line['units']) for line in lines], order.created)
+    return True
+
+
+def _insert_from_select(model, fields, queryset):
+    """``INSERT INTO table (champs) SELECT ...`` : les lignes ne passent pas par Python"""
+    sql, params = queryset.query.sql_with_params()
+    columns = ', '.join(connection.ops.quote_name(model._meta.get_field(name).column) for name in fields)
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {model._meta.db_table} ({columns}) {sql}', params)
+        return cursor.rowcount
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def backfill(date_from=None, date_to=None):
+    """
+    Recalculer les totaux des journées ``date_from`` à ``date_to`` (incluses)
+    depuis les commandes. Retourne le nombre de commandes comptées.
+    """
+    orders = counted_orders()
+    days = {}
+    if date_from:
+        orders = orders.filter(created__gte=_day_start(date_from))
+        days['day__gte'] = date_from
+    if date_to:
+        orders = orders.filter(created__lt=_day_start(date_to + timedelta(days=1)))
+        days['day__lte'] = date_to
+
+    items = OrderItem.objects.filter(order__in=orders).annotate(
+        day=TruncDate('order__created', tzinfo=timezone.get_current_timezone())
+    )
+    with transaction.atomic():
+        for model in (DailyProductSales, DailyCategorySales, DailyPaymentSales, RolledUpOrder):
+            model.objects.filter(**days).delete()
+
+        counted = _insert_from_select(
+            RolledUpOrder, ['order', 'day'],
+            orders.annotate(day=TruncDate('created', tzinfo=timezone.get_current_timezone())).order_by().values_list(
+                'pk', 'day'
+            ),
+        )
+        for model, field, key in (
+            (DailyProductSales, 'product', 'product'),
+            (DailyCategorySales, 'category', 'product__category'),
+            (DailyPaymentSales, 'payment_method', 'order__payment_method'),
+        ):
+            rows = items.values('day', key).annotate(
+                revenue=REVENUE, units=Sum('quantity'), orders=Count('order', distinct=True)
+            ).order_by().values_list('day', key, 'revenue', 'units', 'orders')
+            _insert_from_select(model, ['day', field, 'revenue', 'units', 'orders'], rows)
+    return counted
+
+
+def rebuild_sales_scores():
+    """
+    Recalculer le score "Meilleures ventes" de tous les produits depuis les
+    totaux journaliers (ventes comptées en milieu de journée)
+    """
+    scores = {}
+    for product_id, day, units in DailyProductSales.objects.filter(units__gt=0).values_list(
+        'product_id', 'day', 'units'
+    ).iterator(chunk_size=BATCH_SIZE):
+        weight = decay_weight(_day_start(day) + timedelta(hours=12), settings.SALES_HALF_LIFE)
+        scores[product_id] = scores.get(product_id, 0) + units * weight
+    with transaction.atomic():
+        Product.objects.update(sales_score=0)
+        add_scores('sales_score', scores)
+    return len(scores)
@@ -0,0 +1,111 @@
+"""
+Statistiques des recherches des clients.
+
+Chaque recherche (recherche instantanée, recherche par lettre, filtre texte du
+catalogue) est journalisée avec sa requête normalisée, son nombre de résultats
+et sa durée. Comme les journaux de connexion, les entrées ne sont pas écrites
+pendant la requête : elles sont mises en file dans le processus et insérées par
+lots (``bulk_create``) après l'envoi d'une réponse, dès que la file atteint
+``SEARCH_LOG_BATCH_SIZE`` entrées ou que la plus ancienne a
+``SEARCH_LOG_FLUSH_INTERVAL`` secondes (``parfumerie.buffers``).
+
+``rollup_searches`` regroupe les journaux par jour, source et requête
+(``DailySearchQuery``) en une requête ``INSERT ... SELECT`` ; le rapport des
+recherches les plus fréquentes et sans résultat ne lit que ces totaux.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from parfumerie.buffers import WriteBuffer
+from products.text import normalize
+from .models import DailySearchQuery, SearchLog
+from .rollups import _day_start, _insert_from_select
+
+
+QUERY_MAX_LENGTH = SearchLog._meta.get_field('query').max_length
+SOURCE_LABELS = dict(SearchLog.SOURCE_CHOICES)
+
+
+class SearchLogBuffer(WriteBuffer):
+    """File des recherches à écrire"""
+    batch_size_setting = 'SEARCH_LOG_BATCH_SIZE'
+    flush_interval_setting = 'SEARCH_LOG_FLUSH_INTERVAL'
+
+    def empty(self):
+        return []
+
+    def add(self, source, query, results, started):
+        """Recherche ``query`` lancée à ``started`` (``time.perf_counter()``)"""
+        query = normalize(query)[:QUERY_MAX_LENGTH]
+        if not query:
+            return
+        entry = SearchLog(
+            query=query,
+            source=source,
+            results=results,
+            latency_ms=round((time.perf_counter() - started) * 1000, 3),
+            created=timezone.now(),
+        )
+        with self.adding() as pending:
+            pending.append(entry)
+
+    def write(self, pending):
+        SearchLog.objects.bulk_create(pending, batch_size=500)
+        return len(pending)
+
+
+search_log = SearchLogBuffer()
+
+
+def rollup_searches(date_from, date_to):
+    """
+    Recalculer les totaux des journées ``date_from`` à ``date_to`` (incluses)
+    depuis les journaux. Retourne le nombre de lignes de totaux.
+    """
+    logs = SearchLog.objects.filter(
+        created__gte=_day_start(date_from), created__lt=_day_start(date_to + timedelta(days=1))
+    ).annotate(day=TruncDate('created', tzinfo=timezone.get_current_timezone()))
+    rows = logs.values('day', 'source', 'query').annotate(
+        searches=Count('pk'),
+        zero_results=Count('pk', filter=Q(results=0)),
+        total_latency_ms=Sum('latency_ms'),
+    ).order_by().values_list('day', 'source', 'query', 'searches', 'zero_results', 'total_latency_ms')
+    with transaction.atomic():
+        DailySearchQuery.objects.filter(day__gte=date_from, day__lte=date_to).delete()
+        return _insert_from_select(
+            DailySearchQuery, ['day', 'source', 'query', 'searches', 'zero_results', 'total_latency_ms'], rows
+        )
+
+
+def search_report(date_from, date_to, limit=20):
+    """Recherches les plus fréquentes et sans résultat entre deux dates (incluses)"""
+    days = DailySearchQuery.objects.filter(day__gte=date_from, day__lte=date_to)
+    totals = days.aggregate(
+        count=Sum('searches'), zero_count=Sum('zero_results'), latency=Sum('total_latency_ms')
+    )
+    count, zero_count = totals['count'] or 0, totals['zero_count'] or 0
+    queries = days.values('query').annotate(
+        count=Sum('searches'),
+        zero_count=Sum('zero_results'),
+        avg_latency_ms=Sum('total_latency_ms') / Sum('searches'),
+    )
+    return {
+        'searches': count,
+        'zero_results': zero_count,
+        'zero_rate': round(100 * zero_count / count, 1) if count else 0,
+        'avg_latency_ms': round(totals['latency'] / count, 1) if count else 0,
+        'by_source': [
+            {**row, 'label': SOURCE_LABELS[row['source']]}
+            for row in days.values('source').annotate(
+                count=Sum('searches'), zero_count=Sum('zero_results')
+            ).order_by('-count')
+        ],
+        'top': list(queries.order_by('-count', 'query')[:limit]),
+        'zero': list(queries.filter(zero_count__gt=0).order_by('-zero_count', 'query')[:limit]),
+    }
@@ -0,0 +1,17 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from orders.models import Order
+from .rollups import is_counted, record_order
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, **kwargs):
+    """
+    Compter une commande payée ou à payer à la livraison, après la validation
+    de la transaction (ses lignes sont créées après la commande)
+    """
+    if is_counted(instance):
+        transaction.on_commit(lambda: record_order(instance))
+
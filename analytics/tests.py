@@ -0,0 +1,199 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from products.models import Category, Product
+from .models import (
+    DailyCategorySales, DailyPaymentSales, DailyProductSales, DailySearchQuery, RolledUpOrder, SearchLog,
+)
+from .reports import sales_report
+from .rollups import backfill, rebuild_sales_scores, record_order
+from .search import rollup_searches, search_log, search_report
+
+
+class SalesRollupTests(TestCase):
+
+    def setUp(self):
+        self.oud = Category.objects.create(name='Oud', slug='oud')
+        musc = Category.objects.create(name='Musc', slug='musc')
+        self.royal = Product.objects.create(category=self.oud, name='Oud Royal', slug='oud-royal',
+                                            price=Decimal('500.00'), stock_quantity=10)
+        self.noir = Product.objects.create(category=self.oud, name='Oud Noir', slug='oud-noir',
+                                           price=Decimal('300.00'), stock_quantity=10)
+        self.blanc = Product.objects.create(category=musc, name='Musc Blanc', slug='musc-blanc',
+                                            price=Decimal('100.00'), stock_quantity=10)
+        self.customer = User.objects.create_user(username='buyer', password='complexpassword123').customer
+        self.today = timezone.localdate()
+
+    def create_order(self, method, *lines, paid=False):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(customer=self.customer, first_name='A', last_name='B',
+                                         email='a@example.com', address='1 rue', postal_code='20000',
+                                         city='Casablanca', payment_method=method, paid=paid)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, price=product.price, quantity=quantity)
+                for product, quantity in lines
+            ])
+        return order
+
+    def snapshot(self):
+        return (
+            sorted(DailyProductSales.objects.values_list('day', 'product_id', 'revenue', 'units', 'orders')),
+            sorted(DailyCategorySales.objects.values_list('day', 'category_id', 'revenue', 'units', 'orders')),
+            sorted(DailyPaymentSales.objects.values_list('day', 'payment_method', 'revenue', 'units', 'orders')),
+        )
+
+    def test_orders_counted_once_when_due(self):
+        self.create_order('cash_on_delivery', (self.royal, 1), (self.noir, 2))
+        online = self.create_order('online', (self.royal, 1))
+        self.assertEqual(DailyCategorySales.objects.get(category=self.oud).revenue, Decimal('1100.00'))
+        self.assertFalse(RolledUpOrder.objects.filter(order=online).exists())
+
+        # Paiement confirmé, puis un second enregistrement de la commande
+        online.paid = True
+        with self.captureOnCommitCallbacks(execute=True):
+            online.save()
+        self.assertFalse(record_order(online))
+
+        category = DailyCategorySales.objects.get(category=self.oud)
+        self.assertEqual((category.revenue, category.units, category.orders), (Decimal('1600.00'), 4, 2))
+        self.assertEqual(DailyProductSales.objects.get(product=self.royal).orders, 2)
+        self.assertEqual(
+            sorted(DailyPaymentSales.objects.values_list('payment_method', 'revenue')),
+            [('cash_on_delivery', Decimal('1100.00')), ('online', Decimal('500.00'))],
+        )
+
+    def test_backfill_matches_incremental(self):
+        orders = [
+            self.create_order('cash_on_delivery', (self.royal, 1), (self.blanc, 3)),
+            self.create_order('online', (self.noir, 2), paid=True),
+            self.create_order('online', (self.blanc, 1)),
+            self.create_order('cash_on_delivery', (self.noir, 1)),
+        ]
+        Order.objects.filter(pk=orders[3].pk).update(created=timezone.now() - timedelta(days=3))
+        # Totaux incrémentaux recalculés avec la nouvelle date de la dernière commande
+        for model in (DailyProductSales, DailyCategorySales, DailyPaymentSales, RolledUpOrder):
+            model.objects.all().delete()
+        for order in Order.objects.all():
+            record_order(order)
+        expected = self.snapshot()
+        self.assertEqual(len(expected[2]), 3)
+
+        self.assertEqual(backfill(), 3)
+        self.assertEqual(self.snapshot(), expected)
+
+        # Rattrapage d'une seule journée : les autres sont conservées
+        DailyProductSales.objects.filter(day=self.today).delete()
+        out = StringIO()
+        call_command('backfill_sales_rollups', '--from', self.today.isoformat(), '--to', self.today.isoformat(),
+                     stdout=out)
+        self.assertIn('2 commande(s)', out.getvalue())
+        self.assertEqual(self.snapshot(), expected)
+
+    def test_best_sellers_score(self):
+        self.create_order('cash_on_delivery', (self.royal, 1), (self.blanc, 3))
+        self.create_order('online', (self.noir, 2))
+        old = self.create_order('cash_on_delivery', (self.noir, 4))
+        Order.objects.filter(pk=old.pk).update(created=timezone.now() - timedelta(days=90))
+        # Ventes de la commande ancienne recomptées à sa date
+        self.assertEqual(backfill(), 2)
+        self.assertEqual(rebuild_sales_scores(), 3)
+
+        # Quatre articles vendus il y a trois demi-vies pèsent moins qu'un seul aujourd'hui
+        ranking = list(Product.objects.order_by('-sales_score').values_list('slug', flat=True))
+        self.assertEqual(ranking, ['musc-blanc', 'oud-royal', 'oud-noir'])
+        self.assertLess(Product.objects.get(pk=self.noir.pk).sales_score,
+                        Product.objects.get(pk=self.royal.pk).sales_score)
+
+    def test_report_reads_rollups_only(self):
+        self.create_order('cash_on_delivery', (self.royal, 1), (self.blanc, 3))
+        self.create_order('online', (self.royal, 2), paid=True)
+        with self.assertNumQueries(5):
+            report = sales_report(self.today - timedelta(days=7), self.today)
+        self.assertEqual(report['totals'], {
+            'total_revenue': Decimal('1800.00'), 'total_units': 6, 'total_orders': 2,
+        })
+        self.assertEqual([row['category__name'] for row in report['by_category']], ['Oud', 'Musc'])
+        self.assertEqual(report['top_products'][0]['product__name'], 'Oud Royal')
+        self.assertEqual(report['by_payment_method'][0]['label'], 'Paiement en ligne')
+
+    def test_staff_dashboard(self):
+        self.create_order('cash_on_delivery', (self.royal, 1))
+        staff = User.objects.create_user(username='staff', password='complexpassword123', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('products:sales_dashboard'))
+        self.assertEqual(response.context['report']['totals']['total_revenue'], Decimal('500.00'))
+        self.assertContains(response, 'Oud Royal')
+
+
+class SearchAnalyticsTests(TestCase):
+
+    def setUp(self):
+        search_log.flush()
+        category = Category.objects.create(name='Oud', slug='oud')
+        Product.objects.create(category=category, name='Oud Royal', slug='oud-royal',
+                               price=Decimal('500.00'), stock_quantity=10)
+        self.today = timezone.localdate()
+
+    def tearDown(self):
+        search_log.flush()
+
+    def test_searches_logged_in_batches(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('products:search_api'), {'q': 'Oud'})
+            self.client.get(reverse('products:suggestions_api'), {'letter': 'x'})
+            self.client.get(reverse('products:product_list'), {'query': ' OUD Royal '})
+        # Aucune écriture pendant les requêtes
+        self.assertFalse([q for q in queries if SearchLog._meta.db_table in q['sql']])
+        self.assertEqual(len(search_log), 3)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(search_log.flush(), 3)
+        logs = {log.source: log for log in SearchLog.objects.all()}
+        self.assertEqual(logs['search'].query, 'oud')
+        self.assertEqual(logs['search'].results, 1)
+        self.assertEqual((logs['suggestions'].query, logs['suggestions'].results), ('x', 0))
+        self.assertEqual((logs['catalog'].query, logs['catalog'].results), ('oud royal', 1))
+        self.assertGreater(logs['catalog'].latency_ms, 0)
+
+    def test_rollup_and_report(self):
+        for query, results in (('Oud', 3), ('oud', 3), ('Óud', 3), ('ambre', 1), ('vanile', 0), ('vanile', 0)):
+            search_log.add('search', query, results, 0)
+        search_log.add('catalog', 'zzz', 0, 0)
+        search_log.flush()
+        # Journal de la veille : hors de la période du rapport
+        SearchLog.objects.create(query='oud', source='search', results=3, latency_ms=1,
+                                 created=timezone.now() - timedelta(days=1))
+
+        out = StringIO()
+        call_command('rollup_searches', stdout=out)
+        self.assertIn('5 recherche(s) distincte(s)', out.getvalue())
+        # Recalcul idempotent
+        self.assertEqual(rollup_searches(self.today, self.today), 4)
+        self.assertEqual(DailySearchQuery.objects.filter(day=self.today).count(), 4)
+
+        with self.assertNumQueries(4):
+            report = search_report(self.today, self.today)
+        self.assertEqual((report['searches'], report['zero_results']), (7, 3))
+        self.assertEqual([(row['query'], row['count']) for row in report['top'][:2]], [('oud', 3), ('vanile', 2)])
+        self.assertEqual([(row['query'], row['zero_count']) for row in report['zero']], [('vanile', 2), ('zzz', 1)])
+        self.assertEqual(report['by_source'][0]['label'], 'Recherche instantanée')
+
+    def test_staff_dashboard(self):
+        search_log.add('catalog', 'musc introuvable', 0, 0)
+        search_log.flush()
+        rollup_searches(self.today, self.today)
+        staff = User.objects.create_user(username='staff', password='complexpassword123', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('products:search_dashboard'))
+        self.assertEqual(response.context['report']['zero_results'], 1)
+        self.assertContains(response, 'musc introuvable')
@@ -1,8 +1,19 @@
 from decimal import Decimal
 from django.conf import settings
+from inventory.reservations import new_holder, release, reserve, reserve_many
 from products.models import Product
 
 
+def cart_quantity(cart):
+    """Quantité totale des articles d'un panier (dictionnaire de session)"""
+    return sum(item['quantity'] for item in cart.values())
+
+
+def cart_total_price(cart):
+    """Coût total des articles d'un panier (dictionnaire de session)"""
+    return sum(Decimal(item['price']) * item['quantity'] for item in cart.values())
+
+
 class Cart:
     def __init__(self, request):
         """
@@ -14,6 +25,19 @@ class Cart:
             # Sauvegarder un panier vide dans la session
             cart = self.session[settings.CART_SESSION_ID] = {}
         self.cart = cart
+        self._products = None
+        self._loaded_ids = set()
+
+    @property
+    def holder(self):
+        """
+        Jeton des réservations de stock du panier, conservé dans la session
+        (il survit au changement de clé de session à la connexion)
+        """
+        holder = self.session.get(settings.CART_RESERVATION_SESSION_ID)
+        if not holder:
+            holder = self.session[settings.CART_RESERVATION_SESSION_ID] = new_holder()
+        return holder
 
     def add(self, product, quantity=1, override_quantity=False):
         """
@@ -32,27 +56,23 @@ class Cart:
             raise ValueError("La quantité ne peut pas dépasser 20")
         
         product_id = str(product.id)
-        if product_id not in self.cart:
-            self.cart[product_id] = {
-                'quantity': 0,
-                'price': str(product.price),
-                'name': product.name,  # Stocker le nom pour référence rapide
-                'available': product.available
-            }
-        
         if override_quantity:
-            self.cart[product_id]['quantity'] = quantity
+            new_quantity = quantity
         else:
-            new_quantity = self.cart[product_id]['quantity'] + quantity
+            new_quantity = self.cart.get(product_id, {}).get('quantity', 0) + quantity
             if new_quantity > 20:
                 raise ValueError("La quantité totale ne peut pas dépasser 20")
-            self.cart[product_id]['quantity'] = new_quantity
-        
-        # Mettre à jour les informations du produit au cas où elles auraient changé
-        self.cart[product_id]['price'] = str(product.price)
-        self.cart[product_id]['name'] = product.name
-        self.cart[product_id]['available'] = product.available
-        
+
+        # Réserver le stock avant de modifier le panier (lève InsufficientStock)
+        reserve(self.holder, product, new_quantity)
+
+        self.cart[product_id] = {
+            'quantity': new_quantity,
+            # Informations du produit mises à jour au cas où elles auraient changé
+            'price': str(product.price),
+            'name': product.name,  # Stocker le nom pour référence rapide
+            'available': product.available
+        }
         self.save()
 
     def save(self):
@@ -68,6 +88,7 @@ class Cart:
         product_id = str(product.id)
         if product_id in self.cart:
             del self.cart[product_id]
+            release(self.holder, [product])
             self.save()
             return True
         return False
@@ -103,14 +124,25 @@ class Cart:
             return self.cart[product_id]['quantity']
         return 0
 
+    def get_products(self):
+        """
+        Récupérer les produits du panier depuis la base de données, une seule fois
+        tant que de nouveaux produits ne sont pas ajoutés.
+        """
+        product_ids = set(self.cart.keys())
+        if self._products is None or not product_ids <= self._loaded_ids:
+            self._products = {
+                str(product.id): product
+                for product in Product.objects.filter(id__in=product_ids)
+            }
+            self._loaded_ids = product_ids
+        return [product for product_id, product in self._products.items() if product_id in self.cart]
+
     def __iter__(self):
         """
         Itérer sur les éléments du panier et récupérer les produits depuis la base de données.
         """
-        product_ids = self.cart.keys()
-        products = Product.objects.filter(id__in=product_ids)
-
-        for product in products:
+        for product in self.get_products():
             item = self.cart[str(product.id)]
             price = Decimal(item['price'])   # نحولها من str إلى Decimal مؤقتاً
             total_price = price * item['quantity']
@@ -128,13 +160,13 @@ class Cart:
         """
         Compter tous les éléments dans le panier.
         """
-        return sum(item['quantity'] for item in self.cart.values())
+        return cart_quantity(self.cart)
 
     def get_total_price(self):
         """
         Calculer le coût total des éléments dans le panier.
         """
-        return sum(Decimal(item['price']) * item['quantity'] for item in self.cart.values())
+        return cart_total_price(self.cart)
 
     def get_total_items(self):
         """
@@ -155,6 +187,31 @@ class Cart:
         if settings.CART_SESSION_ID in self.session:
             del self.session[settings.CART_SESSION_ID]
             self.save()
+        if settings.CART_RESERVATION_SESSION_ID in self.session:
+            release(self.holder)
+
+    def reserve_items(self):
+        """
+        Renouveler les réservations de tout le panier en une fois ; les
+        quantités qui dépassent le stock disponible sont réduites à ce stock.
+        Retourne le stock disponible par produit et la liste des articles ajustés.
+        """
+        if not self.cart:
+            return {}, []
+        available = reserve_many(
+            self.holder, {int(product_id): item['quantity'] for product_id, item in self.cart.items()}, partial=True
+        )
+        adjusted = []
+        for product_id, item in list(self.cart.items()):
+            quantity = min(item['quantity'], available.get(int(product_id), 0))
+            if quantity < item['quantity']:
+                adjusted.append((item['name'], quantity))
+                if quantity:
+                    item['quantity'] = quantity
+                else:
+                    del self.cart[product_id]
+                self.save()
+        return available, adjusted
 
     def clean_unavailable_products(self):
         """
@@ -1,9 +1,11 @@
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.decorators.http import require_POST
 from django.http import JsonResponse
 from django.contrib import messages
+from inventory.ledger import InsufficientStock
 from products.models import Product
-from .cart import Cart
+from .cart import Cart, cart_quantity, cart_total_price
 from .forms import CartAddProductForm
 import json
 from django.http import HttpResponse
@@ -35,21 +37,19 @@ def cart_add(request, product_id):
         cd = form.cleaned_data
         requested_quantity = cd['quantity']
         
-        # Vérifier si la quantité demandée est disponible
-        current_cart_quantity = cart.cart.get(str(product_id), {}).get('quantity', 0)
-        total_requested = current_cart_quantity + requested_quantity if not cd['override'] else requested_quantity
-        
-        if total_requested > product.stock_quantity:
-            available_quantity = product.stock_quantity - (current_cart_quantity if not cd['override'] else 0)
+        # Le stock disponible tient compte des articles réservés par les autres paniers
+        try:
+            cart.add(product=product,
+                     quantity=requested_quantity,
+                     override_quantity=cd['override'])
+        except InsufficientStock as e:
+            current_cart_quantity = cart.get_product_quantity(product) if not cd['override'] else 0
+            available_quantity = max(e.available - current_cart_quantity, 0)
             response = redirect('products:product_detail', product.id, product.slug)
             response['X-Notification-Message'] = f"Quantité insuffisante en stock. Disponible: {available_quantity}"
             response['X-Notification-Type'] = 'error'
             return response
         
-        cart.add(product=product,
-                 quantity=requested_quantity,
-                 override_quantity=cd['override'])
-        
         response = redirect('cart:cart_detail')
         if cd['override']:
             response['X-Notification-Message'] = f"Quantité mise à jour pour '{product.name}'"
@@ -94,14 +94,16 @@ def cart_update(request, product_id):
         quantity = 1
     
     if quantity > 0:
-        # Vérifier le stock disponible
-        if quantity > product.stock_quantity:
-            message = f"Quantité insuffisante en stock pour '{product.name}'. Disponible: {product.stock_quantity}"
+        # Vérifier le stock disponible (hors articles réservés par les autres paniers)
+        try:
+            cart.add(product=product, quantity=quantity, override_quantity=True)
+        except InsufficientStock as e:
+            message = f"Quantité insuffisante en stock pour '{product.name}'. Disponible: {e.available}"
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return JsonResponse({
                     'success': False,
                     'message': message,
-                    'available_stock': product.stock_quantity,
+                    'available_stock': e.available,
                     'notification_type': 'error'
                 })
             response = redirect('cart:cart_detail')
@@ -109,7 +111,6 @@ def cart_update(request, product_id):
             response['X-Notification-Type'] = 'error'
             return response
         
-        cart.add(product=product, quantity=quantity, override_quantity=True)
         message = f"Quantité mise à jour pour '{product.name}'"
         notification_type = 'success'
     else:
@@ -153,22 +154,20 @@ def cart_detail(request):
     """
     cart = Cart(request)
     
-    # Vérifier la disponibilité des produits dans le panier
-    unavailable_items = []
-    for item in cart:
-        product = item['product']
-        if not product.is_available_for_purchase:
-            unavailable_items.append(item)
-        elif item['quantity'] > product.stock_quantity:
-            # Ajuster automatiquement la quantité si elle dépasse le stock
-            cart.add(product=product, quantity=product.stock_quantity, override_quantity=True)
-            messages.warning(request, f"Quantité ajustée pour '{product.name}' (stock disponible: {product.stock_quantity})")
-    
-    # Supprimer les articles non disponibles
+    # Retirer les produits qui ne sont plus disponibles
+    unavailable_items = [item for item in cart if not item['product'].available]
     for item in unavailable_items:
         cart.remove(item['product'])
         messages.warning(request, f"'{item['product'].name}' a été retiré du panier car il n'est plus disponible.")
     
+    # Renouveler les réservations et ajuster les quantités au stock disponible
+    available_stock, adjusted = cart.reserve_items()
+    for name, quantity in adjusted:
+        if quantity:
+            messages.warning(request, f"Quantité ajustée pour '{name}' (stock disponible: {quantity})")
+        else:
+            messages.warning(request, f"'{name}' a été retiré du panier car il n'est plus en stock.")
+    
     # Ajouter les formulaires de mise à jour pour chaque élément
     for item in cart:
         item['update_quantity_form'] = CartAddProductForm(initial={
@@ -176,7 +175,7 @@ def cart_detail(request):
             'override': True
         })
         # Ajouter l'information sur le stock disponible
-        item['available_stock'] = item['product'].stock_quantity
+        item['available_stock'] = available_stock.get(item['product'].id, 0)
     
     context = {
         'cart': cart,
@@ -187,16 +186,16 @@ def cart_detail(request):
     return render(request, 'cart/detail.html', context)
 
 
-def cart_summary(request):
+async def cart_summary(request):
     """
     Résumé du panier pour la navigation
     """
-    cart = Cart(request)
-    
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        # Lecture seule de la session : pas de panier vide enregistré pour chaque visiteur
+        cart = await request.session.aget(settings.CART_SESSION_ID) or {}
         return JsonResponse({
-            'cart_count': len(cart),
-            'cart_total': str(cart.get_total_price())
+            'cart_count': cart_quantity(cart),
+            'cart_total': str(cart_total_price(cart))
         })
     
     return redirect('cart:cart_detail')
@@ -1,3 +1,16 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import AccountDeletion
+
+
+@admin.register(AccountDeletion)
+class AccountDeletionAdmin(admin.ModelAdmin):
+    list_display = ['user', 'requested']
+    search_fields = ['user__username', 'user__email']
+    list_select_related = ['user']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,164 @@
+"""
+Disponibilité des noms d'utilisateur et adresses email.
+
+Les recherches se font sans tenir compte de la casse, sur ``LOWER(username)``
+et ``LOWER(email)`` : des expressions indexées (migration 0003), contrairement
+à ``__iexact`` qui parcourt la table sous SQLite. La valeur cherchée passe par
+le même ``LOWER`` de la base (``LOWER(username) = LOWER(%s)``) : sous SQLite,
+``LOWER`` ne convertit que l'ASCII, la casse ne doit donc pas être repliée par
+Python d'un côté et par la base de l'autre.
+
+Les vérifications à la frappe du formulaire d'inscription consultent d'abord
+un filtre de Bloom des valeurs existantes, gardé dans le cache partagé : une
+valeur absente du filtre est disponible à coup sûr, sans requête. Seules les
+valeurs peut-être prises (présentes, ou faux positif) sont vérifiées en base.
+
+Le filtre est découpé en blocs de ``BLOOM_BLOCK_BYTES`` octets (``bytearray``)
+rangés sous des clés de cache distinctes, toutes les positions d'une valeur
+tombant dans un même bloc : une vérification ne lit qu'un bloc, quelle que
+soit la taille du filtre. Il est construit hors des requêtes par la commande
+``build_availability_filters`` (à lancer par cron) ; tant qu'il n'existe pas,
+ou si un bloc a été évincé du cache, les vérifications passent par la base.
+Chaque compte créé ou modifié est ajouté à son bloc ; une mise à jour perdue
+ne peut fausser qu'une indication, l'inscription vérifiant toujours en base.
+Le filtre range les valeurs repliées par ``str.lower`` (Unicode) : deux
+valeurs égales pour ``LOWER`` de la base le sont aussi pour ``str.lower``,
+le filtre ne peut donc pas déclarer disponible une valeur prise.
+"""
+import hashlib
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Value
+from django.db.models.functions import Lower
+
+
+BLOOM_BITS_PER_ENTRY = 10
+BLOOM_HASHES = 7
+BLOOM_BLOCK_BYTES = 4096
+BLOOM_BLOCK_BITS = BLOOM_BLOCK_BYTES * 8
+BLOOM_FIELDS = ('username', 'email')
+
+
+def users_matching(field, value):
+    """Utilisateurs dont ``field`` vaut ``value`` sans tenir compte de la casse (index LOWER)"""
+    return User.objects.annotate(**{f'{field}_lower': Lower(field)}).filter(
+        **{f'{field}_lower': Lower(Value(value))}
+    )
+
+
+def _fold(value):
+    """Valeur rangée dans le filtre (repli plus large que ``LOWER`` de la base)"""
+    return value.lower()
+
+
+def _positions(value, blocks):
+    """(bloc, positions des bits dans le bloc) d'une valeur"""
+    digest = hashlib.blake2b(value.encode(), digest_size=24).digest()
+    block = int.from_bytes(digest[:8], 'big') % blocks
+    first, second = int.from_bytes(digest[8:16], 'big'), int.from_bytes(digest[16:], 'big') | 1
+    # Double hachage : k positions à partir de deux empreintes
+    return block, [(first + i * second) % BLOOM_BLOCK_BITS for i in range(BLOOM_HASHES)]
+
+
+def _set_bits(bits, positions):
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+
+
+def _has_bits(bits, positions):
+    return all(bits[position >> 3] >> (position & 7) & 1 for position in positions)
+
+
+def _meta_key(field):
+    return f'customers:bloom:{field}'
+
+
+def _block_key(field, generation, block):
+    return f'customers:bloom:{field}:{generation}:{block}'
+
+
+def build_filter(field):
+    """
+    Construire le filtre de toutes les valeurs existantes de ``field`` et le
+    ranger dans le cache ; retourne son nombre de blocs
+    """
+    count = User.objects.count()
+    blocks_count = -(-count * BLOOM_BITS_PER_ENTRY // BLOOM_BLOCK_BITS) or 1
+    blocks = [bytearray(BLOOM_BLOCK_BYTES) for _ in range(blocks_count)]
+    values = User.objects.exclude(**{field: ''}).values_list(field, flat=True)
+    for value in values.iterator(chunk_size=10000):
+        block, positions = _positions(_fold(value), blocks_count)
+        _set_bits(blocks[block], positions)
+
+    # Nouvelle génération : les lectures en cours gardent les blocs de la précédente
+    generation = time.time_ns()
+    previous = cache.get(_meta_key(field))
+    cache.set_many({_block_key(field, generation, i): bytes(bits) for i, bits in enumerate(blocks)}, None)
+    cache.set(_meta_key(field), (generation, blocks_count), None)
+    if previous:
+        cache.delete_many([_block_key(field, previous[0], i) for i in range(previous[1])])
+    return blocks_count
+
+
+def _locate(field, value, meta):
+    """(clé du bloc de ``value``, positions) d'après la génération du filtre"""
+    generation, blocks_count = meta
+    block, positions = _positions(value, blocks_count)
+    return _block_key(field, generation, block), positions
+
+
+def maybe_taken(field, value):
+    """False si ``value`` est absente du filtre (disponible à coup sûr)"""
+    meta = cache.get(_meta_key(field))
+    if meta is None:
+        return True
+    key, positions = _locate(field, value, meta)
+    bits = cache.get(key)
+    return bits is None or _has_bits(bits, positions)
+
+
+async def amaybe_taken(field, value):
+    """``maybe_taken`` pour les vues asynchrones"""
+    meta = await cache.aget(_meta_key(field))
+    if meta is None:
+        return True
+    key, positions = _locate(field, value, meta)
+    bits = await cache.aget(key)
+    return bits is None or _has_bits(bits, positions)
+
+
+def remember(user):
+    """Ajouter les valeurs d'un compte aux filtres en cache (sans les construire)"""
+    for field in BLOOM_FIELDS:
+        value = _fold(getattr(user, field))
+        meta = cache.get(_meta_key(field)) if value else None
+        if meta is None:
+            continue
+        key, positions = _locate(field, value, meta)
+        bits = cache.get(key)
+        if bits is not None and not _has_bits(bits, positions):
+            bits = bytearray(bits)
+            _set_bits(bits, positions)
+            cache.set(key, bytes(bits), None)
+
+
+def is_available(field, value, exclude_user_id=None):
+    """``value`` n'est utilisée par aucun autre compte"""
+    if not maybe_taken(field, _fold(value)):
+        return True
+    users = users_matching(field, value)
+    if exclude_user_id:
+        users = users.exclude(pk=exclude_user_id)
+    return not users.exists()
+
+
+async def ais_available(field, value, exclude_user_id=None):
+    """``is_available`` pour les vues asynchrones"""
+    if not await amaybe_taken(field, _fold(value)):
+        return True
+    users = users_matching(field, value)
+    if exclude_user_id:
+        users = users.exclude(pk=exclude_user_id)
+    return not await users.aexists()
@@ -0,0 +1,36 @@
+"""
+Vérifications au démarrage de la configuration de la protection des connexions.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+from django.utils.module_loading import import_string
+
+
+# Caches partagés par les processus, dont incr() est atomique
+ATOMIC_SHARED_CACHES = (
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+)
+
+
+@register(Tags.security, Tags.caches)
+def sliding_window_cache_check(app_configs, **kwargs):
+    """
+    ``SlidingWindowHandler`` compte les échecs avec ``cache.incr`` : un cache
+    local au processus ou non atomique (fichiers) laisserait passer des
+    tentatives au-delà de la limite
+    """
+    from .lockout import SlidingWindowHandler
+
+    handler = import_string(getattr(settings, 'AXES_HANDLER', 'axes.handlers.database.AxesDatabaseHandler'))
+    if not issubclass(handler, SlidingWindowHandler):
+        return []
+    backend = settings.CACHES.get(getattr(settings, 'AXES_CACHE', 'default'), {}).get('BACKEND', '')
+    if backend in ATOMIC_SHARED_CACHES:
+        return []
+    return [Error(
+        f"AXES_HANDLER = SlidingWindowHandler exige un cache partagé et atomique (AXES_CACHE : {backend or 'absent'}).",
+        hint="Définir REDIS_URL, ou utiliser axes.handlers.database.AxesDatabaseHandler.",
+        id='customers.E001',
+    )]
@@ -0,0 +1,89 @@
+"""
+Suppression des comptes clients en arrière-plan.
+
+La demande désactive le compte immédiatement (plus de connexion ni de session
+valide) et le met en file (``AccountDeletion``). La commande
+``process_account_deletions`` (à lancer par cron) anonymise ensuite les
+commandes du client par lots de taille fixe : un ``UPDATE`` par lot, dans une
+transaction courte, en suivant l'index (client, date). Les commandes restent
+dans la comptabilité et les totaux de ventes, sans données personnelles.
+Le compte et son profil ne sont supprimés qu'une fois toutes ses commandes
+anonymisées : il ne reste alors presque rien à supprimer en cascade.
+"""
+from django.db import transaction
+
+from orders.models import Order
+from .models import AccountDeletion, Customer
+
+
+ANONYMIZED_FIELDS = {
+    'customer': None,
+    'first_name': '',
+    'last_name': '',
+    'email': '',
+    'address': '',
+    'postal_code': '',
+    'city': '',
+    'phone': '',
+    'paypal_payer_id': '',
+}
+
+
+def request_deletion(user):
+    """Désactiver le compte et le mettre en file de suppression"""
+    with transaction.atomic():
+        user.is_active = False
+        user.set_unusable_password()
+        user.save(update_fields=['is_active', 'password'])
+        AccountDeletion.objects.get_or_create(user=user)
+
+
+def anonymize_orders(customer_id, batch_size):
+    """Anonymiser un lot de commandes du client ; retourne leur nombre"""
+    ids = list(Order.objects.filter(customer_id=customer_id).order_by().values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return 0
+    return Order.objects.filter(id__in=ids).update(**ANONYMIZED_FIELDS)
+
+
+def process_deletion(deletion, batch_size=1000, max_batches=None):
+    """
+    Avancer la suppression d'un compte d'au plus ``max_batches`` lots.
+    Retourne (commandes anonymisées, lots, compte supprimé).
+    """
+    customer_id = Customer.objects.filter(user_id=deletion.user_id).values_list('id', flat=True).first()
+    anonymized = batches = 0
+    while customer_id:
+        if max_batches is not None and batches >= max_batches:
+            # Commandes restantes au prochain passage
+            return anonymized, batches, False
+        with transaction.atomic():
+            count = anonymize_orders(customer_id, batch_size)
+        if not count:
+            break
+        anonymized += count
+        batches += 1
+
+    # Plus de commandes : profil, compte et demande supprimés ensemble
+    with transaction.atomic():
+        Customer.objects.filter(user_id=deletion.user_id).delete()
+        deletion.user.delete()
+    return anonymized, batches, True
+
+
+def process_deletions(batch_size=1000, max_batches=None):
+    """
+    Traiter la file des suppressions, la plus ancienne demande d'abord.
+    ``max_batches`` borne le nombre total de lots de l'exécution.
+    Retourne (commandes anonymisées, comptes supprimés).
+    """
+    anonymized = batches = deleted = 0
+    for deletion in AccountDeletion.objects.select_related('user'):
+        remaining = None if max_batches is None else max_batches - batches
+        if remaining is not None and remaining <= 0:
+            break
+        count, used, done = process_deletion(deletion, batch_size, remaining)
+        anonymized += count
+        batches += used
+        deleted += done
+    return anonymized, deleted
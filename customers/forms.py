@@ -1,6 +1,8 @@
 from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
+from django.db import transaction
+from .availability import users_matching
 from .models import Customer
 
 
@@ -79,9 +81,16 @@ class CustomUserCreationForm(UserCreationForm):
         self.fields['password1'].label = 'Mot de passe'
         self.fields['password2'].label = 'Confirmation du mot de passe'
 
+    def clean_username(self):
+        # Comme UserCreationForm (casse ignorée), par l'index LOWER(username)
+        username = self.cleaned_data.get('username')
+        if username and users_matching('username', username).exists():
+            raise forms.ValidationError(self.instance.unique_error_message(User, ['username']))
+        return username
+
     def clean_email(self):
         email = self.cleaned_data.get('email')
-        if User.objects.filter(email=email).exists():
+        if users_matching('email', email).exists():
             raise forms.ValidationError("Cette adresse email est déjà utilisée.")
         return email
 
@@ -92,13 +101,12 @@ class CustomUserCreationForm(UserCreationForm):
         user.last_name = self.cleaned_data['last_name']
         
         if commit:
-            user.save()
-            # Créer le profil client
-            Customer.objects.create(
-                user=user,
-                phone_number=self.cleaned_data.get('phone_number', ''),
-                address=self.cleaned_data.get('address', '')
-            )
+            # Compte et profil client ensemble (profil créé par customers.signals)
+            with transaction.atomic():
+                user.save()
+                user.customer.phone_number = self.cleaned_data.get('phone_number', '')
+                user.customer.address = self.cleaned_data.get('address', '')
+                user.customer.save(update_fields=['phone_number', 'address', 'updated'])
         return user
 
 
@@ -125,11 +133,9 @@ class CustomAuthenticationForm(AuthenticationForm):
         username = self.cleaned_data.get('username')
         # Permettre la connexion avec l'email
         if '@' in username:
-            try:
-                user = User.objects.get(email=username)
+            user = users_matching('email', username).order_by('pk').first()
+            if user:
                 return user.username
-            except User.DoesNotExist:
-                pass
         return username
 
 
@@ -174,7 +180,7 @@ class UserProfileForm(forms.ModelForm):
 
     def clean_email(self):
         email = self.cleaned_data.get('email')
-        if User.objects.filter(email=email).exclude(pk=self.instance.pk).exists():
+        if users_matching('email', email).exclude(pk=self.instance.pk).exists():
             raise forms.ValidationError("Cette adresse email est déjà utilisée.")
         return email
 
@@ -0,0 +1,43 @@
+"""
+Pool borné pour les vues qui hachent des mots de passe.
+
+Le hachage (PBKDF2) est le travail le plus coûteux en CPU de l'application.
+Les variantes asynchrones des vues de connexion et d'inscription s'exécutent
+dans un pool de ``PASSWORD_HASHING_WORKERS`` threads : ``hashlib`` libère le
+GIL pendant le calcul, les hachages se répartissent donc sur les cœurs, et les
+requêtes au-delà de la taille du pool attendent leur tour au lieu de saturer
+le serveur. Chaque thread du pool a sa propre connexion à la base : comme
+pour une requête, elle est fermée avant et après chaque vue si elle a dépassé
+``CONN_MAX_AGE`` ou est inutilisable (``close_old_connections``), au lieu de
+rester ouverte tant que vit le thread.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+
+password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASHING_WORKERS,
+    thread_name_prefix='password-hashing',
+)
+
+
+def in_hashing_pool(view):
+    """Variante asynchrone de ``view``, exécutée dans le pool de hachage"""
+    def job(request, *args, **kwargs):
+        # request_started / request_finished ne sont pas envoyés dans ce thread
+        close_old_connections()
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            close_old_connections()
+
+    run = sync_to_async(job, thread_sensitive=False, executor=password_executor)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await run(request, *args, **kwargs)
+    return wrapper
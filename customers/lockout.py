@@ -0,0 +1,196 @@
+"""
+Protection contre les attaques par force brute (gestionnaire django-axes).
+
+Les échecs de connexion sont comptés dans le cache partagé (``AXES_CACHE``),
+commun à tous les processus, par tranches de ``LOGIN_FAILURE_BUCKET``
+secondes : le nombre d'échecs est la somme des tranches couvrant les
+``AXES_COOLOFF_TIME`` dernières secondes (fenêtre glissante), lue en un seul
+``get_many``. Un blocage se lève de lui-même quand les échecs sortent de la
+fenêtre.
+
+Les tranches sont incrémentées par ``cache.incr`` : le cache doit être
+partagé par les processus et atomique (Redis). Le démarrage échoue sinon
+(``customers.checks``) ; sans Redis, les réglages utilisent le gestionnaire en
+base d'axes.
+
+Les journaux d'accès (``AccessLog``, ``AccessFailureLog``) ne sont pas écrits
+pendant la requête : ils sont mis en file dans le processus et insérés par lots
+(``bulk_create``) après l'envoi d'une réponse, dès que la file atteint
+``LOGIN_AUDIT_BATCH_SIZE`` entrées ou que la plus ancienne a
+``LOGIN_AUDIT_FLUSH_INTERVAL`` secondes (``parfumerie.buffers``). Une
+connexion réussie ne coûte ainsi aucune requête SQL à axes.
+"""
+import math
+import time
+from datetime import timedelta
+from logging import getLogger
+
+from axes.handlers.cache import AxesCacheHandler
+from axes.helpers import (
+    get_client_cache_keys,
+    get_client_session_hash,
+    get_client_str,
+    get_client_username,
+    get_cool_off,
+    get_credentials,
+    get_failure_limit,
+    get_lockout_parameters,
+)
+from axes.models import AccessAttempt, AccessFailureLog, AccessLog
+from axes.signals import user_locked_out
+from django.conf import settings
+from django.utils import timezone
+
+from parfumerie.buffers import WriteBuffer
+
+
+log = getLogger(__name__)
+
+
+class AuditBuffer(WriteBuffer):
+    """File des journaux d'accès à écrire : (type, entrée)"""
+    batch_size_setting = 'LOGIN_AUDIT_BATCH_SIZE'
+    flush_interval_setting = 'LOGIN_AUDIT_FLUSH_INTERVAL'
+
+    def empty(self):
+        return []
+
+    def add(self, kind, entry):
+        with self.adding() as pending:
+            pending.append((kind, entry))
+
+    def write(self, pending):
+        entries = {LOGIN: [], FAILURE: [], LOGOUT: []}
+        for kind, entry in pending:
+            entries[kind].append(entry)
+        AccessLog.objects.bulk_create(entries[LOGIN], batch_size=500)
+        AccessFailureLog.objects.bulk_create(entries[FAILURE], batch_size=500)
+        for username, session_hash, logout_time in entries[LOGOUT]:
+            AccessLog.objects.filter(
+                username=username, session_hash=session_hash, logout_time__isnull=True
+            ).update(logout_time=logout_time)
+        return len(pending)
+
+
+LOGIN, FAILURE, LOGOUT = 'login', 'failure', 'logout'
+
+audit_buffer = AuditBuffer()
+
+
+def _window():
+    """(durée de la fenêtre, durée d'une tranche) en secondes"""
+    cool_off = get_cool_off() or timedelta(days=1)
+    return int(cool_off.total_seconds()), settings.LOGIN_FAILURE_BUCKET
+
+
+def _buckets():
+    """Numéros des tranches de la fenêtre courante, la plus récente en dernier"""
+    window, bucket = _window()
+    current = int(time.time() // bucket)
+    return range(current - math.ceil(window / bucket) + 1, current + 1)
+
+
+def _bucket_keys(cache_keys, buckets):
+    return [f'{cache_key}:{number}' for cache_key in cache_keys for number in buckets]
+
+
+def _entry(model, request, username, **fields):
+    return model(
+        username=username,
+        ip_address=request.axes_ip_address,
+        user_agent=request.axes_user_agent[:255],
+        http_accept=request.axes_http_accept[:1025],
+        path_info=request.axes_path_info[:255],
+        attempt_time=request.axes_attempt_time,
+        **fields,
+    )
+
+
+class SlidingWindowHandler(AxesCacheHandler):
+    """
+    Échecs comptés par fenêtre glissante dans le cache partagé, journaux
+    écrits par lots hors de la requête.
+    """
+
+    def get_failures(self, request, credentials=None):
+        cache_keys = get_client_cache_keys(request, credentials)
+        counts = self.cache.get_many(_bucket_keys(cache_keys, _buckets()))
+        return max(
+            sum(count for key, count in counts.items() if key.startswith(f'{cache_key}:'))
+            for cache_key in cache_keys
+        )
+
+    def reset_attempts(self, *, ip_address=None, username=None, ip_or_username=False):
+        if ip_address is None and username is None:
+            raise NotImplementedError("Cannot clear all entries from cache")
+        if ip_or_username:
+            raise NotImplementedError("Due to the cache key ip_or_username=True is not supported")
+        keys = _bucket_keys(get_client_cache_keys(AccessAttempt(username=username, ip_address=ip_address)), _buckets())
+        self.cache.delete_many(keys)
+        return len(keys)
+
+    def reset_logs(self, *, age_days=None):
+        logs = AccessLog.objects.all()
+        if age_days is not None:
+            logs = logs.filter(attempt_time__lte=timezone.now() - timedelta(days=age_days))
+        return logs.delete()[0]
+
+    def reset_failure_logs(self, *, age_days=None):
+        failures = AccessFailureLog.objects.all()
+        if age_days is not None:
+            failures = failures.filter(attempt_time__lte=timezone.now() - timedelta(days=age_days))
+        return failures.delete()[0]
+
+    def user_login_failed(self, sender, credentials, request=None, **kwargs):
+        if request is None:
+            log.error("AXES: SlidingWindowHandler.user_login_failed does not function without a request.")
+            return
+
+        username = get_client_username(request, credentials)
+        if get_lockout_parameters(request, credentials) == ['username'] and username is None:
+            return
+        if not settings.AXES_RESET_COOL_OFF_ON_FAILURE_DURING_LOCKOUT and request.axes_locked_out:
+            request.axes_credentials = credentials
+            user_locked_out.send('axes', request=request, username=username, ip_address=request.axes_ip_address)
+            return
+        if self.is_whitelisted(request, credentials):
+            return
+
+        window, bucket = _window()
+        for key in _bucket_keys(get_client_cache_keys(request, credentials), _buckets()[-1:]):
+            # Tranche conservée tant qu'elle peut appartenir à la fenêtre
+            if not self.cache.add(key, 1, window + bucket):
+                try:
+                    self.cache.incr(key)
+                except ValueError:
+                    # Tranche expirée entre add et incr : premier échec de la tranche
+                    self.cache.set(key, 1, window + bucket)
+        failures = self.get_failures(request, credentials)
+        request.axes_failures_since_start = failures
+
+        locked_out = settings.AXES_LOCK_OUT_AT_FAILURE and failures >= get_failure_limit(request, credentials)
+        if locked_out:
+            log.warning(
+                "AXES: Locking out %s after repeated login failures.",
+                get_client_str(username, request.axes_ip_address, request.axes_user_agent,
+                               request.axes_path_info, request),
+            )
+            request.axes_locked_out = True
+            request.axes_credentials = credentials
+            user_locked_out.send('axes', request=request, username=username, ip_address=request.axes_ip_address)
+
+        if settings.AXES_ENABLE_ACCESS_FAILURE_LOG:
+            audit_buffer.add(FAILURE, _entry(AccessFailureLog, request, username, locked_out=bool(locked_out)))
+
+    def user_logged_in(self, sender, request, user, **kwargs):
+        username = user.get_username()
+        if not settings.AXES_DISABLE_ACCESS_LOG:
+            audit_buffer.add(LOGIN, _entry(AccessLog, request, username,
+                                           session_hash=get_client_session_hash(request)))
+        if settings.AXES_RESET_ON_SUCCESS:
+            self.cache.delete_many(_bucket_keys(get_client_cache_keys(request, get_credentials(username)), _buckets()))
+
+    def user_logged_out(self, sender, request, user, **kwargs):
+        username = user.get_username() if user else None
+        if username and not settings.AXES_DISABLE_ACCESS_LOG:
+            audit_buffer.add(LOGOUT, (username, get_client_session_hash(request), request.axes_attempt_time))
@@ -0,0 +1,112 @@
+"""
+Benchmark des connexions : débit par cœur du hachage des mots de passe.
+
+Crée une base dédiée et des comptes clients, démarre un serveur WSGI local
+puis fait se connecter des clients concurrents, chaque connexion partant
+d'une session vierge. La vue synchrone et sa variante asynchrone (pool de
+hachage) sont mesurées l'une après l'autre ; les résultats sont enregistrés
+en JSON pour comparer deux exécutions (--compare).
+"""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.servers.basehttp import ThreadedWSGIServer
+from django.core.wsgi import get_wsgi_application
+from django.urls import reverse
+
+from customers.models import Customer
+from products.management.commands.benchmark_storefront import (
+    Command as StorefrontBenchmarkCommand,
+    QuietRequestHandler,
+    SimulatedUser,
+)
+
+
+PASSWORD = 'benchmark-password-123'
+STEPS = {'login': 'customers:login', 'login_async': 'customers:login_async'}
+
+
+class Command(StorefrontBenchmarkCommand):
+    help = "Benchmark des connexions (hachage des mots de passe) sur un serveur WSGI local"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=os.cpu_count() or 1, help="Clients concurrents")
+        parser.add_argument('--logins', type=int, default=20, help="Connexions par client et par vue")
+        parser.add_argument('--database', help="Fichier SQLite du benchmark (temporaire par défaut)")
+        parser.add_argument('--output', default='bench_logins.json', help="Fichier JSON des résultats")
+        parser.add_argument('--compare', help="Résultats JSON d'une exécution précédente à comparer")
+
+    def run_benchmark(self, options):
+        # Comptes créés avec la même empreinte : la vérification coûte autant que pour des empreintes distinctes
+        password = make_password(PASSWORD)
+        users = User.objects.bulk_create([
+            User(username=f'bench{n}', email=f'bench{n}@example.com', password=password)
+            for n in range(options['users'])
+        ])
+        Customer.objects.bulk_create([Customer(user=user) for user in users])
+
+        server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+        server.set_app(get_wsgi_application())
+        port = server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        cores = os.cpu_count() or 1
+        steps = {}
+        started = time.perf_counter()
+        for step, view_name in STEPS.items():
+            samples, errors, elapsed = self.run_step(port, reverse(view_name), users, options['logins'])
+            steps[step] = self.summarize(samples, errors, elapsed)
+            if steps[step]['count']:
+                steps[step]['per_core'] = round(steps[step]['throughput'] / cores, 2)
+        elapsed = time.perf_counter() - started
+        server.shutdown()
+        server.server_close()
+
+        requests = sum(stats['count'] for stats in steps.values())
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'options': {k: options[k] for k in ('users', 'logins')},
+            'cores': cores,
+            'duration': round(elapsed, 3),
+            'requests': requests,
+            'throughput': round(requests / elapsed, 2),
+            'steps': steps,
+        }
+
+    def run_step(self, port, path, users, logins):
+        """Durées des connexions, nombre d'échecs et durée totale de l'étape"""
+        samples = []
+        errors = 0
+        lock = threading.Lock()
+
+        def run_user(user):
+            nonlocal errors
+            for _ in range(logins):
+                # Session vierge à chaque connexion
+                client = SimulatedUser(port, '')
+                started = time.perf_counter()
+                try:
+                    status, _ = client.request('POST', path, {'username': user.username, 'password': PASSWORD})
+                except OSError:
+                    status = None
+                with lock:
+                    samples.append(time.perf_counter() - started)
+                    errors += status != 302
+
+        threads = [threading.Thread(target=run_user, args=(user,)) for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples, errors, time.perf_counter() - started
+
+    def print_results(self, results):
+        super().print_results(results)
+        for step, stats in results['steps'].items():
+            if stats['count']:
+                self.stdout.write(f"{step:<14}{stats['per_core']} connexions/s par cœur ({results['cores']} cœurs)")
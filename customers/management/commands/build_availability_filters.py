@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from customers.availability import BLOOM_FIELDS, build_filter
+
+
+class Command(BaseCommand):
+    help = "Reconstruire les filtres de Bloom des noms d'utilisateur et emails existants (vérifications de disponibilité)"
+
+    def handle(self, *args, **options):
+        for field in BLOOM_FIELDS:
+            started = time.perf_counter()
+            blocks = build_filter(field)
+            self.stdout.write(self.style.SUCCESS(
+                f"{field} : {blocks} bloc(s) en {time.perf_counter() - started:.1f}s"
+            ))
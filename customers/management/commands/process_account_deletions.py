@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from customers.deletion import process_deletions
+
+
+class Command(BaseCommand):
+    help = "Anonymiser par lots les commandes des comptes supprimés, puis supprimer les comptes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Nombre de commandes anonymisées par requête")
+        parser.add_argument('--max-batches', type=int,
+                            help="Nombre maximal de lots de l'exécution (les suivants au prochain passage)")
+
+    def handle(self, *args, **options):
+        anonymized, deleted = process_deletions(options['batch_size'], options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{anonymized} commande(s) anonymisée(s), {deleted} compte(s) supprimé(s)."
+        ))
@@ -0,0 +1,36 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import SimpleLazyObject
+
+from .models import Customer
+
+
+def get_customer(user):
+    """Profil client d'un utilisateur connecté, None pour un visiteur"""
+    if not user.is_authenticated:
+        return None
+    try:
+        # Chargé avec l'utilisateur par CustomerBackend ; créé avec le compte
+        # (customers.signals), seul un compte chargé par fixture peut en manquer
+        return user.customer
+    except Customer.DoesNotExist:
+        return None
+
+
+class CustomerMiddleware:
+    """
+    ``request.customer`` : profil client de l'utilisateur, résolu à la
+    première utilisation puis conservé pour la requête. Compatible ASGI : les
+    vues asynchrones sont appelées sans passer par un thread.
+    """
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.customer = SimpleLazyObject(lambda: get_customer(request.user))
+        # En mode asynchrone, la coroutine de la suite de la chaîne est renvoyée telle quelle
+        return self.get_response(request)
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def create_missing_customers(apps, schema_editor):
+    """
+    Profil client pour chaque utilisateur qui n'en a pas, par lots
+    """
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Customer = apps.get_model('customers', 'Customer')
+    user_ids = User.objects.filter(customer__isnull=True).order_by('pk').values_list('pk', flat=True)
+    batch = []
+    for user_id in user_ids.iterator(chunk_size=1000):
+        batch.append(Customer(user_id=user_id))
+        if len(batch) == 1000:
+            Customer.objects.bulk_create(batch)
+            batch = []
+    Customer.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_customers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+# Index d'expression sur la table des utilisateurs (modèle de django.contrib.auth,
+# sans Meta modifiable) : recherches sans casse de customers.availability
+INDEXES = [
+    models.Index(Lower('username'), name='user_username_lower_idx'),
+    models.Index(Lower('email'), name='user_email_lower_idx'),
+]
+
+
+def add_indexes(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    for index in INDEXES:
+        schema_editor.add_index(User, index)
+
+
+def remove_indexes(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    for index in INDEXES:
+        schema_editor.remove_index(User, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0002_create_missing_customers'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(add_indexes, remove_indexes),
+    ]
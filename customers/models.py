@@ -12,3 +12,15 @@ class Customer(models.Model):
     def __str__(self):
         return f'Customer {self.user.username}'
 
+
+
+class AccountDeletion(models.Model):
+    """Compte désactivé en attente de suppression (voir customers.deletion)"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='deletion')
+    requested = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('requested',)
+
+    def __str__(self):
+        return f'Suppression du compte {self.user_id}'
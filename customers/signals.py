@@ -0,0 +1,23 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .availability import remember
+from .models import Customer
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    """Nom d'utilisateur et email du compte ajoutés au filtre de disponibilité"""
+    transaction.on_commit(lambda: remember(instance))
+
+
+@receiver(post_save, sender=User)
+def create_customer(sender, instance, created, raw=False, **kwargs):
+    """
+    Profil client créé avec le compte, quelle que soit son origine
+    (inscription, createsuperuser, admin) : aucune requête n'a à le créer
+    """
+    if created and not raw:
+        Customer.objects.create(user=instance)
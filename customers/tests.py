@@ -1,3 +1,310 @@
-from django.test import TestCase
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache, caches
+from axes.models import AccessFailureLog, AccessLog
+from django.db import connection
+from django.contrib.auth import hashers
+from django.core.management import call_command
+from django.test import (
+    AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from orders.models import Order, OrderItem
+from products.models import Category, Product
+from .availability import build_filter, is_available, maybe_taken, users_matching
+from .checks import sliding_window_cache_check
+from .deletion import process_deletions
+from .lockout import audit_buffer
+from .middleware import CustomerMiddleware
+from .models import AccountDeletion, Customer
+
+
+class CustomerMiddlewareTests(TestCase):
+
+    def resolve(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        CustomerMiddleware(lambda request: None)(request)
+        return request.customer
+
+    def test_customer_loaded_with_user(self):
+        user = User.objects.create_user(username='buyer', password='complexpassword123')
+        customer = user.customer
+        self.client.force_login(user)
+        audit_buffer.flush()
+        # Session, utilisateur joint à son profil, enregistrement de la session (avec savepoint) :
+        # ni lecture séparée ni écriture du profil
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('customers:profile'))
+        self.assertEqual(response.context['customer'].pk, customer.pk)
+
+    def test_profile_created_with_account(self):
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'complexpassword123')
+        self.assertEqual(Customer.objects.get().user_id, user.pk)
+        # Lecture seule : un compte sans profil (fixture) n'en reçoit pas pendant la requête
+        Customer.objects.all().delete()
+        user = User.objects.get(pk=user.pk)
+        with self.assertNumQueries(1):
+            self.assertFalse(self.resolve(user))
+        self.assertFalse(Customer.objects.exists())
+
+    def test_anonymous(self):
+        with self.assertNumQueries(0):
+            self.assertFalse(self.resolve(AnonymousUser()))
+
+    def test_registration_creates_profile(self):
+        self.client.post(reverse('customers:register'), {
+            'username': 'nouveau', 'email': 'nouveau@example.com', 'first_name': 'N', 'last_name': 'U',
+            'password1': 'complexpassword123', 'password2': 'complexpassword123',
+            'phone_number': '0611111111', 'address': '1 rue',
+        })
+        self.assertEqual(Customer.objects.get(user__username='nouveau').phone_number, '0611111111')
+
+
+class AvailabilityTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user(username='Amina', email='Amina@Example.com', password='complexpassword123')
+
+    def test_case_insensitive(self):
+        self.assertFalse(is_available('username', 'amina'))
+        self.assertFalse(is_available('email', 'amina@example.COM'))
+        user = User.objects.get(username='Amina')
+        self.assertTrue(is_available('email', 'amina@example.com', exclude_user_id=user.pk))
+
+    def test_non_ascii_values(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user(username='Élodie', email='Élodie@Exemple.com', password='complexpassword123')
+        for built in (False, True):
+            if built:
+                call_command('build_availability_filters', stdout=StringIO())
+            self.assertFalse(is_available('username', 'Élodie'))
+            self.assertFalse(is_available('username', 'ÉLODIE'))
+            self.assertFalse(is_available('email', 'Élodie@exemple.COM'))
+            self.assertTrue(is_available('username', 'Éloïse'))
+
+    def test_filter_answers_available_without_query(self):
+        # Sans filtre construit : vérification en base
+        with self.assertNumQueries(1):
+            self.assertTrue(is_available('username', 'personne'))
+        call_command('build_availability_filters', stdout=StringIO())
+        with self.assertNumQueries(0):
+            self.assertTrue(is_available('username', 'personne'))
+        self.assertFalse(is_available('username', 'AMINA'))
+
+        # Compte créé après la construction du filtre
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user(username='personne', password='complexpassword123')
+        with self.assertNumQueries(1):
+            self.assertFalse(is_available('username', 'PERSONNE'))
+
+    def test_filter_blocks(self):
+        User.objects.bulk_create([User(username=f'client{i}', email=f'client{i}@example.com') for i in range(5000)])
+        self.assertEqual(build_filter('email'), 2)
+        self.assertTrue(all(maybe_taken('email', f'client{i}@example.com') for i in range(5000)))
+        false_positives = sum(maybe_taken('email', f'autre{i}@example.com') for i in range(5000))
+        self.assertLess(false_positives, 50)
+        # Bloc évincé du cache : réponse prudente, vérifiée en base
+        cache.clear()
+        self.assertTrue(maybe_taken('email', 'autre@example.com'))
+
+    @skipUnless(connection.vendor == 'sqlite', "Plans d'exécution au format SQLite")
+    def test_lookups_use_lower_indexes(self):
+        self.assertIn('user_username_lower_idx', users_matching('username', 'amina').explain())
+        self.assertIn('user_email_lower_idx', users_matching('email', 'amina@example.com').explain())
+
+    @override_settings(RATE_LIMITS={'availability': (2, 60)})
+    def test_rate_limited_per_ip(self):
+        url = reverse('customers:check_username')
+        for _ in range(2):
+            self.assertEqual(self.client.get(url, {'username': 'amina'}).json(), {'available': False})
+        response = self.client.get(url, {'username': 'amina'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+        # Autre adresse IP
+        self.assertEqual(self.client.get(url, {'username': 'amina'}, REMOTE_ADDR='10.0.0.2').status_code, 200)
+
+    @override_settings(RATE_LIMITS={'availability': (1, 60)})
+    async def test_async_client(self):
+        url = reverse('customers:check_email')
+        response = await self.async_client.get(url, {'email': 'AMINA@example.com'})
+        self.assertEqual(response.json(), {'available': False})
+        response = await self.async_client.get(url, {'email': 'autre@example.com'})
+        self.assertEqual((response.status_code, response['Retry-After']), (429, '60'))
+
+    def test_registration_rejects_case_variants(self):
+        response = self.client.post(reverse('customers:register'), {
+            'username': 'AMINA', 'email': 'amina@example.com', 'first_name': 'A', 'last_name': 'B',
+            'password1': 'complexpassword123', 'password2': 'complexpassword123',
+        })
+        self.assertEqual(set(response.context['form'].errors), {'username', 'email'})
+
+
+# Gestionnaire utilisé avec Redis ; le cache local des tests incrémente de façon atomique
+@override_settings(AXES_HANDLER='customers.lockout.SlidingWindowHandler')
+class LoginLockoutTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        audit_buffer.flush()
+        User.objects.create_user(username='amina', password='complexpassword123')
+
+    def login(self, password, **extra):
+        return self.client.post(reverse('customers:login'), {'username': 'amina', 'password': password}, **extra)
+
+    def test_locked_out_across_windows(self):
+        for _ in range(4):
+            self.assertEqual(self.login('mauvais').status_code, 200)
+        self.assertEqual(self.login('mauvais').status_code, 429)
+        # Bon mot de passe refusé pendant le blocage, y compris depuis un autre processus (cache partagé)
+        self.assertEqual(self.login('complexpassword123').status_code, 429)
+
+        # Les échecs sortent de la fenêtre glissante
+        later = time.time() + 16 * 60
+        with mock.patch('customers.lockout.time.time', return_value=later):
+            self.assertEqual(self.login('complexpassword123').status_code, 302)
+
+    def test_bucket_expiring_between_add_and_incr(self):
+        self.login('mauvais')
+        with mock.patch.object(type(caches['default']), 'incr', side_effect=ValueError):
+            self.assertEqual(self.login('mauvais').status_code, 200)
+        self.assertEqual(self.login('mauvais').status_code, 200)
+
+    def test_success_resets_failures(self):
+        for _ in range(4):
+            self.login('mauvais')
+        self.assertEqual(self.login('complexpassword123').status_code, 302)
+        self.client.logout()
+        self.assertEqual(self.login('mauvais').status_code, 200)
+
+    def test_audit_rows_written_in_batches(self):
+        self.login('mauvais')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.login('complexpassword123').status_code, 302)
+        self.assertFalse([q['sql'] for q in queries if 'axes_' in q['sql']])
+        self.client.post(reverse('customers:logout'))
+
+        self.assertEqual(audit_buffer.flush(), 3)
+        self.assertEqual(AccessFailureLog.objects.get().username, 'amina')
+        self.assertIsNotNone(AccessLog.objects.get(username='amina').logout_time)
+
+
+class LockoutConfigurationTests(SimpleTestCase):
+
+    def test_sliding_window_requires_atomic_shared_cache(self):
+        sliding = 'customers.lockout.SlidingWindowHandler'
+        for handler, backend, errors in [
+            (sliding, 'django.core.cache.backends.locmem.LocMemCache', ['customers.E001']),
+            (sliding, 'django.core.cache.backends.filebased.FileBasedCache', ['customers.E001']),
+            (sliding, 'django.core.cache.backends.redis.RedisCache', []),
+            ('axes.handlers.database.AxesDatabaseHandler', 'django.core.cache.backends.locmem.LocMemCache', []),
+        ]:
+            with self.subTest(handler=handler, backend=backend), override_settings(
+                AXES_HANDLER=handler, CACHES={'default': {'BACKEND': backend, 'LOCATION': 'parfumerie-check'}}
+            ):
+                self.assertEqual([error.id for error in sliding_window_cache_check(None)], errors)
+
+
+class PasswordHashingTests(TestCase):
+
+    def count_hashes(self):
+        # Un seul algorithme pour les deux sens : vérification et création d'empreinte
+        return mock.patch.object(hashers.PBKDF2PasswordHasher, 'encode', autospec=True,
+                                 side_effect=hashers.PBKDF2PasswordHasher.encode)
+
+    def test_login_hashes_once(self):
+        User.objects.create_user(username='amina', password='complexpassword123')
+        with self.count_hashes() as encode:
+            response = self.client.post(reverse('customers:login'),
+                                        {'username': 'amina', 'password': 'complexpassword123'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(encode.call_count, 1)
+
+    def test_register_hashes_once(self):
+        with self.count_hashes() as encode:
+            response = self.client.post(reverse('customers:register'), {
+                'username': 'nouveau', 'email': 'nouveau@example.com', 'first_name': 'N', 'last_name': 'U',
+                'password1': 'complexpassword123', 'password2': 'complexpassword123',
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(encode.call_count, 1)
+        self.assertEqual(int(self.client.session['_auth_user_id']), User.objects.get(username='nouveau').pk)
+
+
+class AsyncLoginTests(TransactionTestCase):
+    # Les threads du pool utilisent leur propre connexion : données validées
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username='amina', password='complexpassword123')
+
+    async def test_async_login(self):
+        response = await self.async_client.post(reverse('customers:login_async'),
+                                                {'username': 'amina', 'password': 'complexpassword123'})
+        self.assertEqual(response.status_code, 302)
+        response = await AsyncClient().post(reverse('customers:login_async'),
+                                            {'username': 'amina', 'password': 'mauvais'})
+        self.assertEqual(response.status_code, 200)
+
+    async def test_pool_threads_release_connections(self):
+        # Connexion du thread du pool fermée avant et après la vue (sauf base en mémoire des tests)
+        with mock.patch('customers.hashing.close_old_connections') as close:
+            response = await self.async_client.get(reverse('customers:login_async'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(close.call_count, 2)
+
+
+class AccountDeletionTests(TestCase):
+
+    def setUp(self):
+        product = Product.objects.create(category=Category.objects.create(name='Oud', slug='oud'), name='Oud Royal',
+                                         slug='oud-royal', price=Decimal('500.00'))
+        self.user = User.objects.create_user(username='amina', password='complexpassword123')
+        self.customer = self.user.customer
+        orders = Order.objects.bulk_create([
+            Order(customer=self.customer, first_name='Amina', last_name='B', email='amina@example.com',
+                  address='1 rue', postal_code='20000', city='Casablanca', total_cost=Decimal('500.00'))
+            for _ in range(5)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, price=product.price, quantity=1) for order in orders
+        ])
+        self.client.force_login(self.user)
+
+    def test_request_deactivates_at_once(self):
+        # Aucune commande chargée ni modifiée pendant la requête
+        response = self.client.post(reverse('customers:account_delete'))
+        self.assertRedirects(response, reverse('products:product_list'), fetch_redirect_response=False)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertTrue(AccountDeletion.objects.filter(user=self.user).exists())
+        self.assertEqual(Order.objects.filter(customer=self.customer).count(), 5)
+        response = self.client.post(reverse('customers:login'), {'username': 'amina', 'password': 'complexpassword123'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_orders_anonymized_in_batches(self):
+        self.client.post(reverse('customers:account_delete'))
+
+        # Deux lots de deux commandes : le compte attend le passage suivant
+        with self.assertNumQueries(10):
+            self.assertEqual(process_deletions(batch_size=2, max_batches=2), (4, 0))
+        self.assertTrue(User.objects.filter(pk=self.user.pk).exists())
+
+        out = StringIO()
+        call_command('process_account_deletions', '--batch-size', '2', stdout=out)
+        self.assertIn('1 commande(s) anonymisée(s), 1 compte(s) supprimé(s)', out.getvalue())
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertFalse(AccountDeletion.objects.exists())
+
+        # Commandes et lignes conservées pour la comptabilité, sans données personnelles
+        self.assertEqual(OrderItem.objects.count(), 5)
+        self.assertEqual(set(Order.objects.values_list('customer', 'first_name', 'email', 'total_cost')),
+                         {(None, '', '', Decimal('500.00'))})
@@ -8,6 +8,9 @@ urlpatterns = [
     path('register/', views.register_view, name='register'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
+    # Hachage des mots de passe dans un pool borné (serveur ASGI)
+    path('async/register/', views.register_async_view, name='register_async'),
+    path('async/login/', views.login_async_view, name='login_async'),
     
     # Profil utilisateur
     path('profile/', views.profile_view, name='profile'),
@@ -1,10 +1,12 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth import login, authenticate, logout
+from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.contrib.auth.models import User
 from django.http import JsonResponse
-from .models import Customer
+from parfumerie.ratelimit import rate_limit
+from .availability import ais_available
+from .deletion import request_deletion
+from .hashing import in_hashing_pool
 from .forms import (
     CustomUserCreationForm, 
     CustomAuthenticationForm, 
@@ -28,12 +30,11 @@ def register_view(request):
             username = form.cleaned_data.get('username')
             messages.success(request, f'Compte créé avec succès pour {username}! Vous pouvez maintenant vous connecter.')
             
-            # Connecter automatiquement l'utilisateur après l'inscription
-            user = authenticate(username=user.username, password=form.cleaned_data.get('password1'))
-            if user:
-                login(request, user)
-                messages.success(request, f'Bienvenue {user.first_name}!')
-                return redirect('products:product_list')
+            # Connecter automatiquement l'utilisateur après l'inscription, sans
+            # hacher de nouveau le mot de passe qui vient de l'être
+            login(request, user, backend='customers.backends.CustomerBackend')
+            messages.success(request, f'Bienvenue {user.first_name}!')
+            return redirect('products:product_list')
     else:
         form = CustomUserCreationForm()
     
@@ -54,16 +55,14 @@ def login_view(request):
     if request.method == 'POST':
         form = CustomAuthenticationForm(request, data=request.POST)
         if form.is_valid():
-            username = form.cleaned_data.get('username')
-            password = form.cleaned_data.get('password')
-            user = authenticate(username=username, password=password)
-            if user is not None:
-                login(request, user)
-                messages.success(request, f'Bienvenue {user.first_name}!')
-                
-                # Rediriger vers la page demandée ou la page d'accueil
-                next_page = request.GET.get('next', 'products:product_list')
-                return redirect(next_page)
+            # Utilisateur déjà authentifié par le formulaire : un seul hachage du mot de passe
+            user = form.get_user()
+            login(request, user)
+            messages.success(request, f'Bienvenue {user.first_name}!')
+            
+            # Rediriger vers la page demandée ou la page d'accueil
+            next_page = request.GET.get('next', 'products:product_list')
+            return redirect(next_page)
         else:
             messages.error(request, 'Nom d\'utilisateur ou mot de passe incorrect.')
     else:
@@ -76,6 +75,12 @@ def login_view(request):
     return render(request, 'customers/login.html', context)
 
 
+# Variantes asynchrones : le hachage des mots de passe s'exécute dans un pool
+# borné, sans occuper le thread ou la boucle d'événements du serveur
+register_async_view = in_hashing_pool(register_view)
+login_async_view = in_hashing_pool(login_view)
+
+
 def logout_view(request):
     """
     Vue de déconnexion des utilisateurs
@@ -92,14 +97,8 @@ def profile_view(request):
     """
     Vue du profil utilisateur
     """
-    try:
-        customer = request.user.customer
-    except Customer.DoesNotExist:
-        # Créer un profil client si il n'existe pas
-        customer = Customer.objects.create(user=request.user)
-    
     context = {
-        'customer': customer,
+        'customer': request.customer,
         'title': 'Mon Profil'
     }
     return render(request, 'customers/profile.html', context)
@@ -110,10 +109,7 @@ def profile_edit_view(request):
     """
     Vue de modification du profil utilisateur
     """
-    try:
-        customer = request.user.customer
-    except Customer.DoesNotExist:
-        customer = Customer.objects.create(user=request.user)
+    customer = request.customer
     
     if request.method == 'POST':
         user_form = UserProfileForm(request.POST, instance=request.user)
@@ -165,7 +161,9 @@ def account_delete_view(request):
     if request.method == 'POST':
         user = request.user
         username = user.first_name or user.username
-        user.delete()
+        # Compte désactivé tout de suite, commandes anonymisées puis compte supprimé en arrière-plan
+        request_deletion(user)
+        logout(request)
         messages.success(request, f'Votre compte a été supprimé avec succès. Au revoir {username}!')
         return redirect('products:product_list')
     
@@ -175,19 +173,21 @@ def account_delete_view(request):
     return render(request, 'customers/account_delete.html', context)
 
 
-def check_username_availability(request):
+# Vérifications à la frappe : vues asynchrones, servies en ASGI sans occuper de thread
+@rate_limit('availability')
+async def check_username_availability(request):
     """
     API pour vérifier la disponibilité d'un nom d'utilisateur
     """
     if request.method == 'GET':
         username = request.GET.get('username', '')
         if username:
-            is_available = not User.objects.filter(username=username).exists()
-            return JsonResponse({'available': is_available})
+            return JsonResponse({'available': await ais_available('username', username)})
     return JsonResponse({'available': False})
 
 
-def check_email_availability(request):
+@rate_limit('availability')
+async def check_email_availability(request):
     """
     API pour vérifier la disponibilité d'une adresse email
     """
@@ -196,10 +196,6 @@ def check_email_availability(request):
         user_id = request.GET.get('user_id', None)
         
         if email:
-            query = User.objects.filter(email=email)
-            if user_id:
-                query = query.exclude(id=user_id)
-            is_available = not query.exists()
-            return JsonResponse({'available': is_available})
+            exclude = int(user_id) if user_id and user_id.isdigit() else None
+            return JsonResponse({'available': await ais_available('email', email, exclude_user_id=exclude)})
     return JsonResponse({'available': False})
-
@@ -0,0 +1,85 @@
+from django import forms
+from django.contrib import admin, messages
+from django.http import HttpResponseRedirect
+from django.urls import reverse
+from .ledger import InsufficientStock, record_movement
+from .models import StockMovement, StockReservation, StockSnapshot
+
+
+class StockMovementForm(forms.ModelForm):
+    class Meta:
+        model = StockMovement
+        fields = ['product', 'kind', 'quantity', 'order', 'note']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        product, quantity = cleaned_data.get('product'), cleaned_data.get('quantity')
+        if product and quantity is not None and product.stock_quantity + quantity < 0:
+            raise forms.ValidationError(f"Stock insuffisant : {product.stock_quantity} en stock.")
+        return cleaned_data
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    form = StockMovementForm
+    list_display = ['id', 'product', 'kind', 'quantity', 'order', 'user', 'note', 'created']
+    list_filter = ['kind', 'created']
+    search_fields = ['product__name', 'note']
+    raw_id_fields = ['product', 'order']
+    list_select_related = ['product', 'user']
+    fields = ['product', 'kind', 'quantity', 'order', 'note']
+
+    # Journal en ajout seul : les mouvements ne sont ni modifiés ni supprimés
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def save_model(self, request, obj, form, change):
+        """Appliquer le mouvement au stock du produit en même temps que son enregistrement"""
+        try:
+            movement = record_movement(
+                obj.product, obj.quantity, obj.kind, order=obj.order, user=request.user, note=obj.note
+            )
+            obj.pk = movement.pk
+        except InsufficientStock:
+            # Stock modifié par une vente depuis la validation du formulaire
+            messages.error(request, f"Mouvement refusé : stock de '{obj.product}' insuffisant.")
+
+    def log_addition(self, request, obj, message):
+        if obj.pk:
+            return super().log_addition(request, obj, message)
+
+    def response_add(self, request, obj, post_url_continue=None):
+        if obj.pk is None:
+            return HttpResponseRedirect(reverse('admin:inventory_stockmovement_changelist'))
+        return super().response_add(request, obj, post_url_continue)
+
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['product', 'quantity', 'last_movement_id', 'created']
+    list_filter = ['created']
+    search_fields = ['product__name']
+    list_select_related = ['product']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ['product', 'quantity', 'holder', 'expires_at', 'created']
+    list_filter = ['expires_at']
+    search_fields = ['product__name', 'holder']
+    list_select_related = ['product']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,238 @@
+"""
+Journal des mouvements de stock.
+
+``Product.stock_quantity`` reste le stock courant (lecture en O(1)) mais n'est
+plus jamais réécrit avec une valeur lue auparavant : chaque mouvement applique
+un delta ``stock_quantity = stock_quantity + n`` dans le même UPDATE que la
+vérification du stock disponible, puis est ajouté au journal. Deux passages en
+caisse ou une modification dans l'admin simultanés ne s'écrasent donc plus.
+
+Le compactage enregistre périodiquement un instantané du stock par produit ;
+le stock à une date se calcule depuis le dernier instantané antérieur et les
+mouvements plus anciens peuvent être purgés.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, F, IntegerField, Max, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from orders.models import OrderItem
+from products.live import notify
+from products.models import Product
+from .models import StockMovement, StockSnapshot
+
+
+# Les mouvements plus récents ne sont pas compactés : une transaction encore
+# en cours peut avoir obtenu un identifiant plus petit que le dernier visible
+COMPACTION_LAG = timedelta(minutes=5)
+BATCH_SIZE = 2000
+
+
+class InsufficientStock(Exception):
+    """Stock insuffisant pour une sortie"""
+
+    def __init__(self, product_id, quantity, available=None):
+        self.product_id = product_id
+        self.quantity = quantity
+        self.available = available
+        super().__init__(f"Stock insuffisant pour le produit {product_id} (demandé : {quantity})")
+
+
+def _apply_delta(product_id, quantity):
+    """
+    Appliquer un delta au stock d'un produit en une seule requête ;
+    une sortie n'est appliquée que si le stock la couvre
+    """
+    products = Product.objects.filter(pk=product_id)
+    if quantity < 0:
+        products = products.filter(stock_quantity__gte=-quantity)
+    # updated : relu par les facettes du catalogue (products/facets.py)
+    if not products.update(stock_quantity=F('stock_quantity') + quantity, updated=timezone.now()):
+        raise InsufficientStock(product_id, -quantity)
+
+
+def record_movement(product, quantity, kind, order=None, user=None, note=''):
+    """
+    Enregistrer un mouvement de stock et l'appliquer au produit
+    """
+    product_id = getattr(product, 'pk', product)
+    with transaction.atomic():
+        if quantity:
+            _apply_delta(product_id, quantity)
+        movement = StockMovement.objects.create(
+            product_id=product_id, kind=kind, quantity=quantity, order=order, user=user, note=note
+        )
+        if quantity:
+            transaction.on_commit(notify)
+    return movement
+
+
+def record_sale(order, lines):
+    """
+    Sortir du stock les lignes d'une commande : ``lines`` est une liste de
+    (produit ou id, quantité). Tout ou rien : lève InsufficientStock si une
+    ligne n'est pas couverte.
+    """
+    quantities = defaultdict(int)
+    for product, quantity in lines:
+        quantities[getattr(product, 'pk', product)] += quantity
+    with transaction.atomic():
+        # Toujours dans le même ordre pour éviter les interblocages entre commandes
+        for product_id in sorted(quantities):
+            _apply_delta(product_id, -quantities[product_id])
+        StockMovement.objects.bulk_create([
+            StockMovement(product_id=product_id, kind=StockMovement.SALE, quantity=-quantity, order=order)
+            for product_id, quantity in sorted(quantities.items())
+        ])
+        # Stock affiché sur les pages ouvertes mis à jour après le commit
+        transaction.on_commit(notify)
+
+
+def record_adjustments(deltas, note=''):
+    """
+    Appliquer des écarts de stock (id du produit : delta) et les journaliser
+    comme ajustements. Les sorties que le stock ne couvre plus sont ignorées ;
+    retourne les ids de leurs produits.
+    """
+    movements, refused = [], []
+    with transaction.atomic():
+        for product_id, quantity in sorted(deltas.items()):
+            try:
+                _apply_delta(product_id, quantity)
+            except InsufficientStock:
+                refused.append(product_id)
+                continue
+            movements.append(StockMovement(
+                product_id=product_id, kind=StockMovement.ADJUSTMENT, quantity=quantity, note=note
+            ))
+        log_movements(movements)
+        if movements:
+            transaction.on_commit(notify)
+    return refused
+
+
+def log_movements(movements):
+    """
+    Journaliser des mouvements dont le stock a déjà été écrit par l'appelant
+    (création de produits, import d'inventaire)
+    """
+    StockMovement.objects.bulk_create(movements, batch_size=BATCH_SIZE)
+
+
+def _latest_snapshot(field, before=None):
+    snapshots = StockSnapshot.objects.filter(product=OuterRef('pk'))
+    if before is not None:
+        snapshots = snapshots.filter(created__lte=before)
+    return Subquery(snapshots.order_by('-last_movement_id').values(field)[:1])
+
+
+def _movements_sum(after, up_to=None, until=None):
+    movements = StockMovement.objects.filter(product=OuterRef('pk'), id__gt=after)
+    if up_to is not None:
+        movements = movements.filter(id__lte=up_to)
+    if until is not None:
+        movements = movements.filter(created__lte=until)
+    total = movements.order_by().values('product').annotate(total=Sum('quantity')).values('total')
+    return Coalesce(Subquery(total, output_field=IntegerField()), Value(0))
+
+
+def with_ledger_stock(products, at=None):
+    """
+    Annoter ``ledger_stock`` : le stock d'après le journal (dernier instantané
+    plus les mouvements suivants), à la date ``at`` si elle est donnée
+    """
+    return products.annotate(
+        snapshot_quantity=Coalesce(_latest_snapshot('quantity', at), Value(0)),
+        snapshot_movement=Coalesce(_latest_snapshot('last_movement_id', at), Value(0)),
+    ).annotate(
+        ledger_stock=F('snapshot_quantity') + _movements_sum(OuterRef('snapshot_movement'), until=at)
+    )
+
+
+def stock_at(product, at):
+    """Stock d'un produit à une date donnée, d'après le journal"""
+    return with_ledger_stock(Product.objects.filter(pk=getattr(product, 'pk', product)), at).values_list(
+        'ledger_stock', flat=True
+    ).first()
+
+
+def compact_ledger(now=None, prune_before=None):
+    """
+    Enregistrer un instantané pour chaque produit ayant des mouvements depuis
+    son dernier instantané. Avec ``prune_before``, les mouvements compactés
+    antérieurs à cette date sont supprimés. Retourne (instantanés, mouvements purgés).
+    """
+    now = now or timezone.now()
+    last_id = StockMovement.objects.filter(created__lte=now - COMPACTION_LAG).aggregate(last=Max('id'))['last']
+    if last_id is None:
+        return 0, 0
+
+    products = Product.objects.annotate(
+        snapshot_quantity=Coalesce(_latest_snapshot('quantity'), Value(0)),
+        snapshot_movement=Coalesce(_latest_snapshot('last_movement_id'), Value(0)),
+    ).filter(
+        # Uniquement les produits dont un mouvement n'est pas encore compacté
+        Exists(StockMovement.objects.filter(
+            product=OuterRef('pk'), id__gt=OuterRef('snapshot_movement'), id__lte=last_id
+        ))
+    ).annotate(
+        delta=_movements_sum(OuterRef('snapshot_movement'), up_to=last_id)
+    ).order_by('id').values_list('id', 'snapshot_quantity', 'delta')
+
+    created = 0
+    batch = []
+    for product_id, quantity, delta in products.iterator(chunk_size=BATCH_SIZE):
+        batch.append(StockSnapshot(product_id=product_id, quantity=quantity + delta, last_movement_id=last_id))
+        if len(batch) >= BATCH_SIZE:
+            StockSnapshot.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+    StockSnapshot.objects.bulk_create(batch)
+    created += len(batch)
+
+    pruned = 0
+    if prune_before is not None:
+        pruned, _ = StockMovement.objects.filter(id__lte=last_id, created__lt=prune_before).delete()
+    return created, pruned
+
+
+def ledger_start():
+    """Date d'ouverture du journal (premier instantané)"""
+    return StockSnapshot.objects.aggregate(start=Min('created'))['start']
+
+
+def sales_discrepancies(since=None):
+    """
+    Lignes de commande dont la quantité ne correspond pas aux ventes du journal :
+    (commande, produit, quantité commandée, quantité sortie du stock)
+    """
+    sold = StockMovement.objects.filter(
+        kind=StockMovement.SALE, order=OuterRef('order'), product=OuterRef('product')
+    ).order_by().values('order', 'product').annotate(total=Sum('quantity')).values('total')
+    items = OrderItem.objects.all()
+    if since is not None:
+        items = items.filter(order__created__gte=since)
+    return items.order_by('order', 'product').values('order', 'product').annotate(
+        ordered=Sum('quantity'),
+        sold=-Coalesce(Subquery(sold, output_field=IntegerField()), Value(0)),
+    ).exclude(ordered=F('sold')).values_list('order', 'product', 'ordered', 'sold')
+
+
+def orphan_sales(since=None):
+    """Ventes du journal sans ligne de commande correspondante"""
+    movements = StockMovement.objects.filter(kind=StockMovement.SALE).exclude(
+        Exists(OrderItem.objects.filter(order=OuterRef('order'), product=OuterRef('product')))
+    )
+    if since is not None:
+        movements = movements.filter(created__gte=since)
+    return movements.values_list('id', 'order', 'product', 'quantity')
+
+
+def balance_discrepancies():
+    """Produits dont le stock courant diffère du stock calculé par le journal"""
+    return with_ledger_stock(Product.objects.order_by('id')).exclude(
+        stock_quantity=F('ledger_stock')
+    ).values_list('id', 'name', 'stock_quantity', 'ledger_stock')
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from inventory.ledger import compact_ledger
+
+
+class Command(BaseCommand):
+    help = "Compacter le journal de stock : un instantané par produit modifié depuis le précédent"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune-days', type=int,
+                            help="Supprimer les mouvements compactés plus anciens que ce nombre de jours")
+
+    def handle(self, *args, **options):
+        prune_before = None
+        if options['prune_days'] is not None:
+            prune_before = timezone.now() - timedelta(days=options['prune_days'])
+        snapshots, pruned = compact_ledger(prune_before=prune_before)
+        self.stdout.write(self.style.SUCCESS(
+            f"{snapshots} instantané(s) enregistré(s), {pruned} mouvement(s) purgé(s)."
+        ))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import is_naive, make_aware
+
+from inventory.ledger import balance_discrepancies, ledger_start, orphan_sales, sales_discrepancies
+
+
+class Command(BaseCommand):
+    help = "Vérifier le journal de stock : ventes contre lignes de commande, stock courant contre journal"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Commandes à vérifier depuis cette date (ouverture du journal par défaut)")
+        parser.add_argument('--limit', type=int, default=50, help="Écarts affichés par catégorie")
+
+    def handle(self, *args, **options):
+        since = ledger_start()
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError(f"Date invalide : {options['since']}")
+            if is_naive(since):
+                since = make_aware(since)
+
+        problems = 0
+        limit = options['limit']
+
+        sales = sales_discrepancies(since)
+        for order_id, product_id, ordered, sold in sales[:limit]:
+            self.stdout.write(f"Commande {order_id}, produit {product_id} : {ordered} commandé(s), {sold} sorti(s) du stock")
+        count = sales.count()
+        problems += count
+        self.stdout.write(f"Lignes de commande sans vente correspondante : {count}")
+
+        orphans = orphan_sales(since)
+        for movement_id, order_id, product_id, quantity in orphans[:limit]:
+            self.stdout.write(f"Mouvement {movement_id} : vente de {-quantity} (produit {product_id}) sans ligne dans la commande {order_id}")
+        count = orphans.count()
+        problems += count
+        self.stdout.write(f"Ventes sans ligne de commande : {count}")
+
+        balances = balance_discrepancies()
+        for product_id, name, stock, ledger_stock in balances[:limit]:
+            self.stdout.write(f"Produit {product_id} ({name}) : stock {stock}, journal {ledger_stock}")
+        count = balances.count()
+        problems += count
+        self.stdout.write(f"Stocks différents du journal : {count}")
+
+        if problems:
+            raise CommandError(f"{problems} écart(s) trouvé(s)")
+        self.stdout.write(self.style.SUCCESS("Journal de stock cohérent."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from inventory.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = "Supprimer les réservations de stock expirées des paniers, par lots"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Nombre de réservations supprimées par requête")
+
+    def handle(self, *args, **options):
+        released = release_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{released} réservation(s) expirée(s) supprimée(s)."))
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('orders', '0003_order_payment_method'),
+        ('products', '0005_product_discount_columns'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('receipt', 'Réception'), ('sale', 'Vente'), ('adjustment', 'Ajustement'), ('return', 'Retour')], max_length=20)),
+                ('quantity', models.IntegerField(help_text='Positive pour une entrée, négative pour une sortie')),
+                ('note', models.CharField(blank=True, max_length=250)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='orders.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='products.product')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('-id',),
+                'indexes': [models.Index(fields=['product', 'id'], name='inventory_s_product_bca1da_idx'), models.Index(fields=['order', 'product'], name='inventory_s_order_i_06d786_idx'), models.Index(fields=['created'], name='inventory_s_created_f2f6c3_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('last_movement_id', models.BigIntegerField(default=0)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='products.product')),
+            ],
+            options={
+                'ordering': ('-last_movement_id',),
+                'indexes': [models.Index(fields=['product', '-last_movement_id'], name='inventory_s_product_ed0453_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def create_opening_snapshots(apps, schema_editor):
+    """
+    Ouvrir le journal : un instantané par produit avec le stock actuel
+    """
+    Product = apps.get_model('products', 'Product')
+    StockSnapshot = apps.get_model('inventory', 'StockSnapshot')
+    batch = []
+    for product_id, quantity in Product.objects.values_list('id', 'stock_quantity').iterator(chunk_size=2000):
+        batch.append(StockSnapshot(product_id=product_id, quantity=quantity, last_movement_id=0))
+        if len(batch) >= 2000:
+            StockSnapshot.objects.bulk_create(batch)
+            batch = []
+    StockSnapshot.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_opening_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,88 @@
+from django.conf import settings
+from django.db import models
+from products.models import Product
+from orders.models import Order
+
+
+class StockMovement(models.Model):
+    """
+    Mouvement de stock (journal en ajout seul) : la quantité est signée,
+    positive pour une entrée, négative pour une sortie
+    """
+    RECEIPT = 'receipt'
+    SALE = 'sale'
+    ADJUSTMENT = 'adjustment'
+    RETURN = 'return'
+    KIND_CHOICES = [
+        (RECEIPT, 'Réception'),
+        (SALE, 'Vente'),
+        (ADJUSTMENT, 'Ajustement'),
+        (RETURN, 'Retour'),
+    ]
+
+    product = models.ForeignKey(Product, related_name='stock_movements', on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    quantity = models.IntegerField(help_text="Positive pour une entrée, négative pour une sortie")
+    order = models.ForeignKey(Order, related_name='stock_movements', on_delete=models.SET_NULL, null=True, blank=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='stock_movements',
+                             on_delete=models.SET_NULL, null=True, blank=True)
+    note = models.CharField(max_length=250, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('-id',)
+        indexes = [
+            models.Index(fields=['product', 'id']),
+            models.Index(fields=['order', 'product']),
+            models.Index(fields=['created']),
+        ]
+
+    def __str__(self):
+        return f'{self.get_kind_display()} {self.quantity:+d} - {self.product_id}'
+
+
+class StockSnapshot(models.Model):
+    """
+    Stock d'un produit après tous les mouvements jusqu'à ``last_movement_id`` :
+    le stock à une date se calcule depuis le dernier instantané, sans
+    parcourir tout l'historique
+    """
+    product = models.ForeignKey(Product, related_name='stock_snapshots', on_delete=models.CASCADE)
+    quantity = models.IntegerField()
+    last_movement_id = models.BigIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('-last_movement_id',)
+        indexes = [
+            models.Index(fields=['product', '-last_movement_id']),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} : {self.quantity} ({self.created:%d/%m/%Y %H:%M})'
+
+
+class StockReservation(models.Model):
+    """
+    Quantité d'un produit retenue par un panier jusqu'à ``expires_at``.
+    ``holder`` est le jeton de réservation conservé dans la session du panier.
+    """
+    product = models.ForeignKey(Product, related_name='stock_reservations', on_delete=models.CASCADE)
+    holder = models.CharField(max_length=32)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['holder', 'product'], name='unique_stock_reservation'),
+        ]
+        indexes = [
+            # Somme des réservations actives d'un produit
+            models.Index(fields=['product', 'expires_at']),
+            # Balayage des réservations expirées
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.quantity} × {self.product_id} ({self.holder})'
@@ -0,0 +1,115 @@
+"""
+Réservations de stock des paniers.
+
+Un panier retient ses articles pendant ``STOCK_RESERVATION_TTL`` secondes,
+délai prolongé à chaque modification ou consultation du panier. Le stock
+disponible à la vente d'un produit est son stock moins les réservations
+actives des autres paniers ; les réservations expirées sont simplement
+ignorées, le balayage (release_expired_reservations) ne fait que les supprimer.
+
+Le stock disponible est lu et la réservation écrite dans une même transaction
+qui sérialise les paniers d'un même produit, quel que soit le processus qui
+traite leurs requêtes : deux paniers ne peuvent pas retenir la même dernière
+bouteille. Sur PostgreSQL, la transaction verrouille les lignes des produits
+(``select_for_update``) ; sur SQLite, qui ignore ``select_for_update``, elle
+prend le verrou d'écriture de la base dès son début (``transaction_mode``
+``IMMEDIATE`` dans ``settings.DATABASES``) et les autres l'attendent.
+"""
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from products.models import Product
+from .ledger import InsufficientStock
+from .models import StockReservation
+
+
+def new_holder():
+    """Jeton de réservation d'un panier"""
+    return secrets.token_hex(16)
+
+
+def reservation_ttl():
+    return timedelta(seconds=getattr(settings, 'STOCK_RESERVATION_TTL', 15 * 60))
+
+
+def active_reservations(now=None):
+    return StockReservation.objects.filter(expires_at__gt=now or timezone.now())
+
+
+def reserve_many(holder, quantities, now=None, partial=False):
+    """
+    Réserver pour un panier les quantités ``{produit: quantité}`` (quantités
+    totales, pas des ajouts) et prolonger ces réservations.
+    Retourne le stock disponible de chaque produit pour ce panier. Si une
+    quantité dépasse ce disponible, lève InsufficientStock, ou avec
+    ``partial`` réserve seulement le disponible.
+    """
+    quantities = {getattr(product, 'pk', product): quantity for product, quantity in quantities.items()}
+    now = now or timezone.now()
+    with transaction.atomic():
+        # Verrou des lignes produit (de la base sur SQLite), toujours dans le
+        # même ordre : les réservations d'un même produit sont sérialisées
+        stock = dict(Product.objects.select_for_update().filter(id__in=quantities).order_by('id').values_list(
+            'id', 'stock_quantity'
+        ))
+        held = dict(active_reservations(now).filter(product_id__in=stock).exclude(holder=holder).order_by().values(
+            'product'
+        ).annotate(total=Sum('quantity')).values_list('product', 'total'))
+        available = {product_id: max(quantity - held.get(product_id, 0), 0) for product_id, quantity in stock.items()}
+
+        reserved = {}
+        for product_id in sorted(available):
+            quantity = quantities[product_id]
+            if quantity > available[product_id]:
+                if not partial:
+                    raise InsufficientStock(product_id, quantity, available=available[product_id])
+                quantity = available[product_id]
+            reserved[product_id] = quantity
+
+        StockReservation.objects.bulk_create(
+            [
+                StockReservation(holder=holder, product_id=product_id, quantity=quantity,
+                                 expires_at=now + reservation_ttl())
+                for product_id, quantity in reserved.items() if quantity > 0
+            ],
+            update_conflicts=True,
+            unique_fields=['holder', 'product'],
+            update_fields=['quantity', 'expires_at'],
+        )
+        if partial and not all(reserved.values()):
+            release(holder, [product_id for product_id, quantity in reserved.items() if not quantity])
+    return available
+
+
+def reserve(holder, product, quantity, now=None):
+    """Réserver un produit pour un panier ; lève InsufficientStock"""
+    return reserve_many(holder, {product: quantity}, now)[getattr(product, 'pk', product)]
+
+
+def release(holder, products=None):
+    """Libérer les réservations d'un panier (ou seulement celles de ``products``)"""
+    reservations = StockReservation.objects.filter(holder=holder)
+    if products is not None:
+        reservations = reservations.filter(product_id__in=[getattr(product, 'pk', product) for product in products])
+    reservations.delete()
+
+
+def release_expired(batch_size=1000, now=None):
+    """
+    Supprimer les réservations expirées par lots (transactions courtes).
+    Retourne le nombre de réservations supprimées.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        ids = list(StockReservation.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return released
+        # La condition d'expiration est revérifiée : une réservation prolongée entre-temps est conservée
+        deleted, _ = StockReservation.objects.filter(id__in=ids, expires_at__lte=now).delete()
+        released += deleted
@@ -0,0 +1,279 @@
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from products.models import Category, Product
+from .ledger import (
+    InsufficientStock, balance_discrepancies, compact_ledger, record_movement, record_sale,
+    sales_discrepancies, stock_at,
+)
+from .models import StockMovement, StockReservation, StockSnapshot
+from . import reservations
+from .reservations import release_expired, reserve
+
+
+class StockLedgerTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Oud', slug='oud')
+        self.product = Product.objects.create(category=category, name='Oud Royal', slug='oud-royal',
+                                              price=Decimal('500.00'), stock_quantity=5)
+        self.other = Product.objects.create(category=category, name='Oud Noir', slug='oud-noir',
+                                            price=Decimal('300.00'), stock_quantity=1)
+        StockSnapshot.objects.create(product=self.product, quantity=5)
+        StockSnapshot.objects.create(product=self.other, quantity=1)
+        self.user = User.objects.create_user(username='buyer', password='complexpassword123')
+        self.customer = self.user.customer
+
+    def stock(self, product):
+        return Product.objects.values_list('stock_quantity', flat=True).get(pk=product.pk)
+
+    def create_order(self, *lines):
+        order = Order.objects.create(customer=self.customer, first_name='A', last_name='B', email='a@example.com',
+                                     address='1 rue', postal_code='20000', city='Casablanca')
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, price=product.price, quantity=quantity)
+            for product, quantity in lines
+        ])
+        return order
+
+    def test_sale_is_all_or_nothing(self):
+        order = self.create_order((self.product, 2), (self.other, 2))
+        with self.assertRaises(InsufficientStock) as raised:
+            record_sale(order, [(self.product, 2), (self.other, 2)])
+        self.assertEqual(raised.exception.product_id, self.other.pk)
+        self.assertEqual((self.stock(self.product), self.stock(self.other)), (5, 1))
+        self.assertFalse(StockMovement.objects.exists())
+
+        record_sale(order, [(self.product, 1), (self.product, 1), (self.other, 1)])
+        self.assertEqual((self.stock(self.product), self.stock(self.other)), (3, 0))
+        self.assertEqual(StockMovement.objects.get(product=self.product).quantity, -2)
+
+    def test_order_create_records_sale(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('cart:cart_add', args=[self.other.pk]), {'quantity': 1})
+        Product.objects.filter(pk=self.other.pk).update(stock_quantity=0)
+
+        data = {'first_name': 'A', 'last_name': 'B', 'email': 'a@example.com', 'address': '1 rue',
+                'postal_code': '20000', 'city': 'Casablanca', 'payment_method': 'cash_on_delivery'}
+        response = self.client.post(reverse('orders:order_create'), data)
+        self.assertRedirects(response, reverse('cart:cart_detail'), fetch_redirect_response=False)
+        self.assertFalse(Order.objects.exists())
+
+        Product.objects.filter(pk=self.other.pk).update(stock_quantity=1)
+        self.client.post(reverse('orders:order_create'), data)
+        order = Order.objects.get()
+        self.assertEqual(self.stock(self.other), 0)
+        self.assertEqual(list(order.stock_movements.values_list('kind', 'quantity')), [(StockMovement.SALE, -1)])
+
+    def test_admin_edit_writes_delta(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'complexpassword123')
+        self.client.force_login(admin_user)
+        url = reverse('admin:products_product_changelist')
+        # Formulaire affiché avec 5 en stock, puis une vente de 2 avant l'enregistrement
+        record_movement(self.product, -2, StockMovement.SALE)
+        response = self.client.post(url, {
+            'form-TOTAL_FORMS': 2, 'form-INITIAL_FORMS': 2,
+            'form-0-id': self.other.pk, 'form-0-price': '300.00', 'form-0-available': 'on',
+            'form-0-stock_quantity': 1, 'form-0-original_price': '', 'initial-form-0-stock_quantity': 1,
+            'form-1-id': self.product.pk, 'form-1-price': '500.00', 'form-1-available': 'on',
+            'form-1-stock_quantity': 15, 'form-1-original_price': '',
+            'initial-form-1-stock_quantity': 5, '_save': 'Enregistrer',
+        }, secure=True)
+        self.assertEqual(response.status_code, 302)
+        # +10 saisis dans l'admin, la vente n'est pas écrasée
+        self.assertEqual(self.stock(self.product), 13)
+        movement = StockMovement.objects.filter(kind=StockMovement.ADJUSTMENT).get()
+        self.assertEqual((movement.quantity, movement.user), (10, admin_user))
+
+    def test_product_save_keeps_ledger_stock(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        record_sale(None, [(self.product, 2)])
+        stale.price = Decimal('450.00')
+        stale.save()
+        self.assertEqual(self.stock(self.product), 3)
+
+        staff = User.objects.create_user(username='staff', password='complexpassword123', is_staff=True)
+        self.client.force_login(staff)
+        record_sale(None, [(self.product, 1)])
+        response = self.client.post(reverse('products:product_update', args=[self.product.pk]), {
+            'category': self.product.category_id, 'name': 'Oud Royal', 'slug': 'oud-royal',
+            'description': '', 'price': '400.00', 'available': 'on',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.stock(self.product), 2)
+        self.assertFalse(balance_discrepancies().exists())
+
+    def test_compaction_and_history(self):
+        record_movement(self.product, 10, StockMovement.RECEIPT)
+        record_movement(self.product, -3, StockMovement.SALE)
+        later = timezone.now() + timedelta(hours=1)
+        self.assertEqual(compact_ledger(now=later), (1, 0))
+        snapshot = StockSnapshot.objects.filter(product=self.product).first()
+        self.assertEqual(snapshot.quantity, 12)
+        # Rien de nouveau à compacter
+        self.assertEqual(compact_ledger(now=later), (0, 0))
+
+        record_movement(self.product, -1, StockMovement.SALE)
+        self.assertEqual(stock_at(self.product, timezone.now()), 11)
+        self.assertEqual(stock_at(self.product, snapshot.created), 12)
+
+        created, pruned = compact_ledger(now=later, prune_before=later)
+        self.assertEqual((created, pruned), (1, 3))
+        self.assertEqual(stock_at(self.product, timezone.now()), 11)
+        self.assertFalse(balance_discrepancies().exists())
+
+    def test_reconciliation(self):
+        order = self.create_order((self.product, 2))
+        record_sale(order, [(self.product, 2)])
+        call_command('reconcile_stock', stdout=StringIO())
+
+        missing = self.create_order((self.other, 1))
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=7)
+        self.assertEqual(list(sales_discrepancies()), [(missing.pk, self.other.pk, 1, 0)])
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('reconcile_stock', stdout=out)
+        self.assertIn('stock 7, journal 3', out.getvalue())
+
+
+class StockReservationTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Oud', slug='oud')
+        self.product = Product.objects.create(category=category, name='Oud Royal', slug='oud-royal',
+                                              price=Decimal('500.00'), stock_quantity=2)
+        self.user = User.objects.create_user(username='buyer', password='complexpassword123')
+
+    def add(self, client, quantity, override=False):
+        data = {'quantity': quantity}
+        if override:
+            data['override'] = 'on'
+        return client.post(reverse('cart:cart_add', args=[self.product.pk]), data)
+
+    def test_carts_cannot_hold_the_same_stock(self):
+        first, second = self.client_class(), self.client_class()
+        self.add(first, 1)
+        response = self.add(second, 2)
+        self.assertEqual(response['X-Notification-Message'], 'Quantité insuffisante en stock. Disponible: 1')
+        self.add(second, 1)
+        self.assertEqual(StockReservation.objects.filter(product=self.product).count(), 2)
+
+        # Retirer l'article libère la réservation
+        first.post(reverse('cart:cart_remove', args=[self.product.pk]))
+        self.assertEqual(self.add(second, 2, override=True).status_code, 302)
+        self.assertEqual(StockReservation.objects.get().quantity, 2)
+
+    def test_expired_reservations(self):
+        now = timezone.now()
+        reserve('a' * 32, self.product, 2, now=now - timedelta(hours=1))
+        # Une réservation expirée ne retient plus le stock, avant même le balayage
+        reserve('b' * 32, self.product, 2, now=now)
+        self.assertEqual(release_expired(batch_size=1, now=now), 1)
+        self.assertEqual(list(StockReservation.objects.values_list('holder', flat=True)), ['b' * 32])
+        with self.assertRaises(InsufficientStock) as raised:
+            reserve('a' * 32, self.product, 1, now=now)
+        self.assertEqual(raised.exception.available, 0)
+
+    def test_cart_detail_adjusts_and_renews(self):
+        self.add(self.client, 2)
+        reservation = StockReservation.objects.get()
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        reserve('b' * 32, self.product, 1)
+
+        response = self.client.get(reverse('cart:cart_detail'))
+        self.assertEqual([item['quantity'] for item in response.context['cart']], [1])
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.quantity, 1)
+        self.assertGreater(reservation.expires_at, timezone.now())
+
+    def test_order_releases_reservations(self):
+        self.client.force_login(self.user)
+        self.add(self.client, 2)
+        data = {'first_name': 'A', 'last_name': 'B', 'email': 'a@example.com', 'address': '1 rue',
+                'postal_code': '20000', 'city': 'Casablanca', 'payment_method': 'cash_on_delivery'}
+        self.client.post(reverse('orders:order_create'), data)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Product.objects.get().stock_quantity, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_command(self):
+        reserve('a' * 32, self.product, 1, now=timezone.now() - timedelta(hours=1))
+        out = StringIO()
+        call_command('release_expired_reservations', '--batch-size', '10', stdout=out)
+        self.assertIn('1 réservation(s)', out.getvalue())
+
+
+@skipUnless(connection.vendor == 'sqlite', "Verrouillage propre à SQLite")
+class ConcurrentReservationTests(SimpleTestCase):
+    """Réservations simultanées dans des connexions distinctes à une base fichier"""
+    # La base de test n'est pas utilisée : les threads ouvrent le fichier temporaire
+    databases = {'default'}
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+        # Connexions des threads ouvertes sur le fichier, pas sur la base de test en mémoire
+        patcher = mock.patch.dict(connections.settings['default'], {'NAME': self.path})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        thread, result = self.start(self.create_schema)
+        thread.join()
+        self.product_id = result['value']
+
+    def start(self, function, *args):
+        """Exécuter ``function`` dans un thread, avec sa propre connexion"""
+        result = {}
+
+        def run():
+            try:
+                result['value'] = function(*args)
+            except Exception as e:
+                result['error'] = e
+            finally:
+                connections['default'].close()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread, result
+
+    def create_schema(self):
+        with connections['default'].schema_editor() as editor:
+            for model in (Category, Product, StockReservation):
+                editor.create_model(model)
+        category = Category.objects.create(name='Oud', slug='oud')
+        return Product.objects.create(category=category, name='Oud Royal', slug='oud-royal',
+                                      price=Decimal('500.00'), stock_quantity=1).pk
+
+    def test_last_bottle_is_reserved_once(self):
+        # Les deux paniers lisent le stock disponible avant d'écrire leur réservation
+        barrier = threading.Barrier(2)
+        active_reservations = reservations.active_reservations
+
+        def after_barrier(*args):
+            try:
+                barrier.wait(timeout=0.5)
+            except threading.BrokenBarrierError:
+                pass
+            return active_reservations(*args)
+
+        with mock.patch.object(reservations, 'active_reservations', side_effect=after_barrier):
+            runs = [self.start(reserve, holder * 32, self.product_id, 1) for holder in 'ab']
+            for thread, _ in runs:
+                thread.join()
+        outcomes = sorted(type(result.get('error')).__name__ for _, result in runs)
+        # Sans verrou pris au début de la transaction : OperationalError (« database is locked »)
+        self.assertEqual(outcomes, ['InsufficientStock', 'NoneType'])
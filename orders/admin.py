@@ -1,4 +1,6 @@
 from django.contrib import admin
+from django.http import StreamingHttpResponse
+from .export import export_orders
 from .models import Order, OrderItem
 
 
@@ -13,7 +15,8 @@ class OrderAdmin(admin.ModelAdmin):
     list_filter = ['paid', 'payment_method', 'payment_status', 'created', 'updated']
     search_fields = ['first_name', 'last_name', 'email', 'id']
     inlines = [OrderItemInline]
-    readonly_fields = ['paypal_payment_id', 'paypal_payer_id', 'created', 'updated']
+    readonly_fields = ['paypal_payment_id', 'paypal_payer_id', 'total_cost', 'created', 'updated']
+    actions = ['export_csv']
     
     fieldsets = (
         ('Informations client', {
@@ -23,7 +26,7 @@ class OrderAdmin(admin.ModelAdmin):
             'fields': ('address', 'postal_code', 'city')
         }),
         ('Paiement', {
-            'fields': ('payment_method', 'paid', 'payment_status', 'paypal_payment_id', 'paypal_payer_id')
+            'fields': ('payment_method', 'paid', 'payment_status', 'total_cost', 'paypal_payment_id', 'paypal_payer_id')
         }),
         ('Dates', {
             'fields': ('created', 'updated'),
@@ -31,8 +34,18 @@ class OrderAdmin(admin.ModelAdmin):
         }),
     )
     
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Lignes modifiées dans l'admin : total enregistré recalculé
+        form.instance.update_total_cost()
+
     def get_total_cost(self, obj):
-        return f"{obj.get_total_cost()} DH"
+        return f"{obj.total_cost} DH"
     get_total_cost.short_description = 'Total'
-    get_total_cost.admin_order_field = 'id'
+    get_total_cost.admin_order_field = 'total_cost'
 
+    @admin.action(description="Exporter les commandes sélectionnées (CSV)")
+    def export_csv(self, request, queryset):
+        response = StreamingHttpResponse(export_orders(queryset, 'csv'), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="commandes.csv"'
+        return response
@@ -0,0 +1,89 @@
+"""
+Export des commandes pour la comptabilité (CSV ou JSON Lines) en mémoire constante.
+
+Les commandes sont parcourues par blocs avec ``iterator(chunk_size=...)``
+(curseur côté serveur sur PostgreSQL) ; les lignes de chaque bloc sont
+chargées par ``prefetch_related`` en une requête par bloc. Le CSV contient
+une ligne par article, le JSON Lines un enregistrement par commande avec ses
+articles et son total.
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from products.bulk import FORMATS, Echo
+from .models import Order, OrderItem
+
+
+ORDER_FIELDS = [
+    'id', 'created', 'first_name', 'last_name', 'email', 'city', 'postal_code',
+    'payment_method', 'payment_status', 'paid',
+]
+ITEM_FIELDS = ['product_id', 'product', 'price', 'quantity', 'cost']
+CSV_HEADER = ['order_' + name if name == 'id' else name for name in ORDER_FIELDS] + ITEM_FIELDS
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def filter_orders(queryset=None, date_from=None, date_to=None, payment_status=None, payment_method=None):
+    """
+    Commandes passées entre ``date_from`` et ``date_to`` (dates incluses),
+    filtrées par statut et mode de paiement
+    """
+    queryset = Order.objects.all() if queryset is None else queryset
+    # Bornes en datetime : l'index sur ``created`` reste utilisable
+    if date_from:
+        queryset = queryset.filter(created__gte=_day_start(date_from))
+    if date_to:
+        queryset = queryset.filter(created__lt=_day_start(date_to + timedelta(days=1)))
+    if payment_status:
+        queryset = queryset.filter(payment_status=payment_status)
+    if payment_method:
+        queryset = queryset.filter(payment_method=payment_method)
+    return queryset
+
+
+def export_orders(queryset=None, fmt='csv', chunk_size=2000):
+    """
+    Générer l'export des commandes ligne par ligne (pour ``StreamingHttpResponse``
+    ou l'écriture dans un fichier).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Format inconnu : {fmt}")
+    queryset = Order.objects.all() if queryset is None else queryset
+    items = OrderItem.objects.select_related('product').only(
+        'order_id', 'price', 'quantity', 'product__name'
+    ).order_by('id')
+    orders = queryset.only(*ORDER_FIELDS).order_by('id').prefetch_related(
+        Prefetch('items', queryset=items)
+    ).iterator(chunk_size=chunk_size)
+
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(CSV_HEADER)
+        for order in orders:
+            values = [getattr(order, name) for name in ORDER_FIELDS]
+            values[1] = order.created.isoformat()
+            lines = order.items.all()
+            if not lines:
+                yield writer.writerow(values + [''] * len(ITEM_FIELDS))
+            for item in lines:
+                yield writer.writerow(values + [
+                    item.product_id, item.product.name, item.price, item.quantity, item.get_cost()
+                ])
+    else:
+        for order in orders:
+            record = {name: getattr(order, name) for name in ORDER_FIELDS}
+            record['created'] = order.created.isoformat()
+            record['items'] = [
+                {'product_id': item.product_id, 'product': item.product.name, 'price': str(item.price),
+                 'quantity': item.quantity, 'cost': str(item.get_cost())}
+                for item in order.items.all()
+            ]
+            record['total'] = str(sum(item.get_cost() for item in order.items.all()))
+            yield json.dumps(record, ensure_ascii=False) + '\n'
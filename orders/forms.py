@@ -27,3 +27,30 @@ class OrderCreateForm(forms.ModelForm):
             'payment_method': 'Mode de paiement',
         }
 
+
+
+class OrderExportForm(forms.Form):
+    """Filtres de l'export des commandes"""
+    date_from = forms.DateField(label='Du', required=False, widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+    date_to = forms.DateField(label='Au', required=False, widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+    payment_status = forms.ChoiceField(
+        label='Statut du paiement', required=False,
+        choices=[('', 'Tous')] + Order.PAYMENT_STATUS_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    payment_method = forms.ChoiceField(
+        label='Mode de paiement', required=False,
+        choices=[('', 'Tous')] + Order.PAYMENT_METHOD_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    format = forms.ChoiceField(
+        label='Format', choices=[('csv', 'CSV (une ligne par article)'), ('jsonl', 'JSON Lines (une ligne par commande)')],
+        initial='csv', widget=forms.Select(attrs={'class': 'form-control'})
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from, date_to = cleaned_data.get('date_from'), cleaned_data.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise forms.ValidationError("La date de début doit précéder la date de fin.")
+        return cleaned_data
@@ -0,0 +1,88 @@
+"""
+Historique des commandes d'un client.
+
+Les pages sont découpées par curseur sur ``(created, id)`` plutôt que par
+``OFFSET`` : chaque page lit directement dans l'index ``(customer, -created,
+-id)``, quelle que soit sa profondeur. Les lignes et produits d'une page sont
+chargés en une requête (``prefetch_related``) et le total de chaque commande
+est enregistré avec elle.
+
+Le rendu d'une page est mis en cache avec la version de l'historique du
+client, incrémentée à chaque commande créée ou modifiée.
+"""
+import time
+from datetime import datetime
+
+from django.core.cache import cache
+from django.db.models import Prefetch, Q
+
+from .models import Order, OrderItem
+
+
+HISTORY_PAGE_SIZE = 20
+HISTORY_CACHE_TIMEOUT = 3600
+
+
+def history_version(customer_id):
+    """Version courante de l'historique d'un client"""
+    return cache.get_or_set(f'orders:history_version:{customer_id}', time.time_ns, timeout=None)
+
+
+def bump_history_version(customer_id):
+    """Invalider toutes les pages en cache de l'historique d'un client"""
+    try:
+        return cache.incr(f'orders:history_version:{customer_id}')
+    except ValueError:
+        return history_version(customer_id)
+
+
+def history_cache_key(customer_id, cursor):
+    return f'orders:history:{customer_id}:{history_version(customer_id)}:{cursor or ""}'
+
+
+# Identifiants au-delà des entiers 64 bits de la base : curseur invalide
+MAX_ORDER_ID = 2 ** 63 - 1
+
+
+def encode_cursor(order):
+    return f'{order.created.isoformat()}_{order.pk}'
+
+
+def decode_cursor(value):
+    """(date avec fuseau, id) d'un curseur, ou None s'il est invalide"""
+    created, _, pk = (value or '').rpartition('_')
+    try:
+        created, pk = datetime.fromisoformat(created), int(pk)
+    except ValueError:
+        return None
+    if created.tzinfo is None or not 0 < pk <= MAX_ORDER_ID:
+        return None
+    return created, pk
+
+
+def normalize_cursor(value):
+    """Curseur sous sa forme canonique (clé de cache bornée), ou None s'il est invalide"""
+    position = decode_cursor(value)
+    return position and f'{position[0].isoformat()}_{position[1]}'
+
+
+def with_items(orders):
+    """Lignes et produits des commandes, en une requête par lot de commandes"""
+    return orders.prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('product').order_by('id'))
+    )
+
+
+def order_history_page(customer, cursor=None, size=HISTORY_PAGE_SIZE):
+    """
+    Commandes d'un client plus anciennes que ``cursor``, les plus récentes
+    d'abord. Retourne (commandes, curseur de la page suivante ou None).
+    """
+    orders = Order.objects.filter(customer=customer)
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        created, pk = position
+        orders = orders.filter(Q(created__lt=created) | Q(created=created, id__lt=pk))
+    page = list(with_items(orders.order_by('-created', '-id'))[:size + 1])
+    next_cursor = encode_cursor(page[size - 1]) if len(page) > size else None
+    return page[:size], next_cursor
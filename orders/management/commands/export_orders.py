@@ -0,0 +1,59 @@
+import gzip
+import sys
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from orders.export import export_orders, filter_orders
+from orders.models import Order
+from products.bulk import FORMATS
+
+
+class Command(BaseCommand):
+    help = "Exporter les commandes d'une période en CSV ou JSON Lines (compressé si le fichier se termine par .gz)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', default='-',
+                            help="Fichier de sortie ('-' pour la sortie standard), ex. commandes.csv.gz")
+        parser.add_argument('--format', choices=FORMATS, help="Format (déduit de l'extension par défaut)")
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat, help="Première date (AAAA-MM-JJ)")
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat, help="Dernière date (AAAA-MM-JJ)")
+        parser.add_argument('--yesterday', action='store_true', help="Commandes de la veille (export nocturne)")
+        parser.add_argument('--status', choices=[value for value, _ in Order.PAYMENT_STATUS_CHOICES])
+        parser.add_argument('--method', choices=[value for value, _ in Order.PAYMENT_METHOD_CHOICES])
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        output = options['output']
+        name = output[:-3] if output.endswith('.gz') else output
+        fmt = options['format'] or ('jsonl' if name.endswith('.jsonl') else 'csv')
+        date_from, date_to = options['date_from'], options['date_to']
+        if options['yesterday']:
+            date_from = date_to = timezone.localdate() - timedelta(days=1)
+        if date_from and date_to and date_from > date_to:
+            raise CommandError("--from doit précéder --to")
+        orders = filter_orders(
+            date_from=date_from, date_to=date_to,
+            payment_status=options['status'], payment_method=options['method'],
+        )
+
+        if output == '-':
+            stream = sys.stdout
+        elif output.endswith('.gz'):
+            stream = gzip.open(output, 'wt', encoding='utf-8', newline='')
+        else:
+            stream = open(output, 'w', encoding='utf-8', newline='')
+        lines = 0
+        try:
+            for line in export_orders(orders, fmt, chunk_size=options['chunk_size']):
+                stream.write(line)
+                lines += 1
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        if output != '-':
+            # Sans l'en-tête CSV
+            count = lines - 1 if fmt == 'csv' else lines
+            unit = 'ligne(s)' if fmt == 'csv' else 'commande(s)'
+            self.stdout.write(self.style.SUCCESS(f"{count} {unit} exportée(s) dans {output}"))
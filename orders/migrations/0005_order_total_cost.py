@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:12
+
+from django.db import migrations, models
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_total_cost(apps, schema_editor):
+    """
+    Totaux des commandes existantes, en un seul UPDATE
+    """
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    totals = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(
+        total=Sum(F('price') * F('quantity'))
+    ).values('total')
+    output_field = DecimalField(max_digits=12, decimal_places=2)
+    Order.objects.update(total_cost=Coalesce(Subquery(totals, output_field=output_field), Value(0),
+                                             output_field=output_field))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_order_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_cost',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(fill_total_cost, migrations.RunPython.noop),
+    ]
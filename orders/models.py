@@ -1,10 +1,23 @@
 from django.db import models
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from products.models import Product
 from customers.models import Customer
 
 
+def order_total_expression():
+    """Total des lignes d'une commande, pour ``update``/``annotate`` sur les commandes"""
+    totals = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(
+        total=Sum(F('price') * F('quantity'))
+    ).values('total')
+    output_field = DecimalField(max_digits=12, decimal_places=2)
+    return Coalesce(Subquery(totals, output_field=output_field), Value(0), output_field=output_field)
+
+
 class Order(models.Model):
-    customer = models.ForeignKey(Customer, related_name='orders', on_delete=models.CASCADE)
+    # Vide pour les commandes anonymisées à la suppression du compte (voir customers.deletion)
+    customer = models.ForeignKey(Customer, related_name='orders', null=True, blank=True,
+                                 on_delete=models.SET_NULL)
     first_name = models.CharField(max_length=50)
     last_name = models.CharField(max_length=50)
     email = models.EmailField()
@@ -31,10 +44,30 @@ class Order(models.Model):
         ('failed', 'Échoué'),
         ('cancelled', 'Annulé'),
     ]
-    payment_status = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES, default='pending')
+    payment_status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='pending')
+    # Somme des lignes, enregistrée avec la commande (voir update_total_cost)
+    total_cost = models.DecimalField(max_digits=12, decimal_places=2, default=0)
 
     class Meta:
         ordering = ('-created',)
+        indexes = [
+            # Commandes d'un client, les plus récentes d'abord
+            models.Index(fields=['customer', '-created', '-id'], name='order_customer_created_idx'),
+            # Filtres de l'admin, triés comme la liste
+            models.Index(fields=['payment_status', '-created', '-id'], name='order_status_created_idx'),
+            models.Index(fields=['payment_method', '-created', '-id'], name='order_method_created_idx'),
+            # Liste complète, périodes (filtre de date, exports, totaux de ventes) et
+            # filtre « payée » : une commande sur deux, le parcours trié s'arrête après une page
+            models.Index(fields=['-created', '-id'], name='order_created_idx'),
+        ]
+        constraints = [
+            # Une transaction PayPal ne peut régler qu'une commande (notifications IPN rejouées)
+            models.UniqueConstraint(
+                fields=['paypal_payment_id'],
+                condition=~models.Q(paypal_payment_id=''),
+                name='unique_order_paypal_payment_id',
+            ),
+        ]
 
     def __str__(self):
         return f'Order {self.id}'
@@ -42,6 +75,11 @@ class Order(models.Model):
     def get_total_cost(self):
         return sum(item.get_cost() for item in self.items.all())
 
+    def update_total_cost(self):
+        """Recalculer le total enregistré depuis les lignes, en une requête"""
+        Order.objects.filter(pk=self.pk).update(total_cost=order_total_expression())
+        self.refresh_from_db(fields=['total_cost'])
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
@@ -1,6 +1,9 @@
+from django.db import IntegrityError, transaction
+from django.db.models.signals import post_save
 from django.dispatch import receiver
 from paypal.standard.models import ST_PP_COMPLETED
 from paypal.standard.ipn.signals import valid_ipn_received
+from .history import bump_history_version
 from .models import Order
 
 
@@ -15,17 +18,23 @@ def payment_notification(sender, **kwargs):
         try:
             order = Order.objects.get(id=ipn_obj.invoice)
             
+            # Notification rejouée par PayPal : la commande est déjà réglée par cette transaction
+            if order.paid and order.paypal_payment_id == ipn_obj.txn_id:
+                return
+            
             # Vérifier que le montant correspond
             if float(ipn_obj.mc_gross) == float(order.get_total_cost()):
                 order.paid = True
                 order.payment_status = 'completed'
                 order.paypal_payment_id = ipn_obj.txn_id
                 order.paypal_payer_id = ipn_obj.payer_id
-                order.save()
+                # La contrainte d'unicité refuse une transaction déjà utilisée pour une autre commande
+                with transaction.atomic():
+                    order.save()
                 
 
                 
-        except Order.DoesNotExist:
+        except (Order.DoesNotExist, IntegrityError):
             # Log l'erreur
             pass
     else:
@@ -41,3 +50,11 @@ def payment_notification(sender, **kwargs):
         except Order.DoesNotExist:
             pass
 
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, **kwargs):
+    """
+    Invalider l'historique en cache du client : nouvelle commande ou
+    changement de statut (après validation, avec les lignes de la commande)
+    """
+    transaction.on_commit(lambda: bump_history_version(instance.customer_id))
@@ -1,3 +1,224 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from paypal.standard.ipn.models import PayPalIPN
+from paypal.standard.ipn.signals import valid_ipn_received
+
+from customers.lockout import audit_buffer
+from customers.models import Customer
+from products.models import Category, Product
+from .export import export_orders, filter_orders
+from .history import history_cache_key, order_history_page
+from .models import Order, OrderItem
+
+
+class OrderExportTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Oud', slug='oud')
+        self.oud = Product.objects.create(category=category, name='Oud Royal', slug='oud-royal', price=Decimal('500.00'))
+        self.musc = Product.objects.create(category=category, name='Musc', slug='musc', price=Decimal('120.00'))
+        customer = User.objects.create_user(username='buyer', password='complexpassword123').customer
+        self.paid = self.create_order(customer, 'online', 'completed', (self.oud, 1), (self.musc, 2))
+        self.pending = self.create_order(customer, 'cash_on_delivery', 'pending', (self.musc, 1))
+        # Commande de la semaine dernière
+        Order.objects.filter(pk=self.pending.pk).update(created=timezone.now() - timedelta(days=7))
+
+    def create_order(self, customer, method, status, *lines):
+        order = Order.objects.create(customer=customer, first_name='A', last_name='B', email='a@example.com',
+                                     address='1 rue', postal_code='20000', city='Casablanca',
+                                     payment_method=method, payment_status=status)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, price=product.price, quantity=quantity)
+            for product, quantity in lines
+        ])
+        return order
+
+    def test_csv_has_one_row_per_item(self):
+        # Commandes, articles (un bloc)
+        with self.assertNumQueries(2):
+            lines = list(export_orders(fmt='csv'))
+        self.assertTrue(lines[0].startswith('order_id,created,first_name'))
+        self.assertEqual(len(lines), 4)
+        self.assertIn('Musc,120.00,2,240.00', lines[2])
+
+    def test_jsonl_queries_per_chunk(self):
+        # Une requête de commandes puis une requête d'articles par bloc
+        with self.assertNumQueries(3):
+            records = [json.loads(line) for line in export_orders(fmt='jsonl', chunk_size=1)]
+        self.assertEqual([r['id'] for r in records], [self.paid.pk, self.pending.pk])
+        self.assertEqual(records[0]['total'], '740.00')
+        self.assertEqual(len(records[0]['items']), 2)
+
+    def test_filters(self):
+        today = timezone.localdate()
+        self.assertEqual(list(filter_orders(date_from=today, date_to=today)), [self.paid])
+        self.assertEqual(list(filter_orders(payment_status='pending')), [self.pending])
+        self.assertEqual(list(filter_orders(payment_method='online', date_to=today - timedelta(days=1))), [])
+
+    def test_staff_view_streams(self):
+        staff = User.objects.create_user(username='staff', password='complexpassword123', is_staff=True)
+        self.client.force_login(staff)
+        url = reverse('orders:order_export')
+        self.assertTemplateUsed(self.client.get(url), 'orders/manage/export.html')
+        response = self.client.get(url, {'format': 'jsonl', 'payment_method': 'cash_on_delivery'})
+        self.assertTrue(response.streaming)
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([r['id'] for r in records], [self.pending.pk])
+
+    def test_command_writes_gzip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'commandes.jsonl.gz')
+            out = StringIO()
+            call_command('export_orders', path, '--from', '2000-01-01',
+                         '--status', 'completed', stdout=out)
+            self.assertIn('1 commande(s)', out.getvalue())
+            with gzip.open(path, 'rt', encoding='utf-8') as stream:
+                self.assertEqual(json.loads(stream.readline())['id'], self.paid.pk)
+
+
+@skipUnless(connection.vendor == 'sqlite', "Plans d'exécution au format SQLite")
+class OrderIndexTests(TestCase):
+
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'complexpassword123')
+        category = Category.objects.create(name='Oud', slug='oud')
+        self.product = Product.objects.create(category=category, name='Oud Royal', slug='oud-royal',
+                                              price=Decimal('500.00'))
+        self.customer = self.admin_user.customer
+
+    def admin_plan(self, **params):
+        request = RequestFactory().get(reverse('admin:orders_order_changelist'), params)
+        request.user = self.admin_user
+        model_admin = site._registry[Order]
+        return model_admin.get_changelist_instance(request).get_queryset(request).explain()
+
+    def assertUsesIndex(self, plan, index):
+        self.assertIn(f'USING INDEX {index}', plan)
+        # Tri fourni par l'index
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_admin_filters_use_indexes(self):
+        self.assertUsesIndex(self.admin_plan(payment_status__exact='pending'), 'order_status_created_idx')
+        self.assertUsesIndex(self.admin_plan(payment_method__exact='online'), 'order_method_created_idx')
+        self.assertUsesIndex(self.admin_plan(created__gte='2026-01-01 00:00+00:00', created__lt='2026-02-01 00:00+00:00'), 'order_created_idx')
+        self.assertUsesIndex(self.admin_plan(paid__exact='1'), 'order_created_idx')
+        self.assertUsesIndex(self.admin_plan(), 'order_created_idx')
+
+    def test_customer_orders_use_index(self):
+        self.assertUsesIndex(Order.objects.filter(customer=self.customer).explain(), 'order_customer_created_idx')
+
+    def test_ipn_lookup_and_replay(self):
+        self.assertIn('PRIMARY KEY', Order.objects.filter(id=1).explain())
+        order = Order.objects.create(customer=self.customer, first_name='A', last_name='B', email='a@example.com',
+                                     address='1 rue', postal_code='20000', city='Casablanca')
+        OrderItem.objects.create(order=order, product=self.product, price=Decimal('500.00'), quantity=1)
+        other = Order.objects.create(customer=self.customer, first_name='A', last_name='B', email='a@example.com',
+                                     address='1 rue', postal_code='20000', city='Casablanca')
+        OrderItem.objects.create(order=other, product=self.product, price=Decimal('500.00'), quantity=1)
+
+        def notify(invoice):
+            ipn = PayPalIPN.objects.create(payment_status='Completed', invoice=str(invoice), mc_gross=Decimal('500.00'),
+                                           txn_id='TXN-1', payer_id='PAYER')
+            valid_ipn_received.send(sender=ipn)
+
+        notify(order.pk)
+        notify(order.pk)
+        order.refresh_from_db()
+        self.assertEqual((order.paid, order.payment_status, order.paypal_payment_id), (True, 'completed', 'TXN-1'))
+        self.assertEqual(order.get_payment_status_display(), 'Complété')
+
+        # La même transaction ne règle pas une seconde commande
+        notify(other.pk)
+        other.refresh_from_db()
+        self.assertFalse(other.paid)
+
+
+class OrderHistoryTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Oud', slug='oud')
+        self.product = Product.objects.create(category=category, name='Oud Royal', slug='oud-royal',
+                                              price=Decimal('500.00'), stock_quantity=10)
+        self.user = User.objects.create_user(username='buyer', password='complexpassword123')
+        self.customer = self.user.customer
+        self.client.force_login(self.user)
+
+    def create_order(self, customer=None, quantity=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(customer=customer or self.customer, first_name='A', last_name='B',
+                                         email='a@example.com', address='1 rue', postal_code='20000',
+                                         city='Casablanca')
+            OrderItem.objects.create(order=order, product=self.product, price=self.product.price, quantity=quantity)
+            order.update_total_cost()
+        return order
+
+    def test_keyset_pages(self):
+        orders = [self.create_order() for _ in range(5)]
+        # Même date pour trois commandes : l'id départage
+        Order.objects.filter(pk__in=[o.pk for o in orders[1:4]]).update(created=orders[0].created)
+        seen, cursor = [], None
+        while True:
+            page, cursor = order_history_page(self.customer, cursor, size=2)
+            seen.extend(order.pk for order in page)
+            if cursor is None:
+                break
+        self.assertEqual(seen, [o.pk for o in (orders[4], orders[3], orders[2], orders[1], orders[0])])
+        # Un curseur invalide renvoie la première page
+        self.assertEqual(len(order_history_page(self.customer, 'invalide', size=2)[0]), 2)
+
+    def test_history_cached_until_next_order(self):
+        order = self.create_order(quantity=2)
+        self.assertEqual(order.total_cost, Decimal('1000.00'))
+        url = reverse('orders:order_history')
+        self.assertContains(self.client.get(url), '1000.00 DH')
+
+        # Session, utilisateur et client joints, enregistrement de la session : plus de commandes ni de lignes
+        audit_buffer.flush()
+        with self.assertNumQueries(5):
+            self.client.get(url)
+
+        self.create_order(quantity=3)
+        self.assertContains(self.client.get(url), '1500.00 DH')
+
+        # Changement de statut
+        order.payment_status = 'cancelled'
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+        self.assertContains(self.client.get(url), 'Annulé')
+
+    def test_invalid_cursor_redirects_to_first_page(self):
+        url = reverse('orders:order_history')
+        for cursor in ('invalide', '2025-01-01T10:00:00_3', f'2025-01-01T10:00:00+00:00_{2 ** 64}'):
+            self.assertRedirects(self.client.get(url, {'after': cursor}), url)
+        self.create_order()
+        cursor = '2025-01-01T10:00:00.000+00:00_3'
+        with mock.patch('orders.views.history_cache_key', wraps=history_cache_key) as cache_key:
+            self.assertEqual(self.client.get(url, {'after': cursor}).status_code, 200)
+        cache_key.assert_called_once_with(self.customer.pk, '2025-01-01T10:00:00+00:00_3')
+
+    def test_history_without_customer_profile(self):
+        Customer.objects.filter(user=self.user).delete()
+        self.assertEqual(self.client.get(reverse('orders:order_history')).status_code, 404)
+
+    def test_detail_restricted_to_owner(self):
+        other = User.objects.create_user(username='other', password='complexpassword123').customer
+        mine, theirs = self.create_order(), self.create_order(customer=other)
+        self.assertContains(self.client.get(reverse('orders:order_detail', args=[mine.pk])), 'Oud Royal')
+        self.assertEqual(self.client.get(reverse('orders:order_detail', args=[theirs.pk])).status_code, 404)
@@ -9,5 +9,8 @@ urlpatterns = [
     path('payment/cash-on-delivery/<int:order_id>/', views.payment_cash_on_delivery, name='payment_cash_on_delivery'),
     path('payment/done/', views.payment_done, name='payment_done'),
     path('payment/cancelled/', views.payment_cancelled, name='payment_cancelled'),
+    path('history/', views.order_history, name='order_history'),
+    path('history/<int:order_id>/', views.order_detail, name='order_detail'),
+    path('export/', views.order_export, name='order_export'),
 ]
 
@@ -1,13 +1,25 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.db import transaction
 from django.urls import reverse
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from paypal.standard.forms import PayPalPaymentsForm
 from cart.cart import Cart
+from inventory.ledger import InsufficientStock, record_sale
+from inventory.reservations import reserve_many
+from products.views import is_staff_user
+from .export import export_orders, filter_orders
+from .history import (
+    HISTORY_CACHE_TIMEOUT, history_cache_key, normalize_cursor, order_history_page, with_items,
+)
 from .models import Order, OrderItem
-from .forms import OrderCreateForm
+from .forms import OrderCreateForm, OrderExportForm
 import uuid
 
 
@@ -15,27 +27,36 @@ import uuid
 def order_create(request):
     cart = Cart(request)
     
-    # Créer un profil Customer si il n'existe pas
-    from customers.models import Customer
-    customer, created = Customer.objects.get_or_create(user=request.user)
-    
     if request.method == 'POST':
         form = OrderCreateForm(request.POST)
         if form.is_valid():
-            order = form.save(commit=False)
-            order.customer = customer
-            order.save()
-            
-            for item in cart:
-                OrderItem.objects.create(
-                    order=order,
-                    product=item['product'],
-                    price=item['price'],
-                    quantity=item['quantity']
-                )
-            
-            # Vider le panier
-            cart.clear()
+            items = list(cart)
+            try:
+                # Commande et sortie de stock ensemble : rien n'est créé si un article manque
+                with transaction.atomic():
+                    # Les articles réservés par d'autres paniers ne peuvent pas être vendus
+                    reserve_many(cart.holder, {item['product']: item['quantity'] for item in items})
+                    order = form.save(commit=False)
+                    order.customer = request.customer
+                    order.total_cost = sum(item['total_price'] for item in items)
+                    order.save()
+
+                    OrderItem.objects.bulk_create([
+                        OrderItem(
+                            order=order,
+                            product=item['product'],
+                            price=item['price'],
+                            quantity=item['quantity']
+                        )
+                        for item in items
+                    ])
+                    record_sale(order, [(item['product'], item['quantity']) for item in items])
+                    # Vider le panier et libérer ses réservations avec la sortie de stock
+                    cart.clear()
+            except InsufficientStock as e:
+                product = next(item['product'] for item in items if item['product'].pk == e.product_id)
+                messages.error(request, f"Stock insuffisant pour '{product.name}'. Veuillez modifier votre panier.")
+                return redirect('cart:cart_detail')
             
             # Rediriger selon le mode de paiement choisi
             if order.payment_method == 'online':
@@ -53,11 +74,7 @@ def order_create(request):
 
 @login_required
 def payment(request, order_id):
-    # Créer un profil Customer si il n'existe pas
-    from customers.models import Customer
-    customer, created = Customer.objects.get_or_create(user=request.user)
-    
-    order = get_object_or_404(Order, id=order_id, customer=customer)
+    order = get_object_or_404(Order, id=order_id, customer=request.customer)
     
     # Vérifier que la commande n'est pas déjà payée
     if order.paid:
@@ -68,7 +85,7 @@ def payment(request, order_id):
     # Configuration PayPal plus robuste
     paypal_dict = {
         'business': settings.PAYPAL_RECEIVER_EMAIL,
-        'amount': '%.2f' % order.get_total_cost(),
+        'amount': '%.2f' % order.total_cost,
         'item_name': f'Parfumerie Anas - Commande #{order.id}',
         'invoice': str(order.id),
         'currency_code': 'USD',  # Changer en USD pour plus de compatibilité
@@ -114,10 +131,7 @@ def payment_cancelled(request):
 @login_required
 def payment_cash_on_delivery(request, order_id):
     """Vue pour confirmer une commande avec paiement à la livraison"""
-    from customers.models import Customer
-    customer, created = Customer.objects.get_or_create(user=request.user)
-    
-    order = get_object_or_404(Order, id=order_id, customer=customer)
+    order = get_object_or_404(Order, id=order_id, customer=request.customer)
     
     # Marquer la commande comme confirmée (mais pas encore payée)
     order.payment_status = 'pending'
@@ -127,3 +141,65 @@ def payment_cash_on_delivery(request, order_id):
         'order': order
     })
 
+
+@login_required
+def order_history(request):
+    """
+    Historique des commandes du client, par pages (curseur ``after``)
+    """
+    if not request.customer:
+        # Compte sans profil client (créé hors de l'inscription) : aucune commande
+        raise Http404("Aucun profil client")
+    cursor = request.GET.get('after')
+    if cursor:
+        # Seul un curseur valide, sous sa forme canonique, entre dans la clé de cache
+        cursor = normalize_cursor(cursor)
+        if cursor is None:
+            return redirect('orders:order_history')
+
+    # Rendu de la page en cache jusqu'à la prochaine commande ou modification du client
+    key = history_cache_key(request.customer.pk, cursor)
+    orders_html = cache.get(key)
+    if orders_html is None:
+        orders, next_cursor = order_history_page(request.customer, cursor)
+        orders_html = render_to_string('orders/history/_orders.html', {
+            'orders': orders,
+            'next_cursor': next_cursor,
+        })
+        cache.set(key, orders_html, HISTORY_CACHE_TIMEOUT)
+
+    return render(request, 'orders/history/list.html', {
+        # Fragment rendu (et échappé) par le gabarit _orders.html
+        'orders_html': mark_safe(orders_html),
+        'is_first_page': not cursor,
+    })
+
+
+@login_required
+def order_detail(request, order_id):
+    """
+    Détail d'une commande du client, avec ses lignes et produits
+    """
+    order = get_object_or_404(with_items(Order.objects.all()), id=order_id, customer=request.customer)
+    return render(request, 'orders/history/detail.html', {'order': order})
+
+
+@user_passes_test(is_staff_user)
+def order_export(request):
+    """
+    Exporter les commandes d'une période en CSV ou JSON Lines (réponse envoyée en flux)
+    """
+    form = OrderExportForm(request.GET or None)
+    if form.is_valid():
+        cd = form.cleaned_data
+        orders = filter_orders(
+            date_from=cd['date_from'], date_to=cd['date_to'],
+            payment_status=cd['payment_status'], payment_method=cd['payment_method'],
+        )
+        fmt = cd['format']
+        content_type = 'text/csv; charset=utf-8' if fmt == 'csv' else 'application/x-ndjson; charset=utf-8'
+        response = StreamingHttpResponse(export_orders(orders, fmt), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="commandes.{fmt}"'
+        return response
+
+    return render(request, 'orders/manage/export.html', {'form': form})
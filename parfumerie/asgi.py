@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'parfumerie.settings')
 
 application = get_asgi_application()
+
+# Index des facettes construit en arrière-plan avant les premières requêtes
+from products.facets import warm  # noqa: E402
+
+warm()
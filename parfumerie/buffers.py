@@ -0,0 +1,118 @@
+"""
+Files d'écritures différées, partagées par les threads d'un processus.
+
+Les écritures qui n'ont pas à être visibles immédiatement (journaux d'accès,
+vues des produits, journaux de recherche) ne sont pas faites pendant la
+requête : elles sont mises en file dans le processus et écrites par lots
+après l'envoi d'une réponse (``request_finished``), dès que la file atteint
+sa taille de lot ou que la plus ancienne entrée a dépassé son intervalle
+(deux réglages nommés par chaque file).
+
+Les entrées encore en attente à l'arrêt du processus sont écrites par
+``atexit`` dans la base où elles ont été mises en file. Si la connexion ne
+désigne plus cette base (base de test détruite à la fin des tests), elles
+sont abandonnées plutôt qu'écrites dans une autre base.
+"""
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+from logging import getLogger
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.dispatch import receiver
+
+
+log = getLogger(__name__)
+
+# Files du processus, dans l'ordre de leur création
+buffers = []
+
+
+def _database():
+    return connections[DEFAULT_DB_ALIAS].settings_dict['NAME']
+
+
+class WriteBuffer:
+    """
+    File d'écritures : les sous-classes définissent ``empty()`` (contenu d'une
+    file vide), ``write(pending)`` (écrire un contenu, retourne le nombre
+    d'entrées écrites) et les noms des réglages ``batch_size_setting`` et
+    ``flush_interval_setting``
+    """
+    batch_size_setting = None
+    flush_interval_setting = None
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = self.empty()
+        self.oldest = None
+        self.database = None
+        buffers.append(self)
+
+    def empty(self):
+        raise NotImplementedError
+
+    def write(self, pending):
+        raise NotImplementedError
+
+    def __len__(self):
+        return len(self.pending)
+
+    @contextmanager
+    def adding(self):
+        """Modifier le contenu en attente sous le verrou de la file"""
+        with self.lock:
+            yield self.pending
+            if self.oldest is None:
+                self.oldest = time.monotonic()
+                self.database = _database()
+
+    def is_due(self):
+        return bool(len(self)) and (
+            len(self) >= getattr(settings, self.batch_size_setting)
+            or time.monotonic() - self.oldest >= getattr(settings, self.flush_interval_setting)
+        )
+
+    def take(self):
+        """Vider la file ; retourne (contenu en attente, base de mise en file)"""
+        with self.lock:
+            pending, database = self.pending, self.database
+            self.pending, self.oldest, self.database = self.empty(), None, None
+        return pending, database
+
+    def flush(self):
+        """Écrire les entrées en attente ; retourne leur nombre"""
+        pending, _ = self.take()
+        return self.write(pending)
+
+
+def flush_buffers():
+    """Écrire toutes les files du processus"""
+    for buffer in buffers:
+        buffer.flush()
+
+
+@receiver(request_finished)
+def flush_due_buffers(sender, **kwargs):
+    for buffer in buffers:
+        if buffer.is_due():
+            buffer.flush()
+
+
+@atexit.register
+def flush_buffers_at_exit():
+    for buffer in buffers:
+        pending, database = buffer.take()
+        if not len(pending):
+            continue
+        if database != _database():
+            log.info("%s : %d entrée(s) abandonnée(s), la base %s n'est plus configurée",
+                     type(buffer).__name__, len(pending), database)
+            continue
+        try:
+            buffer.write(pending)
+        except Exception:
+            log.exception("%s : échec de l'écriture à l'arrêt", type(buffer).__name__)
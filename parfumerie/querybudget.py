@@ -0,0 +1,193 @@
+"""
+Budgets de requêtes SQL par vue et détection des requêtes N+1.
+
+Chaque vue nommée peut recevoir un nombre maximal de requêtes dans
+``settings.QUERY_BUDGETS`` (clé ``namespace:nom_url``). Les tests héritant de
+``QueryBudgetTestCase`` exécutent les vues sur des données de deux tailles
+différentes et échouent si le nombre de requêtes dépend du volume de données
+ou dépasse le budget, avec un rapport des requêtes dupliquées et de
+l'endroit du code qui les a émises.
+"""
+import os
+import re
+import traceback
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import TestCase
+from django.urls import resolve
+
+from products.models import Category, Product, normalized_name
+from .buffers import flush_buffers
+
+
+_IN_CLAUSE = re.compile(r'IN \((?:%s, )*%s\)')
+_THIS_FILE = os.path.abspath(__file__)
+_SKIPPED_FILES = ('manage.py',)
+
+
+@dataclass
+class RecordedQuery:
+    sql: str
+    params: tuple
+    stack: list = field(default_factory=list)
+
+    @property
+    def template(self):
+        """SQL sans paramètres, les listes ``IN (...)`` étant repliées"""
+        return _IN_CLAUSE.sub('IN (...)', self.sql)
+
+
+def _project_stack(limit=4):
+    """
+    Retourne les dernières frames appartenant au projet (hors dépendances).
+    """
+    base_dir = str(settings.BASE_DIR)
+    frames = []
+    for frame in traceback.extract_stack()[:-2]:
+        filename = os.path.abspath(frame.filename)
+        if not filename.startswith(base_dir) or filename == _THIS_FILE:
+            continue
+        basename = os.path.basename(filename)
+        if 'site-packages' in filename or basename.startswith('test') or basename in _SKIPPED_FILES:
+            continue
+        frames.append(f"{os.path.relpath(filename, base_dir)}:{frame.lineno} in {frame.name}")
+    return frames[-limit:]
+
+
+class QueryRecorder:
+    """
+    Enregistre les requêtes exécutées sur une connexion avec leur pile d'appel.
+    """
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.connection = connections[using]
+        self.queries = []
+        self._wrapper = None
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(RecordedQuery(sql, tuple(params or ()), _project_stack()))
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = self.connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def duplicates(self, threshold=2):
+        """
+        Regroupe les requêtes de même forme exécutées au moins ``threshold`` fois.
+        """
+        groups = defaultdict(list)
+        for query in self.queries:
+            groups[query.template].append(query)
+        return sorted(
+            ((template, items) for template, items in groups.items() if len(items) >= threshold),
+            key=lambda group: -len(group[1])
+        )
+
+    def report(self, threshold=2):
+        """
+        Rapport texte des requêtes dupliquées, attribuées à leur origine dans le code.
+        """
+        lines = [f"{len(self.queries)} requête(s) exécutée(s)"]
+        for template, items in self.duplicates(threshold):
+            lines.append(f"\n{len(items)}× {template}")
+            sites = defaultdict(int)
+            for query in items:
+                sites[' <- '.join(reversed(query.stack)) or '<hors projet>'] += 1
+            for site, count in sorted(sites.items(), key=lambda s: -s[1]):
+                lines.append(f"    {count}× {site}")
+        return '\n'.join(lines)
+
+
+def get_query_budget(view_name):
+    """
+    Budget configuré pour une vue nommée, ou ``None`` si aucun budget n'est défini.
+    """
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    Cas de test vérifiant que les vues respectent leur budget de requêtes.
+
+    Les sous-classes peuvent redéfinir ``seed(size)`` qui complète les données
+    jusqu'à ``size`` éléments (par défaut, des produits d'une même catégorie) ;
+    ``seed_sizes`` donne les deux tailles comparées.
+    """
+    seed_sizes = (3, 12)
+
+    def setUp(self):
+        super().setUp()
+        # Budgets mesurés sur un cache vide : une réponse en cache masquerait une requête N+1
+        cache.clear()
+
+    def seed(self, size):
+        """Compléter le catalogue jusqu'à ``size`` produits disponibles"""
+        category, _ = Category.objects.get_or_create(slug='budget', defaults={'name': 'Budget'})
+        Product.objects.bulk_create([
+            Product(category=category, name=f'Parfum {i}', slug=f'budget-parfum-{i}',
+                    search_name=normalized_name(f'Parfum {i}'), price=100 + i, stock_quantity=10)
+            for i in range(Product.objects.count(), size)
+        ])
+
+    def record(self, path, method='get', data=None, client=None):
+        """
+        Exécute une requête HTTP et retourne ``(response, recorder)``.
+        """
+        client = client or self.client
+        # Écritures en attente faites avant la mesure : le lot serait compté
+        # sur la vue dont la réponse le déclenche
+        flush_buffers()
+        with QueryRecorder() as recorder:
+            response = getattr(client, method)(path, data or {})
+        return response, recorder
+
+    def assertWithinBudget(self, path, method='get', data=None, client=None, budget=None, status=200):
+        """
+        Vérifie le statut de la réponse et le budget de requêtes de la vue.
+        """
+        if callable(path):
+            path = path()
+        response, recorder = self.record(path, method, data, client)
+        self.assertEqual(response.status_code, status, f"{method.upper()} {path}")
+        view_name = resolve(path).view_name
+        budget = budget if budget is not None else get_query_budget(view_name)
+        if budget is None:
+            self.fail(f"Aucun budget de requêtes défini pour la vue '{view_name}' (settings.QUERY_BUDGETS)")
+        if len(recorder) > budget:
+            self.fail(
+                f"La vue '{view_name}' a exécuté {len(recorder)} requêtes "
+                f"(budget : {budget})\n{recorder.report()}"
+            )
+        return response, recorder
+
+    def assertQueriesConstant(self, path, method='get', data=None, client=None, budget=None, status=200):
+        """
+        Exécute la vue après chaque palier de ``seed_sizes`` et échoue si le
+        nombre de requêtes augmente avec le volume de données.
+        """
+        counts = []
+        recorder = None
+        for size in self.seed_sizes:
+            self.seed(size)
+            cache.clear()
+            _, recorder = self.assertWithinBudget(path, method, data, client, budget, status)
+            counts.append(len(recorder))
+        if len(set(counts)) > 1:
+            sizes = ', '.join(f"{size} → {count}" for size, count in zip(self.seed_sizes, counts))
+            self.fail(
+                f"Le nombre de requêtes dépend du volume de données ({sizes}) : "
+                f"requête N+1 probable\n{recorder.report()}"
+            )
+        return counts
@@ -0,0 +1,80 @@
+"""
+Limitation du nombre de requêtes par adresse IP.
+
+Les limites sont définies dans ``settings.RATE_LIMITS`` (nom de portée :
+(requêtes, période en secondes)) et comptées dans le cache partagé, par
+fenêtres fixes : ``cache.add`` crée le compteur de la fenêtre, ``cache.incr``
+l'incrémente de façon atomique. Le décorateur accepte les vues synchrones et
+asynchrones.
+"""
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+
+
+def client_ip(request):
+    # REMOTE_ADDR uniquement : X-Forwarded-For est fourni par le client
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _counter(request, scope):
+    """(clé du compteur de la fenêtre courante, limite, période)"""
+    limit, period = settings.RATE_LIMITS[scope]
+    window = int(time.time() // period)
+    return f'ratelimit:{scope}:{client_ip(request)}:{window}', limit, period
+
+
+def is_rate_limited(request, scope):
+    """Compter la requête ; True si la limite de la portée est dépassée"""
+    key, limit, period = _counter(request, scope)
+    if cache.add(key, 1, period):
+        return False
+    try:
+        return cache.incr(key) > limit
+    except ValueError:
+        # Compteur expiré entre-temps
+        cache.add(key, 1, period)
+        return False
+
+
+async def ais_rate_limited(request, scope):
+    """``is_rate_limited`` pour les vues asynchrones"""
+    key, limit, period = _counter(request, scope)
+    if await cache.aadd(key, 1, period):
+        return False
+    try:
+        return await cache.aincr(key) > limit
+    except ValueError:
+        await cache.aadd(key, 1, period)
+        return False
+
+
+def too_many_requests(scope):
+    _, period = settings.RATE_LIMITS[scope]
+    response = JsonResponse({'error': 'Trop de requêtes, réessayez plus tard.'}, status=429)
+    response['Retry-After'] = str(period)
+    return response
+
+
+def rate_limit(scope):
+    """Réponse 429 quand l'adresse IP a dépassé la limite de ``scope``"""
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if await ais_rate_limited(request, scope):
+                    return too_many_requests(scope)
+                return await view(request, *args, **kwargs)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if is_rate_limited(request, scope):
+                return too_many_requests(scope)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
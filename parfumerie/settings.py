@@ -3,6 +3,7 @@ Django settings for parfumerie project.
 
 """
 import os
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -37,6 +38,9 @@ INSTALLED_APPS = [
     'orders.apps.OrdersConfig',
     'customers.apps.CustomersConfig',
     'cart',
+    'inventory.apps.InventoryConfig',
+    'analytics.apps.AnalyticsConfig',
+    'retention.apps.RetentionConfig',
     'paypal.standard.ipn',
     'axes',
 ]
@@ -47,6 +51,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'customers.middleware.CustomerMiddleware',
     'axes.middleware.AxesMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -80,6 +85,14 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Verrou d'écriture pris dès le début de chaque transaction (BEGIN
+            # IMMEDIATE) : une transaction concurrente attend jusqu'à ``timeout``
+            # secondes au lieu d'échouer (« database is locked ») en passant
+            # de la lecture à l'écriture. select_for_update() n'a pas d'effet sur SQLite.
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -87,6 +100,16 @@ DATABASES = {
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
+# Utilisateur de la session chargé avec son profil client (request.customer)
+AUTHENTICATION_BACKENDS = [
+    # Refuse les tentatives des clients verrouillés avant toute vérification du mot de passe
+    'axes.backends.AxesStandaloneBackend',
+    'customers.backends.CustomerBackend',
+]
+
+# Threads du pool de hachage des vues de connexion et d'inscription asynchrones
+PASSWORD_HASHING_WORKERS = os.cpu_count() or 1
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -133,6 +156,8 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 # Cart session ID
 CART_SESSION_ID = 'cart'
+# Jeton des réservations de stock du panier
+CART_RESERVATION_SESSION_ID = 'cart_reservation'
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -163,16 +188,90 @@ LOGIN_URL = '/account/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 
+# Cache partagé entre les processus (verrouillages d'axes, versions du cache,
+# limites de requêtes, filtres de disponibilité) ; cache local au processus à défaut
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'unique-snowflake',
+        }
+    }
+
 # Configuration d'Axes
 AXES_FAILURE_LIMIT = 5
-AXES_LOCKOUT_CALLABLE = 'axes.handlers.default.lockout_response'
-CACHES = {
- 'default': {
- 'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
- 'LOCATION': 'unique-snowflake',
- }
-}
+# Échecs comptés dans le cache : il doit être partagé par les processus et
+# incrémenter de façon atomique (Redis, vérifié au démarrage, customers.checks).
+# Sans Redis, les échecs sont comptés en base par le gestionnaire d'axes.
+AXES_HANDLER = (
+    'customers.lockout.SlidingWindowHandler' if os.getenv("REDIS_URL")
+    else 'axes.handlers.database.AxesDatabaseHandler'
+)
 AXES_CACHE = 'default'
+# Fenêtre glissante des échecs de connexion, comptés par tranches de LOGIN_FAILURE_BUCKET secondes
+AXES_COOLOFF_TIME = timedelta(minutes=15)
+LOGIN_FAILURE_BUCKET = 60
+AXES_RESET_ON_SUCCESS = True
+AXES_ENABLE_ACCESS_FAILURE_LOG = True
+# Journaux d'accès écrits par lots, hors des requêtes de connexion
+LOGIN_AUDIT_BATCH_SIZE = 100
+LOGIN_AUDIT_FLUSH_INTERVAL = 5
+
+# Durées de conservation par table (python manage.py apply_retention)
+RETENTION_POLICIES = {
+    # Sessions expirées (enregistrées à chaque requête)
+    'sessions.Session': {'field': 'expire_date', 'days': 0},
+    'axes.AccessAttempt': {'field': 'attempt_time', 'days': 30},
+    'axes.AccessFailureLog': {'field': 'attempt_time', 'days': 90},
+    'axes.AccessLog': {'field': 'attempt_time', 'days': 180},
+    'ipn.PayPalIPN': {'field': 'created_at', 'days': 365},
+    # Journaux de recherche (les totaux journaliers sont conservés)
+    'analytics.SearchLog': {'field': 'created', 'days': 90},
+}
+RETENTION_BATCH_SIZE = 500
+RETENTION_PAUSE = 0.1
+
+# Popularité des produits (voir products/popularity.py) : vues et ventes
+# pondérées par une décroissance exponentielle à partir de cette date
+POPULARITY_EPOCH = datetime(2026, 1, 1, tzinfo=timezone.utc)
+POPULARITY_HALF_LIFE = timedelta(days=7) # Vues des fiches produits
+SALES_HALF_LIFE = timedelta(days=30) # Articles vendus
+POPULARITY_SEARCH_CLICK_WEIGHT = 2 # Clic sur un résultat de recherche, en vues
+POPULARITY_BATCH_SIZE = 500 # Produits par UPDATE
+POPULARITY_FLUSH_INTERVAL = 30 # Secondes avant l'écriture des vues en attente
+
+# Journaux de recherche écrits par lots (voir analytics/search.py)
+SEARCH_LOG_BATCH_SIZE = 200
+SEARCH_LOG_FLUSH_INTERVAL = 10
+
+# Recherche approchée (fautes de frappe) par trigrammes, voir products/fuzzy.py
+FUZZY_SEARCH_MIN_SCORE = 0.5 # Part minimale des trigrammes de la requête présents dans le nom
+FUZZY_SEARCH_CANDIDATES = 50 # Produits retournés au plus
+FUZZY_SEARCH_BUDGET = 0.05 # Secondes de parcours de l'index par recherche
+
+# Facettes du catalogue calculées en mémoire, voir products/facets.py
+FACET_PRICE_BANDS = (200, 500, 1000) # Bornes des tranches de prix (DH)
+FACET_REFRESH_OVERLAP = 5 # Secondes relues avant la dernière mise à jour (transactions en cours)
+FACET_RESTRICT_LIMIT = 20000 # Produits retenus par le texte au-delà desquels les facettes sont affichées sans nombres
+
+# Mises à jour en direct du stock et des prix (flux SSE, voir products/live.py)
+LIVE_POLL_INTERVAL = 2 # Secondes entre deux lectures de la version partagée
+LIVE_HEARTBEAT = 15 # Commentaire envoyé aux connexions inactives (proxys)
+LIVE_QUEUE_SIZE = 100 # Changements en attente par connexion
+LIVE_MAX_PRODUCTS = 100 # Produits suivis par connexion
+
+# Limites par adresse IP : (requêtes, période en secondes), voir parfumerie/ratelimit.py
+RATE_LIMITS = {
+    # Vérifications à la frappe du formulaire d'inscription
+    'availability': (30, 60),
+}
 
 
 # Paramètres de session
@@ -181,4 +280,34 @@ CSRF_COOKIE_SECURE = True # À activer en production avec HTTPS
 SESSION_COOKIE_HTTPONLY = True # Empêche l'accès JS aux cookies de session
 SESSION_COOKIE_AGE = 1209600 # Durée de vie du cookie de session (2 semaines)
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False # La session n'expire pas à la fermeture du navigateur
-SESSION_SAVE_EVERY_REQUEST = True # Réinitialise le délai d'expiration à chaque requête
\ No newline at end of file
+SESSION_SAVE_EVERY_REQUEST = True # Réinitialise le délai d'expiration à chaque requête
+
+# Durée (secondes) pendant laquelle les articles d'un panier sont réservés,
+# prolongée à chaque modification ou consultation du panier
+STOCK_RESERVATION_TTL = 15 * 60
+
+# Budgets de requêtes SQL par vue, vérifiés par les tests (voir parfumerie/querybudget.py)
+QUERY_BUDGETS = {
+    # Liste du catalogue : lecture des facettes (index reconstruit, le cache étant
+    # vidé avant chaque mesure) et ids des produits retenus par la recherche texte
+    'products:product_list': 9,
+    'products:product_list_by_category': 9,
+    'products:product_detail': 6,
+    'products:search_api': 1,
+    'products:suggestions_api': 1,
+    'products:product_manage_list': 8,
+    'products:product_create': 6,
+    'products:category_list': 6,
+    'products:category_create': 5,
+    # Renouvellement des réservations : verrou des produits, somme des réservations, upsert
+    'cart:cart_detail': 10,
+    'cart:cart_summary': 4,
+    'orders:order_create': 6,
+    'orders:order_history': 7,
+    'orders:order_detail': 7,
+    'customers:login': 4,
+    'customers:register': 4,
+    'customers:profile': 5,
+    'admin:orders_order_changelist': 8,
+    'admin:products_product_changelist': 9,
+}
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'parfumerie.settings')
 
 application = get_wsgi_application()
+
+# Index des facettes construit en arrière-plan avant les premières requêtes
+from products.facets import warm  # noqa: E402
+
+warm()
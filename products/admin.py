@@ -1,6 +1,10 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
 from django.utils.html import format_html
-from .models import Category, Product
+from inventory.ledger import InsufficientStock, record_movement
+from inventory.models import StockMovement
+from .models import Category, Product, PriceCampaign
+from .pricing import apply_campaign, preview_campaign, revert_campaign
 
 
 @admin.register(Category)
@@ -9,17 +13,41 @@ class CategoryAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
 
 
+class DiscountFilter(admin.SimpleListFilter):
+    """Filtre sur la réduction stockée en base (discount_percent)"""
+    title = 'réduction'
+    parameter_name = 'discount'
+
+    def lookups(self, request, model_admin):
+        return [
+            ('none', 'Aucune'),
+            ('any', 'En promotion'),
+            ('10', '10 % et plus'),
+            ('25', '25 % et plus'),
+            ('50', '50 % et plus'),
+        ]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'none':
+            return queryset.filter(discount_amount=0)
+        if self.value() == 'any':
+            return queryset.filter(discount_amount__gt=0)
+        if self.value() in ('10', '25', '50'):
+            return queryset.filter(discount_percent__gte=int(self.value()))
+        return queryset
+
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ['name', 'slug', 'display_price', 'discount_info', 'price', 'original_price', 'stock_quantity', 'stock_status', 'available', 'created']
-    list_filter = ['available', 'created', 'updated', 'category']
+    list_filter = ['available', DiscountFilter, 'created', 'updated', 'category']
     list_editable = ['price', 'original_price', 'available', 'stock_quantity']
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ['name', 'description']
     
     def display_price(self, obj):
         """Affiche le prix avec réduction si applicable"""
-        if obj.has_discount:
+        if obj.discount_amount:
             return format_html(
                 '<span style="text-decoration: line-through; color: #999;">{} DH</span><br>'
                 '<span style="color: #d4af37; font-weight: bold;">{} DH</span>',
@@ -34,14 +62,15 @@ class ProductAdmin(admin.ModelAdmin):
     
     def discount_info(self, obj):
         """Affiche les informations de réduction"""
-        if obj.has_discount:
+        if obj.discount_amount:
             return format_html(
                 '<span style="background: #dc3545; color: white; padding: 2px 6px; border-radius: 3px; font-size: 11px;">-{}%</span>',
-                obj.discount_percentage
+                obj.discount_percent
             )
         else:
             return format_html('<span style="color: #999;">Aucune</span>')
     discount_info.short_description = 'Réduction'
+    discount_info.admin_order_field = 'discount_percent'
     
     def stock_status(self, obj):
         """Affiche le statut du stock avec des couleurs"""
@@ -59,6 +88,42 @@ class ProductAdmin(admin.ModelAdmin):
             )
     
     stock_status.short_description = 'Statut du stock'
+
+    def formfield_for_dbfield(self, db_field, request, **kwargs):
+        if db_field.name == 'stock_quantity':
+            # Le stock affiché est renvoyé avec le formulaire pour calculer l'écart saisi
+            kwargs['show_hidden_initial'] = True
+        return super().formfield_for_dbfield(db_field, request, **kwargs)
+
+    def displayed_stock(self, form):
+        """Stock affiché à l'utilisateur quand il a ouvert le formulaire"""
+        field = form.fields['stock_quantity']
+        try:
+            displayed = field.to_python(form.data.get(form.add_initial_prefix('stock_quantity')))
+        except ValidationError:
+            displayed = None
+        return form.initial.get('stock_quantity', 0) if displayed is None else displayed
+
+    def save_model(self, request, obj, form, change):
+        """
+        Le stock n'est jamais réécrit avec la valeur affichée dans le formulaire
+        (une vente a pu le modifier entre-temps) : l'écart saisi est enregistré
+        comme mouvement dans le journal de stock.
+        """
+        target = obj.stock_quantity
+        initial = self.displayed_stock(form) if change else 0
+        if not change:
+            obj.stock_quantity = 0
+        # En modification, Product.save() n'écrit pas le stock
+        obj.save()
+
+        if target != initial:
+            kind = StockMovement.ADJUSTMENT if change else StockMovement.RECEIPT
+            try:
+                record_movement(obj, target - initial, kind, user=request.user, note="Saisie dans l'admin")
+            except InsufficientStock:
+                messages.error(request, f"Stock de '{obj}' non modifié : le stock actuel est inférieur à la sortie demandée.")
+        obj.refresh_from_db(fields=['stock_quantity'])
     
     fieldsets = (
         ('Informations générales', {
@@ -74,3 +139,56 @@ class ProductAdmin(admin.ModelAdmin):
         }),
     )
 
+
+
+@admin.register(PriceCampaign)
+class PriceCampaignAdmin(admin.ModelAdmin):
+    list_display = ['name', 'category', 'percent', 'rounding', 'status', 'starts_at', 'ends_at', 'products_count']
+    list_filter = ['status', 'category']
+    readonly_fields = ['status', 'products_count', 'applied_at', 'ended_at', 'preview']
+    actions = ['preview_campaigns', 'apply_campaigns', 'revert_campaigns']
+    fieldsets = (
+        ('Règle', {
+            'fields': ('name', 'category', 'percent', 'rounding', 'keep_original_price')
+        }),
+        ('Programmation', {
+            'fields': ('starts_at', 'ends_at'),
+            'description': 'Les campagnes programmées sont démarrées et terminées par la commande apply_price_campaigns.'
+        }),
+        ('Suivi', {
+            'fields': ('status', 'products_count', 'applied_at', 'ended_at', 'preview')
+        }),
+    )
+
+    def preview(self, obj):
+        """Aperçu de la campagne sur le catalogue actuel"""
+        if not obj.pk or obj.status != PriceCampaign.STATUS_SCHEDULED:
+            return '-'
+        stats = preview_campaign(obj, limit=0)
+        return format_html(
+            '{} produit(s), total {} DH → {} DH',
+            stats['count'], stats['current_total'] or 0, stats['new_total'] or 0
+        )
+    preview.short_description = 'Aperçu'
+
+    @admin.action(description='Aperçu des campagnes sélectionnées')
+    def preview_campaigns(self, request, queryset):
+        for campaign in queryset.filter(status=PriceCampaign.STATUS_SCHEDULED):
+            stats = preview_campaign(campaign, limit=0)
+            self.message_user(
+                request,
+                f"{campaign} : {stats['count']} produit(s), total {stats['current_total'] or 0} DH "
+                f"→ {stats['new_total'] or 0} DH (prix le plus bas {stats['lowest_price'] or 0} DH)"
+            )
+
+    @admin.action(description='Appliquer maintenant')
+    def apply_campaigns(self, request, queryset):
+        for campaign in queryset.filter(status=PriceCampaign.STATUS_SCHEDULED):
+            campaign = apply_campaign(campaign)
+            self.message_user(request, f"{campaign} : {campaign.products_count} prix modifié(s).", messages.SUCCESS)
+
+    @admin.action(description='Terminer et rétablir les prix')
+    def revert_campaigns(self, request, queryset):
+        for campaign in queryset.exclude(status=PriceCampaign.STATUS_ENDED):
+            revert_campaign(campaign)
+            self.message_user(request, f"{campaign} : prix rétablis.", messages.SUCCESS)
@@ -0,0 +1,265 @@
+"""
+Import et export en masse du catalogue (CSV ou JSON Lines) en mémoire constante.
+
+L'export parcourt les produits par blocs avec ``iterator(chunk_size=...)`` et
+produit le fichier ligne par ligne. L'import lit le fichier ligne par ligne et
+traite les produits par lots : pour chaque lot, les produits existants sont
+chargés en une seule requête sur les slugs, les nouveaux sont créés avec
+``bulk_create`` et les existants mis à jour par un seul
+``INSERT ... ON CONFLICT (id) DO UPDATE`` (``bulk_create(update_conflicts=True)``),
+bien plus rapide que ``bulk_update`` dont le ``CASE`` croît avec le lot. Le
+stock des produits existants n'est jamais réécrit : l'écart entre le stock du
+fichier et le stock lu est appliqué par le journal de stock.
+"""
+import csv
+import json
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import reset_queries, transaction
+from django.utils.text import slugify
+
+from inventory.ledger import log_movements, record_adjustments
+from inventory.models import StockMovement
+from .models import Category, Product, normalized_name
+from .signals import catalog_changed
+
+
+FORMATS = ('csv', 'jsonl')
+EXPORT_FIELDS = ['slug', 'name', 'category', 'description', 'price', 'original_price', 'available', 'stock_quantity']
+MAX_REPORTED_ERRORS = 100
+
+
+class Echo:
+    """Pseudo-fichier dont ``write`` retourne la ligne au lieu de la stocker"""
+
+    def write(self, value):
+        return value
+
+
+def export_products(queryset=None, fmt='csv', chunk_size=2000):
+    """
+    Générer l'export des produits ligne par ligne (pour ``StreamingHttpResponse``
+    ou l'écriture dans un fichier).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Format inconnu : {fmt}")
+    queryset = Product.objects.all() if queryset is None else queryset
+    rows = queryset.order_by('id').values_list(
+        'slug', 'name', 'category__slug', 'description', 'price',
+        'original_price', 'available', 'stock_quantity'
+    ).iterator(chunk_size=chunk_size)
+
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(EXPORT_FIELDS)
+        for row in rows:
+            yield writer.writerow(row)
+    else:
+        for row in rows:
+            record = dict(zip(EXPORT_FIELDS, row))
+            record['price'] = str(record['price'])
+            if record['original_price'] is not None:
+                record['original_price'] = str(record['original_price'])
+            yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    errors: list = field(default_factory=list)
+    error_count: int = 0
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"Ligne {line} : {message}")
+
+
+def _read_records(lines, fmt):
+    """Lire les enregistrements du fichier un par un : (numéro de ligne, dict)"""
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for number, line in enumerate(lines, start=1):
+            if line.strip():
+                try:
+                    yield number, json.loads(line)
+                except ValueError:
+                    yield number, None
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'vrai', 'oui', 'yes')
+
+
+def _clean_record(record):
+    """
+    Valider un enregistrement et le convertir en valeurs de champs.
+    Seules les colonnes présentes dans le fichier sont retournées.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("enregistrement illisible")
+    values = {}
+    name = (record.get('name') or '').strip()
+    slug = (record.get('slug') or '').strip() or slugify(name)
+    if not slug:
+        raise ValueError("slug ou nom requis")
+    if name:
+        values['name'] = name
+    if 'category' in record:
+        values['category'] = (record['category'] or '').strip()
+    if 'description' in record:
+        values['description'] = record['description'] or ''
+    for price_field in ('price', 'original_price'):
+        if price_field in record:
+            raw = record[price_field]
+            if raw in (None, ''):
+                if price_field == 'price':
+                    raise ValueError("prix requis")
+                values[price_field] = None
+                continue
+            try:
+                price = Decimal(str(raw))
+            except InvalidOperation:
+                raise ValueError(f"{price_field} invalide : {raw}")
+            if not price.is_finite():
+                raise ValueError(f"{price_field} invalide : {raw}")
+            if price < 0:
+                raise ValueError(f"{price_field} négatif : {raw}")
+            values[price_field] = price
+    if 'available' in record:
+        values['available'] = _to_bool(record['available'])
+    if 'stock_quantity' in record:
+        try:
+            values['stock_quantity'] = int(record['stock_quantity'] or 0)
+        except (TypeError, ValueError):
+            raise ValueError(f"stock invalide : {record['stock_quantity']}")
+        if values['stock_quantity'] < 0:
+            raise ValueError("stock négatif")
+    # bulk_create n'appelle pas full_clean : validateurs des champs (slug,
+    # longueurs, chiffres des prix) appliqués ici, enregistrement par enregistrement
+    _validate(Product, 'slug', slug)
+    for name, value in values.items():
+        if name != 'category':
+            _validate(Product, name, value)
+        elif value:
+            _validate(Category, 'slug', value)
+    return slug, values
+
+
+def _validate(model, name, value):
+    try:
+        model._meta.get_field(name).clean(value, None)
+    except ValidationError as e:
+        raise ValueError(f"{'category' if model is Category else name} invalide : {' '.join(e.messages)}")
+
+
+def _resolve_categories(slugs, cache):
+    """Identifiants des catégories par slug, en créant celles qui manquent"""
+    missing = {slug for slug in slugs if slug and slug not in cache}
+    if missing:
+        cache.update(Category.objects.filter(slug__in=missing).values_list('slug', 'id'))
+        to_create = [Category(name=slug.replace('-', ' ').capitalize(), slug=slug) for slug in missing - cache.keys()]
+        if to_create:
+            Category.objects.bulk_create(to_create)
+            cache.update(Category.objects.filter(slug__in=[c.slug for c in to_create]).values_list('slug', 'id'))
+    return cache
+
+
+def _import_batch(batch, result, category_cache, dry_run):
+    # Le dernier enregistrement d'un slug l'emporte à l'intérieur du lot
+    records = {}
+    for line, slug, values in batch:
+        records[slug] = (line, {**records.get(slug, (None, {}))[1], **values})
+
+    existing = {product.slug: product for product in Product.objects.filter(slug__in=records.keys())}
+    _resolve_categories({values.get('category') for _, values in records.values()}, category_cache)
+
+    to_create, to_update, update_fields = [], [], {'updated'}
+    stock_changes, lines = {}, {}
+    for slug, (line, values) in records.items():
+        if values.get('name'):
+            values['search_name'] = normalized_name(values['name'])
+        if 'category' in values:
+            if not values['category']:
+                result.add_error(line, "catégorie requise")
+                continue
+            values['category_id'] = category_cache[values.pop('category')]
+        if slug in existing:
+            product = existing[slug]
+            # Le stock n'est pas réécrit : l'écart avec le stock lu est appliqué par le journal
+            stock = values.pop('stock_quantity', product.stock_quantity)
+            if stock != product.stock_quantity:
+                stock_changes[product.pk] = stock - product.stock_quantity
+                lines[product.pk] = line
+            for name, value in values.items():
+                setattr(product, name, value)
+            update_fields.update('category' if name == 'category_id' else name for name in values)
+            to_update.append(product)
+        else:
+            missing = {'name', 'price', 'category_id'} - values.keys()
+            if missing:
+                result.add_error(line, f"nouveau produit incomplet ({', '.join(sorted(missing))})")
+                continue
+            to_create.append(Product(slug=slug, **values))
+
+    if not dry_run:
+        Product.objects.bulk_create(to_create)
+        if to_update:
+            Product.objects.bulk_create(
+                to_update, update_conflicts=True, unique_fields=['id'], update_fields=sorted(update_fields)
+            )
+        log_movements([
+            StockMovement(product=p, kind=StockMovement.RECEIPT, quantity=p.stock_quantity, note="Import")
+            for p in to_create if p.stock_quantity
+        ])
+        # Le fichier donne le stock compté : l'écart est appliqué en delta (une
+        # vente enregistrée depuis la lecture n'est pas écrasée) et journalisé
+        for product_id in record_adjustments(stock_changes, note="Import"):
+            result.add_error(lines[product_id], "stock non modifié : le stock actuel est inférieur à la sortie demandée")
+    result.created += len(to_create)
+    result.updated += len(to_update)
+
+
+def import_products(lines, fmt='csv', batch_size=1000, dry_run=False):
+    """
+    Importer des produits depuis un itérable de lignes de texte, par lots.
+    Les produits sont identifiés par leur slug : existants mis à jour, nouveaux créés.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Format inconnu : {fmt}")
+    result = ImportResult()
+    category_cache = {}
+    batch = []
+
+    def flush():
+        with transaction.atomic():
+            _import_batch(batch, result, category_cache, dry_run)
+            if dry_run:
+                # Annuler aussi les catégories créées pendant la simulation
+                transaction.set_rollback(True)
+        batch.clear()
+        # Avec DEBUG, chaque INSERT de lot resterait dans connection.queries
+        reset_queries()
+
+    for line, record in _read_records(lines, fmt):
+        try:
+            slug, values = _clean_record(record)
+        except ValueError as e:
+            result.add_error(line, str(e))
+            continue
+        batch.append((line, slug, values))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    if not dry_run and (result.created or result.updated):
+        catalog_changed.send(sender=Product)
+    return result
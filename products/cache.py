@@ -0,0 +1,44 @@
+"""
+Version du catalogue dans le cache.
+
+Les réponses mises en cache qui dépendent des produits (recherche,
+suggestions...) incluent la version du catalogue dans leur clé : incrémenter
+la version invalide d'un coup toutes ces entrées, sans avoir à les retrouver.
+"""
+import time
+
+from django.core.cache import cache
+
+
+CATALOG_VERSION_KEY = 'products:catalog_version'
+CATALOG_CACHE_TIMEOUT = 300
+
+
+def catalog_version():
+    """Version courante du catalogue"""
+    # Valeur initiale horodatée : si la clé est évincée du cache, la nouvelle
+    # version ne peut pas retomber sur une ancienne clé encore présente
+    return cache.get_or_set(CATALOG_VERSION_KEY, time.time_ns, timeout=None)
+
+
+async def acatalog_version():
+    """Version courante du catalogue (vues asynchrones)"""
+    return await cache.aget_or_set(CATALOG_VERSION_KEY, time.time_ns, timeout=None)
+
+
+def bump_catalog_version():
+    """Invalider toutes les entrées de cache dépendant du catalogue"""
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        return catalog_version()
+
+
+def catalog_cache_key(prefix, *parts):
+    """Clé de cache liée à la version courante du catalogue"""
+    return ':'.join(['products', prefix, str(catalog_version()), *map(str, parts)])
+
+
+async def acatalog_cache_key(prefix, *parts):
+    """Clé de cache liée à la version courante du catalogue (vues asynchrones)"""
+    return ':'.join(['products', prefix, str(await acatalog_version()), *map(str, parts)])
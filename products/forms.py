@@ -1,6 +1,7 @@
 from django import forms
 from django.utils.text import slugify
-from .models import Product, Category
+from .facets import price_bands
+from .models import Product, Category, PriceCampaign
 
 
 class CategoryForm(forms.ModelForm):
@@ -178,6 +179,10 @@ class ProductSearchForm(forms.Form):
             ('-price', 'Prix (décroissant)'),
             ('-created', 'Plus récents'),
             ('created', 'Plus anciens'),
+            ('-discount_percent', 'Plus forte réduction (%)'),
+            ('-discount_amount', 'Plus grosse économie (DH)'),
+            ('-popularity', 'Populaires'),
+            ('-sales_score', 'Meilleures ventes'),
         ],
         required=False,
         initial='name',
@@ -186,4 +191,141 @@ class ProductSearchForm(forms.Form):
         }),
         label='Trier par'
     )
+    on_sale = forms.BooleanField(
+        required=False,
+        widget=forms.CheckboxInput(attrs={
+            'class': 'form-check-input'
+        }),
+        label='En promotion uniquement'
+    )
+    min_discount = forms.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=99,
+        widget=forms.NumberInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Ex. 20'
+        }),
+        label='Réduction minimale (%)'
+    )
+    price_band = forms.TypedChoiceField(
+        choices=lambda: [('', 'Tous les prix')] + [(index, label) for index, label, _, _ in price_bands()],
+        coerce=int,
+        empty_value=None,
+        required=False,
+        widget=forms.Select(attrs={
+            'class': 'form-control'
+        }),
+        label='Prix'
+    )
+    in_stock = forms.BooleanField(
+        required=False,
+        widget=forms.CheckboxInput(attrs={
+            'class': 'form-check-input'
+        }),
+        label='En stock uniquement'
+    )
+
+
+
+class ProductImportForm(forms.Form):
+    """
+    Formulaire d'import de produits en masse (CSV ou JSON Lines)
+    """
+    file = forms.FileField(
+        widget=forms.FileInput(attrs={
+            'class': 'form-control',
+            'accept': '.csv,.jsonl,.json'
+        }),
+        label='Fichier',
+        help_text='Colonnes : slug, name, category (slug), description, price, original_price, available, stock_quantity'
+    )
+    format = forms.ChoiceField(
+        choices=[('csv', 'CSV'), ('jsonl', 'JSON Lines')],
+        initial='csv',
+        widget=forms.Select(attrs={
+            'class': 'form-control'
+        }),
+        label='Format'
+    )
+    dry_run = forms.BooleanField(
+        required=False,
+        widget=forms.CheckboxInput(attrs={
+            'class': 'form-check-input'
+        }),
+        label='Simulation (valider le fichier sans rien enregistrer)'
+    )
+
+
+class PriceCampaignForm(forms.ModelForm):
+    """
+    Formulaire de création d'une campagne de réduction
+    """
+    class Meta:
+        model = PriceCampaign
+        fields = ['name', 'category', 'percent', 'rounding', 'keep_original_price', 'starts_at', 'ends_at']
+        widgets = {
+            'name': forms.TextInput(attrs={
+                'class': 'form-control',
+                'placeholder': 'Ex. Soldes d\'été'
+            }),
+            'category': forms.Select(attrs={
+                'class': 'form-control'
+            }),
+            'percent': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'step': '0.01',
+                'min': '0',
+                'max': '100'
+            }),
+            'rounding': forms.Select(attrs={
+                'class': 'form-control'
+            }),
+            'keep_original_price': forms.CheckboxInput(attrs={
+                'class': 'form-check-input'
+            }),
+            'starts_at': forms.DateTimeInput(attrs={
+                'class': 'form-control',
+                'type': 'datetime-local'
+            }, format='%Y-%m-%dT%H:%M'),
+            'ends_at': forms.DateTimeInput(attrs={
+                'class': 'form-control',
+                'type': 'datetime-local'
+            }, format='%Y-%m-%dT%H:%M'),
+        }
+        labels = {
+            'name': 'Nom de la campagne',
+            'category': 'Catégorie',
+            'percent': 'Réduction (%)',
+            'rounding': 'Arrondi',
+            'keep_original_price': 'Afficher le prix actuel barré',
+            'starts_at': 'Début',
+            'ends_at': 'Fin'
+        }
+
+
+class SalesReportForm(forms.Form):
+    """
+    Période du tableau de bord des ventes
+    """
+    date_from = forms.DateField(
+        widget=forms.DateInput(attrs={
+            'class': 'form-control',
+            'type': 'date'
+        }),
+        label='Du'
+    )
+    date_to = forms.DateField(
+        widget=forms.DateInput(attrs={
+            'class': 'form-control',
+            'type': 'date'
+        }),
+        label='Au'
+    )
 
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from, date_to = cleaned_data.get('date_from'), cleaned_data.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise forms.ValidationError("La date de début doit précéder la date de fin.")
+        return cleaned_data
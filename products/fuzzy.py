@@ -0,0 +1,131 @@
+"""
+Recherche approchée des produits (fautes de frappe) par trigrammes.
+
+Les noms des produits sont normalisés (sans accents ni casse) et découpés en
+trigrammes, chaque mot étant bordé d'espaces (« chloé » : "  c", " ch", "chl",
+"hlo", "loe", "oe "). L'index de chaque processus associe à chaque trigramme
+la liste des produits qui le contiennent (``array`` d'entiers).
+
+Une recherche compte, pour chaque produit, les trigrammes de la requête qu'il
+contient, en parcourant d'abord les listes les plus courtes (trigrammes les
+plus sélectifs) : passé ``FUZZY_SEARCH_BUDGET`` secondes, les listes restantes
+sont ignorées et les candidats sont ceux déjà trouvés. Les meilleurs candidats
+sont ensuite notés sur la part des trigrammes de la requête présents dans leur
+nom ; seuls ceux atteignant ``FUZZY_SEARCH_MIN_SCORE`` sont retournés, les plus
+proches d'abord.
+
+L'index est reconstruit quand la version du catalogue change, dans un thread
+d'arrière-plan lancé par la première recherche qui le constate : les recherches
+continuent d'utiliser l'index précédent (aucune suggestion approchée avant la
+première construction du processus), sans attendre la reconstruction ni
+occuper le thread partagé des appels ``sync_to_async``. Une recherche faite
+dans une transaction construit pour elle seule un index local, jamais publié :
+une autre connexion ne verrait pas les écritures de la transaction, et l'index
+du processus ne doit pas contenir de lignes qui peuvent être annulées.
+"""
+import threading
+import time
+from array import array
+from collections import Counter, defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections, transaction
+
+from .cache import catalog_version
+from .models import Product
+from .text import normalize
+
+
+def trigrams(text):
+    """Trigrammes des mots de ``text`` normalisé"""
+    grams = set()
+    for word in normalize(text).split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(query_grams, name_grams):
+    """(part de la requête présente dans le nom, indice de Jaccard)"""
+    shared = len(query_grams & name_grams)
+    return shared / len(query_grams), shared / len(query_grams | name_grams)
+
+
+class TrigramIndex:
+    """Trigrammes des noms de produits du processus"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (version du catalogue, trigramme : ids des produits, id : nom)
+        self.state = None
+        self.builder = None
+
+    def build(self, version):
+        """État de l'index construit depuis la base (sans le publier)"""
+        postings = defaultdict(lambda: array('I'))
+        names = {}
+        for product_id, name in Product.objects.order_by().values_list('id', 'name').iterator(chunk_size=5000):
+            names[product_id] = name
+            for gram in trigrams(name):
+                postings[gram].append(product_id)
+        return version, dict(postings), names
+
+    def rebuild(self, version):
+        """Reconstruction d'arrière-plan, avec sa propre connexion"""
+        try:
+            self.state = self.build(version)
+        finally:
+            connections.close_all()
+            with self.lock:
+                self.builder = None
+
+    def current(self):
+        """État de l'index (None avant la première construction)"""
+        version = catalog_version()
+        state = self.state
+        if state is None or state[0] != version:
+            if transaction.get_connection().in_atomic_block:
+                # Écritures non validées visibles de cette seule connexion
+                return self.build(version)
+            # Un seul thread reconstruit, les recherches gardent l'index précédent
+            with self.lock:
+                if self.builder is None:
+                    self.builder = threading.Thread(target=self.rebuild, args=(version,), daemon=True)
+                    self.builder.start()
+        return state
+
+    def search(self, query, limit):
+        """Identifiants des ``limit`` produits les plus proches de ``query``"""
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+        state = self.current()
+        if state is None:
+            return []
+        _, postings, names = state
+        deadline = time.perf_counter() + settings.FUZZY_SEARCH_BUDGET
+        hits = Counter()
+        for gram in sorted(query_grams & postings.keys(), key=lambda gram: len(postings[gram])):
+            hits.update(postings[gram])
+            if time.perf_counter() > deadline:
+                break
+
+        scored = []
+        for product_id, _ in hits.most_common(limit * 4):
+            score = similarity(query_grams, trigrams(names[product_id]))
+            if score[0] >= settings.FUZZY_SEARCH_MIN_SCORE:
+                scored.append((score, product_id))
+        scored.sort(key=lambda item: (-item[0][0], -item[0][1], item[1]))
+        return [product_id for _, product_id in scored[:limit]]
+
+
+index = TrigramIndex()
+
+
+def fuzzy_search(query, limit=None):
+    """Produits dont le nom est proche de ``query``, les plus proches d'abord"""
+    return index.search(query, limit or settings.FUZZY_SEARCH_CANDIDATES)
+
+
+afuzzy_search = sync_to_async(fuzzy_search)
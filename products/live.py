@@ -0,0 +1,144 @@
+"""
+Mises à jour en direct du stock et des prix (Server-Sent Events).
+
+Chaque processus ASGI tient un ``LiveBroker`` : un canal par produit suivi,
+partagé par toutes les connexions qui l'affichent, et une seule tâche relais.
+Les écritures (enregistrement d'un produit, mouvement de stock du journal,
+modification en masse du catalogue) appellent ``notify()`` après le commit :
+la version ``products:live_version`` du cache partagé est incrémentée et le
+relais du processus est réveillé. Le relais relit alors en une requête l'état
+de tous les produits suivis et ne transmet aux abonnés que les produits dont le
+prix, le stock ou la disponibilité a changé.
+
+Les autres processus (serveurs WSGI, commandes) n'ont pas d'abonnés : ils ne
+font qu'incrémenter la version, que le relais des processus ASGI consulte
+toutes les ``LIVE_POLL_INTERVAL`` secondes (cache partagé requis entre
+processus : ``REDIS_URL``). Le coût d'un changement est donc d'une requête par
+processus, quel que soit le nombre de connexions ouvertes.
+"""
+import asyncio
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Product
+
+
+LIVE_VERSION_KEY = 'products:live_version'
+LIVE_FIELDS = ('id', 'name', 'price', 'original_price', 'stock_quantity', 'available')
+
+
+def product_state(values):
+    """Message envoyé aux navigateurs pour un produit"""
+    return {
+        'id': values['id'],
+        'name': values['name'],
+        'price': str(values['price']),
+        'original_price': str(values['original_price']) if values['original_price'] else None,
+        'stock': values['stock_quantity'],
+        'in_stock': values['stock_quantity'] > 0,
+        'available': values['available'],
+    }
+
+
+class ProductChannel:
+    """Abonnés aux changements d'un produit et dernier état connu"""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.state = None
+
+
+class LiveBroker:
+    """Diffusion des changements de produits aux connexions du processus"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.channels = {}
+        self.loop = None
+        self.woken = None
+        self.relay = None
+
+    def subscribe(self, product_ids):
+        """File des changements des produits ``product_ids`` (à appeler dans la boucle d'événements)"""
+        queue = asyncio.Queue(maxsize=settings.LIVE_QUEUE_SIZE)
+        with self.lock:
+            for product_id in product_ids:
+                self.channels.setdefault(product_id, ProductChannel()).subscribers.add(queue)
+        self._start_relay()
+        return queue
+
+    def unsubscribe(self, queue, product_ids):
+        with self.lock:
+            for product_id in product_ids:
+                channel = self.channels.get(product_id)
+                if channel:
+                    channel.subscribers.discard(queue)
+                    if not channel.subscribers:
+                        del self.channels[product_id]
+
+    def _start_relay(self):
+        loop = asyncio.get_running_loop()
+        if self.relay is None or self.relay.done() or self.loop is not loop:
+            self.loop = loop
+            self.woken = asyncio.Event()
+            self.relay = loop.create_task(self._run_relay())
+
+    def wake(self):
+        """Réveiller le relais (appelable depuis n'importe quel thread)"""
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self.woken.set)
+
+    async def _run_relay(self):
+        version = None
+        while self.channels:
+            current = await cache.aget(LIVE_VERSION_KEY)
+            # Nouveaux canaux : état de référence à lire
+            if current != version or any(channel.state is None for channel in list(self.channels.values())):
+                version = current
+                await self.refresh()
+            try:
+                await asyncio.wait_for(self.woken.wait(), settings.LIVE_POLL_INTERVAL)
+            except TimeoutError:
+                pass
+            self.woken.clear()
+
+    async def refresh(self):
+        """Relire les produits suivis et transmettre ceux qui ont changé ; retourne leur nombre"""
+        product_ids = list(self.channels)
+        if not product_ids:
+            return 0
+        changed = 0
+        async for values in Product.objects.filter(pk__in=product_ids).values(*LIVE_FIELDS):
+            state = product_state(values)
+            with self.lock:
+                channel = self.channels.get(state['id'])
+                if channel is None or channel.state == state:
+                    continue
+                first, channel.state = channel.state is None, state
+                subscribers = list(channel.subscribers)
+            if first:
+                continue
+            changed += 1
+            for queue in subscribers:
+                try:
+                    queue.put_nowait(state)
+                except asyncio.QueueFull:
+                    # Connexion trop lente : le prochain changement la remettra à jour
+                    pass
+        return changed
+
+
+broker = LiveBroker()
+
+
+def notify():
+    """Signaler un changement de stock ou de prix aux relais de tous les processus"""
+    try:
+        cache.incr(LIVE_VERSION_KEY)
+    except ValueError:
+        cache.set(LIVE_VERSION_KEY, time.time_ns(), timeout=None)
+    broker.wake()
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from products.pricing import run_scheduled_campaigns
+
+
+class Command(BaseCommand):
+    help = "Démarrer et terminer les campagnes de prix programmées (à lancer régulièrement, ex. cron)"
+
+    def handle(self, *args, **options):
+        started, ended = run_scheduled_campaigns()
+        for campaign in ended:
+            self.stdout.write(f"Terminée : {campaign}")
+        for campaign in started:
+            self.stdout.write(f"Démarrée : {campaign} ({campaign.products_count} produit(s))")
+        self.stdout.write(self.style.SUCCESS(f"{len(started)} campagne(s) démarrée(s), {len(ended)} terminée(s)."))
@@ -0,0 +1,219 @@
+"""
+Benchmark des API JSON : déploiement WSGI contre déploiement ASGI.
+
+Crée une base dédiée et un catalogue, puis démarre tour à tour chaque serveur
+dans un processus séparé (serveur WSGI à un thread par requête, puis uvicorn
+sur ``parfumerie.asgi``) et lui envoie les requêtes de nombreux clients
+concurrents : recherche, suggestions, résumé du panier et vérification de
+disponibilité d'un nom d'utilisateur.
+
+Le débit, les latences (p50/p95/p99) et la mémoire résidente du serveur (au
+repos et maximale) sont affichés et enregistrés en JSON pour comparer deux
+exécutions (--compare).
+"""
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer
+from django.db import connection
+
+from products.models import Category, Product
+from products.seeding import seed_catalog
+from .benchmark_storefront import (
+    Command as StorefrontBenchmarkCommand,
+    QuietRequestHandler,
+    SimulatedUser,
+)
+
+
+SERVERS = ('wsgi', 'asgi')
+STEPS = ['search', 'suggestions', 'cart_summary', 'check_username']
+
+
+def memory_mb(pid):
+    """Mémoire résidente courante et maximale d'un processus, en Mo (Linux)"""
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            fields = dict(line.split(':', 1) for line in status)
+    except OSError:
+        return None, None
+    return tuple(round(int(fields[name].split()[0]) / 1024, 1) for name in ('VmRSS', 'VmHWM'))
+
+
+class Command(StorefrontBenchmarkCommand):
+    help = "Benchmark des API JSON servies en WSGI et en ASGI (débit, latences, mémoire)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=64, help="Clients concurrents")
+        parser.add_argument('--requests', type=int, default=25, help="Séries de requêtes par client")
+        parser.add_argument('--categories', type=int, default=8)
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--servers', nargs='+', choices=SERVERS, default=list(SERVERS))
+        parser.add_argument('--database', help="Fichier SQLite du benchmark (temporaire par défaut)")
+        parser.add_argument('--output', default='bench_api.json', help="Fichier JSON des résultats")
+        parser.add_argument('--compare', help="Résultats JSON d'une exécution précédente à comparer")
+        # Usage interne : processus serveur démarré par le benchmark
+        parser.add_argument('--serve', choices=SERVERS, help="Servir l'application sur la base --database")
+
+    def handle(self, *args, **options):
+        if options['serve']:
+            return self.serve(options['serve'], options['database'])
+        return super().handle(*args, **options)
+
+    def serve(self, kind, database):
+        settings.DEBUG = False
+        settings.DATABASES['default']['NAME'] = connection.settings_dict['NAME'] = database
+        # Toutes les requêtes du benchmark viennent de 127.0.0.1
+        settings.RATE_LIMITS = {scope: (10 ** 9, period) for scope, (_, period) in settings.RATE_LIMITS.items()}
+
+        sock = socket.socket()
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        if kind == 'wsgi':
+            from django.core.wsgi import get_wsgi_application
+
+            sock.close()
+            server = ThreadedWSGIServer(('127.0.0.1', port), QuietRequestHandler)
+            server.set_app(get_wsgi_application())
+            self.stdout.write(f'PORT {port}')
+            self.stdout.flush()
+            server.serve_forever()
+        else:
+            try:
+                import uvicorn
+            except ImportError:
+                raise CommandError("Le serveur ASGI du benchmark nécessite le paquet uvicorn")
+            from django.core.asgi import get_asgi_application
+
+            config = uvicorn.Config(get_asgi_application(), log_level='warning', access_log=False, lifespan='off')
+            self.stdout.write(f'PORT {port}')
+            self.stdout.flush()
+            uvicorn.Server(config).run(sockets=[sock])
+
+    def start_server(self, kind, database):
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'django', 'benchmark_api', '--serve', kind, '--database', database,
+             '--settings', os.environ.get('DJANGO_SETTINGS_MODULE', 'parfumerie.settings')],
+            cwd=settings.BASE_DIR, stdout=subprocess.PIPE, text=True,
+        )
+        line = process.stdout.readline()
+        if not line.startswith('PORT '):
+            process.kill()
+            raise CommandError(f"Le serveur {kind.upper()} n'a pas démarré")
+        port = int(line.split()[1])
+        # Serveur prêt quand il accepte les connexions
+        for _ in range(100):
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        return process, port
+
+    def run_benchmark(self, options):
+        started = time.perf_counter()
+        counts = seed_catalog(
+            categories=options['categories'],
+            products=options['products'],
+            customers=0,
+            orders=0,
+            seed=options['seed'],
+        )
+        self.stdout.write(f"Données générées en {time.perf_counter() - started:.1f}s : {counts}")
+        names = list(Product.objects.filter(available=True).values_list('name', flat=True))
+        if not names or not Category.objects.exists():
+            raise CommandError("Le catalogue généré ne contient aucun produit disponible")
+        # Base partagée avec les processus serveurs
+        database = str(connection.settings_dict['NAME'])
+        connection.close()
+
+        servers = {}
+        for kind in options['servers']:
+            process, port = self.start_server(kind, database)
+            try:
+                idle, _ = memory_mb(process.pid)
+                servers[kind] = self.run_load(port, names, options)
+                servers[kind]['rss_idle_mb'] = idle
+                servers[kind]['rss_mb'], servers[kind]['rss_peak_mb'] = memory_mb(process.pid)
+            finally:
+                process.terminate()
+                process.wait()
+
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'options': {k: options[k] for k in ('users', 'requests', 'categories', 'products', 'seed')},
+            'servers': servers,
+        }
+
+    def run_load(self, port, names, options):
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        lock = threading.Lock()
+
+        def run_user(rng):
+            user = SimulatedUser(port, '')
+            for _ in range(options['requests']):
+                name = rng.choice(names)
+                for step, path, ajax in (
+                    ('search', f"/api/search/?{urlencode({'q': name[:rng.randint(1, 6)]})}", False),
+                    ('suggestions', f"/api/suggestions/?{urlencode({'letter': name[0]})}", False),
+                    ('cart_summary', '/cart/summary/', True),
+                    ('check_username', f"/account/api/check-username/?username=client{rng.randint(1, 10 ** 6)}", False),
+                ):
+                    started = time.perf_counter()
+                    try:
+                        status, _ = user.request('GET', path, ajax=ajax)
+                    except OSError:
+                        status = None
+                    with lock:
+                        latencies[step].append(time.perf_counter() - started)
+                        errors[step] += status != 200
+
+        threads = [
+            threading.Thread(target=run_user, args=(random.Random(options['seed'] + n),))
+            for n in range(options['users'])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        requests = sum(len(samples) for samples in latencies.values())
+        return {
+            'duration': round(elapsed, 3),
+            'requests': requests,
+            'throughput': round(requests / elapsed, 2),
+            'steps': {step: self.summarize(latencies[step], errors[step], elapsed) for step in STEPS},
+        }
+
+    def print_results(self, results):
+        for kind, server in results['servers'].items():
+            self.stdout.write(f"\n== {kind.upper()} ==")
+            super().print_results(server)
+            self.stdout.write(
+                f"mémoire du serveur : {server['rss_idle_mb']} Mo au repos, "
+                f"{server['rss_peak_mb']} Mo au maximum"
+            )
+
+    def print_comparison(self, results, previous):
+        for kind, server in results['servers'].items():
+            before = previous.get('servers', {}).get(kind)
+            if before:
+                self.stdout.write(f"\n== {kind.upper()} ==")
+                super().print_comparison(server, {**before, 'timestamp': previous.get('timestamp')})
+                if before.get('rss_peak_mb') and server['rss_peak_mb']:
+                    self.stdout.write(f"  mémoire maximale {before['rss_peak_mb']} -> {server['rss_peak_mb']} Mo")
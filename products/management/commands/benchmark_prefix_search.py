@@ -0,0 +1,117 @@
+"""
+Benchmark de la recherche par préfixe : ``LIKE`` sur le nom contre intervalle
+sur le nom normalisé.
+
+Crée une base dédiée et un catalogue (un million de produits par défaut), puis
+exécute pour les mêmes préfixes tirés des noms générés les requêtes de la
+recherche instantanée et de la recherche par lettre, dans leur ancienne forme
+(``name__istartswith``, trié par nom) et dans leur forme actuelle (intervalle
+de ``search_name`` parcouru sur son index).
+
+Les latences (p50/p95/p99) de chaque forme et l'accélération obtenue sont
+affichées et enregistrées en JSON pour comparer deux exécutions (--compare).
+"""
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from django.core.management.base import CommandError
+
+from products.models import Product
+from products.seeding import seed_catalog
+from products.text import prefix_range
+from .benchmark_storefront import Command as StorefrontBenchmarkCommand
+
+
+def like_search(query):
+    return Product.objects.filter(name__istartswith=query, available=True).select_related('category')[:10]
+
+
+def range_search(query):
+    low, high = prefix_range(query)
+    return Product.objects.filter(
+        available=True, search_name__gte=low, search_name__lt=high
+    ).select_related('category').order_by('search_name')[:10]
+
+
+def like_letter(letter):
+    return Product.objects.filter(
+        name__istartswith=letter, available=True
+    ).select_related('category').order_by('name')[:20]
+
+
+def range_letter(letter):
+    low, high = prefix_range(letter)
+    return Product.objects.filter(
+        available=True, search_name__gte=low, search_name__lt=high
+    ).select_related('category').order_by('search_name')[:20]
+
+
+STEPS = {
+    'search_like': like_search,
+    'search_range': range_search,
+    'letter_like': like_letter,
+    'letter_range': range_letter,
+}
+
+
+class Command(StorefrontBenchmarkCommand):
+    help = "Benchmark de la recherche par préfixe (LIKE sur le nom contre intervalle sur le nom normalisé)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1_000_000)
+        parser.add_argument('--categories', type=int, default=8)
+        parser.add_argument('--queries', type=int, default=200, help="Préfixes recherchés par forme de requête")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--database', help="Fichier SQLite du benchmark (temporaire par défaut)")
+        parser.add_argument('--output', default='bench_prefix.json', help="Fichier JSON des résultats")
+        parser.add_argument('--compare', help="Résultats JSON d'une exécution précédente à comparer")
+
+    def run_benchmark(self, options):
+        started = time.perf_counter()
+        counts = seed_catalog(
+            categories=options['categories'],
+            products=options['products'],
+            customers=0,
+            orders=0,
+            seed=options['seed'],
+        )
+        self.stdout.write(f"Données générées en {time.perf_counter() - started:.1f}s : {counts}")
+        rng = random.Random(options['seed'])
+        names = list(Product.objects.order_by('?').values_list('name', flat=True)[:options['queries']])
+        if not names:
+            raise CommandError("Le catalogue généré ne contient aucun produit")
+        prefixes = [name[:rng.randint(1, 6)] for name in names]
+        letters = [name[0] for name in names]
+
+        latencies = defaultdict(list)
+        started = time.perf_counter()
+        # Formes alternées à chaque préfixe : même état du cache de pages SQLite
+        for prefix, letter in zip(prefixes, letters):
+            for step, build in STEPS.items():
+                query = build(letter if step.startswith('letter') else prefix)
+                before = time.perf_counter()
+                list(query)
+                latencies[step].append(time.perf_counter() - before)
+        elapsed = time.perf_counter() - started
+
+        steps = {step: self.summarize(latencies[step], 0, sum(latencies[step])) for step in STEPS}
+        requests = sum(stats['count'] for stats in steps.values())
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'options': {k: options[k] for k in ('products', 'categories', 'queries', 'seed')},
+            'duration': round(elapsed, 3),
+            'requests': requests,
+            'throughput': round(requests / elapsed, 2),
+            'steps': steps,
+            'speedup': {
+                kind: round(steps[f'{kind}_like']['p50_ms'] / steps[f'{kind}_range']['p50_ms'], 1)
+                for kind in ('search', 'letter') if steps[f'{kind}_range']['p50_ms']
+            },
+        }
+
+    def print_results(self, results):
+        super().print_results(results)
+        for kind, speedup in results['speedup'].items():
+            self.stdout.write(f"accélération {kind} (p50) : x{speedup}")
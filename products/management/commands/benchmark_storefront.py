@@ -0,0 +1,269 @@
+"""
+Benchmark de charge des parcours de la boutique.
+
+Crée une base de données dédiée, y génère un catalogue et un historique de
+commandes, démarre un serveur WSGI local puis fait parcourir la boutique par
+des utilisateurs simulés concurrents :
+
+    catégorie -> recherche -> fiche produit -> ajout panier -> mise à jour
+    panier -> commande avec paiement à la livraison
+
+Les débits et latences (p50/p95/p99) par étape sont affichés et enregistrés
+en JSON pour comparer deux exécutions (--compare).
+"""
+import http.client
+import json
+import random
+import secrets
+import statistics
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+
+from customers.models import Customer
+from products.models import Category, Product
+from products.seeding import seed_catalog
+
+
+STEPS = ['browse', 'search', 'detail', 'cart_add', 'cart_update', 'order_create']
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class SimulatedUser:
+    """
+    Client HTTP minimal avec sa propre session (cookies conservés en mémoire,
+    y compris les cookies 'secure' que le serveur local envoie en HTTP).
+    """
+
+    def __init__(self, port, session_key):
+        self.port = port
+        self.csrf_token = secrets.token_hex(16)
+        self.cookies = {
+            settings.SESSION_COOKIE_NAME: session_key,
+            settings.CSRF_COOKIE_NAME: self.csrf_token,
+        }
+
+    def request(self, method, path, data=None, ajax=False):
+        headers = {
+            'Host': f'127.0.0.1:{self.port}',
+            'Cookie': '; '.join(f'{k}={v}' for k, v in self.cookies.items()),
+        }
+        body = None
+        if method == 'POST':
+            body = urlencode(data or {})
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            headers['X-CSRFToken'] = self.csrf_token
+        if ajax:
+            headers['X-Requested-With'] = 'XMLHttpRequest'
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            for header, value in response.getheaders():
+                if header.lower() == 'set-cookie':
+                    name, _, rest = value.partition('=')
+                    self.cookies[name] = rest.split(';', 1)[0]
+            return response.status, response.getheader('Location')
+        finally:
+            conn.close()
+
+
+class Command(BaseCommand):
+    help = "Benchmark de charge des parcours de la boutique sur un serveur WSGI local"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=8, help="Utilisateurs simulés concurrents")
+        parser.add_argument('--journeys', type=int, default=10, help="Parcours complets par utilisateur")
+        parser.add_argument('--categories', type=int, default=8)
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--orders', type=int, default=1000, help="Commandes historiques générées")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--database', help="Fichier SQLite du benchmark (temporaire par défaut)")
+        parser.add_argument('--output', default='bench_output.json', help="Fichier JSON des résultats")
+        parser.add_argument('--compare', help="Résultats JSON d'une exécution précédente à comparer")
+
+    def handle(self, *args, **options):
+        # Aucune requête SQL ne doit être conservée en mémoire pendant la mesure
+        settings.DEBUG = False
+        with tempfile.TemporaryDirectory() as tmpdir:
+            if connection.vendor == 'sqlite':
+                database = options['database'] or str(Path(tmpdir) / 'benchmark.sqlite3')
+                connection.settings_dict.setdefault('TEST', {})['NAME'] = database
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                results = self.run_benchmark(options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.print_results(results)
+        Path(options['output']).write_text(json.dumps(results, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Résultats enregistrés dans {options['output']}"))
+        if options['compare']:
+            self.print_comparison(results, json.loads(Path(options['compare']).read_text()))
+
+    def run_benchmark(self, options):
+        started = time.perf_counter()
+        counts = seed_catalog(
+            categories=options['categories'],
+            products=options['products'],
+            customers=options['users'],
+            orders=options['orders'],
+            seed=options['seed'],
+        )
+        self.stdout.write(f"Données générées en {time.perf_counter() - started:.1f}s : {counts}")
+
+        categories = list(Category.objects.values_list('slug', flat=True))
+        products = list(Product.objects.filter(available=True, stock_quantity__gt=0).values_list('id', 'slug', 'name'))
+        if not categories or not products:
+            raise CommandError("Le catalogue généré ne contient aucun produit disponible")
+        # Stock suffisant pour que les commandes du benchmark ne soient jamais refusées
+        Product.objects.update(stock_quantity=100000)
+
+        server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+        server.set_app(get_wsgi_application())
+        port = server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        lock = threading.Lock()
+
+        def record(step, elapsed, ok):
+            with lock:
+                latencies[step].append(elapsed)
+                if not ok:
+                    errors[step] += 1
+
+        users = [
+            SimulatedUser(port, self.login_session(customer.user))
+            for customer in Customer.objects.select_related('user')[:options['users']]
+        ]
+        threads = [
+            threading.Thread(
+                target=self.run_user,
+                args=(user, random.Random(options['seed'] + n), categories, products, options['journeys'], record)
+            )
+            for n, user in enumerate(users)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        server.shutdown()
+        server.server_close()
+
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'options': {k: options[k] for k in ('users', 'journeys', 'categories', 'products', 'orders', 'seed')},
+            'duration': round(elapsed, 3),
+            'requests': sum(len(v) for v in latencies.values()),
+            'throughput': round(sum(len(v) for v in latencies.values()) / elapsed, 2),
+            'steps': {step: self.summarize(latencies[step], errors[step], elapsed) for step in STEPS},
+        }
+
+    def login_session(self, user):
+        """
+        Ouvrir directement une session authentifiée (le parcours de connexion
+        et le hachage du mot de passe ne font pas partie de la mesure).
+        """
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = 'customers.backends.CustomerBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        return session.session_key
+
+    def run_user(self, user, rng, categories, products, journeys, record):
+        def step(name, method, path, data=None, ajax=False, expected=(200,)):
+            started = time.perf_counter()
+            try:
+                status, location = user.request(method, path, data, ajax)
+            except OSError:
+                status, location = None, None
+            record(name, time.perf_counter() - started, status in expected)
+            return location
+
+        for _ in range(journeys):
+            product_id, slug, name = rng.choice(products)
+            step('browse', 'GET', f"/{rng.choice(categories)}/?page={rng.randint(1, 3)}")
+            step('search', 'GET', f"/api/search/?{urlencode({'q': name[:rng.randint(1, 6)]})}")
+            step('detail', 'GET', f"/{product_id}/{slug}/")
+            step('cart_add', 'POST', f"/cart/add/{product_id}/", {'quantity': 1}, expected=(302,))
+            step('cart_update', 'POST', f"/cart/update/{product_id}/", {'quantity': 2}, ajax=True)
+
+            started = time.perf_counter()
+            status, location = user.request('POST', '/orders/create/', {
+                'first_name': 'Client', 'last_name': 'Benchmark', 'email': 'bench@example.com',
+                'address': '1 avenue Mohammed V', 'postal_code': '20000', 'city': 'Casablanca',
+                'phone': '0600000000', 'payment_method': 'cash_on_delivery',
+            })
+            if status == 302 and location:
+                status, _ = user.request('GET', location)
+            record('order_create', time.perf_counter() - started, status == 200)
+
+    def summarize(self, samples, errors, elapsed):
+        if not samples:
+            return {'count': 0, 'errors': errors}
+        ordered = sorted(samples)
+
+        def percentile(p):
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000, 2)
+
+        return {
+            'count': len(samples),
+            'errors': errors,
+            'throughput': round(len(samples) / elapsed, 2),
+            'mean_ms': round(statistics.fmean(samples) * 1000, 2),
+            'p50_ms': percentile(50),
+            'p95_ms': percentile(95),
+            'p99_ms': percentile(99),
+        }
+
+    def print_results(self, results):
+        self.stdout.write(
+            f"\n{results['requests']} requêtes en {results['duration']}s "
+            f"({results['throughput']} req/s)\n"
+        )
+        self.stdout.write(f"{'étape':<14}{'req':>7}{'err':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for step, stats in results['steps'].items():
+            if not stats['count']:
+                continue
+            self.stdout.write(
+                f"{step:<14}{stats['count']:>7}{stats['errors']:>6}{stats['throughput']:>9}"
+                f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}"
+            )
+
+    def print_comparison(self, results, previous):
+        self.stdout.write(f"\nComparaison avec l'exécution du {previous.get('timestamp', '?')} :")
+        for step, stats in results['steps'].items():
+            before = previous.get('steps', {}).get(step)
+            if not before or not before.get('count') or not stats['count']:
+                continue
+            changes = ', '.join(
+                f"{key} {before[key]} -> {stats[key]} ({(stats[key] - before[key]) / before[key] * 100:+.1f}%)"
+                for key in ('p50_ms', 'p95_ms', 'p99_ms') if before[key]
+            )
+            self.stdout.write(f"  {step:<14}{changes}")
+        if previous.get('throughput'):
+            delta = (results['throughput'] - previous['throughput']) / previous['throughput'] * 100
+            self.stdout.write(f"  débit global {previous['throughput']} -> {results['throughput']} req/s ({delta:+.1f}%)")
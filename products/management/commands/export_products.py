@@ -0,0 +1,35 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from products.bulk import FORMATS, export_products
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Exporter le catalogue en CSV ou JSON Lines, en mémoire constante"
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', default='-', help="Fichier de sortie ('-' pour la sortie standard)")
+        parser.add_argument('--format', choices=FORMATS, help="Format (déduit de l'extension par défaut)")
+        parser.add_argument('--category', help="Slug de catégorie à exporter")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        output = options['output']
+        fmt = options['format'] or ('jsonl' if output.endswith('.jsonl') else 'csv')
+        queryset = Product.objects.all()
+        if options['category']:
+            queryset = queryset.filter(category__slug=options['category'])
+
+        stream = sys.stdout if output == '-' else open(output, 'w', encoding='utf-8', newline='')
+        count = -1 if fmt == 'csv' else 0
+        try:
+            for line in export_products(queryset, fmt, chunk_size=options['chunk_size']):
+                stream.write(line)
+                count += 1
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        if output != '-':
+            self.stdout.write(self.style.SUCCESS(f"{count} produit(s) exporté(s) dans {output}"))
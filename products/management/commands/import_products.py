@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.bulk import FORMATS, import_products
+
+
+class Command(BaseCommand):
+    help = "Importer des produits (CSV ou JSON Lines) : mise à jour par slug, création sinon"
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="Fichier à importer ('-' pour l'entrée standard)")
+        parser.add_argument('--format', choices=FORMATS, help="Format (déduit de l'extension par défaut)")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Valider le fichier sans rien enregistrer")
+
+    def handle(self, *args, **options):
+        source = options['input']
+        fmt = options['format'] or ('jsonl' if source.endswith('.jsonl') else 'csv')
+        try:
+            stream = sys.stdin if source == '-' else open(source, encoding='utf-8-sig', newline='')
+        except OSError as e:
+            raise CommandError(f"Impossible d'ouvrir {source} : {e}")
+        try:
+            result = import_products(stream, fmt, batch_size=options['batch_size'], dry_run=options['dry_run'])
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for error in result.errors:
+            self.stderr.write(error)
+        if result.error_count > len(result.errors):
+            self.stderr.write(f"... et {result.error_count - len(result.errors)} autre(s) erreur(s)")
+        prefix = "[simulation] " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{result.created} produit(s) créé(s), {result.updated} mis à jour, "
+            f"{result.error_count} ligne(s) rejetée(s)"
+        ))
@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from products.popularity import rebase_scores
+
+
+class Command(BaseCommand):
+    help = (
+        "Rapprocher l'époque des scores de popularité : divise les scores stockés, "
+        "POPULARITY_EPOCH devant prendre la nouvelle valeur dans le même déploiement"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('epoch', help="Nouvelle époque (AAAA-MM-JJ)")
+
+    def handle(self, *args, **options):
+        try:
+            epoch = datetime.fromisoformat(options['epoch'])
+        except ValueError:
+            raise CommandError(f"Date invalide : {options['epoch']}")
+        if timezone.is_naive(epoch):
+            epoch = timezone.make_aware(epoch, timezone.get_current_timezone())
+        if epoch <= settings.POPULARITY_EPOCH:
+            raise CommandError(f"La nouvelle époque doit suivre POPULARITY_EPOCH ({settings.POPULARITY_EPOCH:%Y-%m-%d})")
+        updated = rebase_scores(epoch)
+        self.stdout.write(self.style.SUCCESS(
+            f"{updated} produit(s) mis à jour. Définir POPULARITY_EPOCH = {epoch!r} avant le redémarrage."
+        ))
@@ -0,0 +1,70 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import is_naive, make_aware
+
+from products.models import Category, PriceCampaign
+from products.pricing import apply_campaign, preview_campaign
+
+
+class Command(BaseCommand):
+    help = "Créer une campagne de réduction (ex. -20 %% sur une catégorie, arrondi à ,90) et l'appliquer"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--percent', required=True, help="Réduction en pourcentage")
+        parser.add_argument('--category', help="Slug de la catégorie (tout le catalogue par défaut)")
+        parser.add_argument('--round', dest='rounding', default='',
+                            choices=[value for value, _ in PriceCampaign.ROUNDING_CHOICES])
+        parser.add_argument('--name', help="Nom de la campagne")
+        parser.add_argument('--no-keep-original', action='store_true',
+                            help="Ne pas conserver le prix actuel comme prix barré")
+        parser.add_argument('--starts', help="Début (AAAA-MM-JJ HH:MM), immédiat par défaut")
+        parser.add_argument('--ends', help="Fin (AAAA-MM-JJ HH:MM) : les prix sont alors rétablis")
+        parser.add_argument('--dry-run', action='store_true', help="Afficher l'aperçu sans rien modifier")
+
+    def parse_date(self, value):
+        if not value:
+            return None
+        date = parse_datetime(value)
+        if date is None:
+            raise CommandError(f"Date invalide : {value}")
+        return make_aware(date) if is_naive(date) else date
+
+    def handle(self, *args, **options):
+        category = None
+        if options['category']:
+            category = Category.objects.filter(slug=options['category']).first()
+            if category is None:
+                raise CommandError(f"Catégorie inconnue : {options['category']}")
+
+        campaign = PriceCampaign(
+            name=options['name'] or f"-{options['percent']}% {category or 'catalogue'}",
+            category=category,
+            percent=options['percent'],
+            rounding=options['rounding'],
+            keep_original_price=not options['no_keep_original'],
+            starts_at=self.parse_date(options['starts']),
+            ends_at=self.parse_date(options['ends']),
+        )
+        try:
+            campaign.full_clean()
+        except ValidationError as e:
+            raise CommandError(' '.join(e.messages))
+
+        stats = preview_campaign(campaign, limit=10)
+        self.stdout.write(
+            f"{stats['count']} produit(s), total {stats['current_total'] or 0} DH -> {stats['new_total'] or 0} DH"
+        )
+        for row in stats['sample']:
+            self.stdout.write(f"  {row['name']} : {row['price']} -> {row['new_price']}")
+        if options['dry_run']:
+            return
+
+        campaign.save()
+        if campaign.is_due:
+            campaign = apply_campaign(campaign)
+            self.stdout.write(self.style.SUCCESS(f"Campagne appliquée à {campaign.products_count} produit(s)."))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Campagne programmée pour le {campaign.starts_at:%d/%m/%Y %H:%M} (commande apply_price_campaigns)."
+            ))
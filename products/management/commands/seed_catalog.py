@@ -0,0 +1,48 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.seeding import SEED_PASSWORD, seed_catalog
+
+
+class Command(BaseCommand):
+    help = "Générer un catalogue, des clients et un historique de commandes synthétiques"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=12)
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--customers', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=20000)
+        parser.add_argument('--days', type=int, default=365, help="Période couverte par l'historique de commandes")
+        parser.add_argument('--seed', type=int, default=42, help="Graine : mêmes options, mêmes données")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Processus générant les lignes en parallèle")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        last_report = [started]
+
+        def progress(kind, done, total):
+            now = time.perf_counter()
+            if done == total or now - last_report[0] > 5:
+                last_report[0] = now
+                self.stdout.write(f"  {kind} : {done}/{total} ({done / (now - started):.0f} lignes/s)")
+
+        counts = seed_catalog(
+            categories=options['categories'],
+            products=options['products'],
+            customers=options['customers'],
+            orders=options['orders'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            days=options['days'],
+            progress=progress,
+        )
+        elapsed = time.perf_counter() - started
+        summary = ', '.join(f"{count} {kind}" for kind, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Créé en {elapsed:.1f}s : {summary}"))
+        if counts['customers']:
+            self.stdout.write(f"Mot de passe des clients générés : {SEED_PASSWORD}")
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_original_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceCampaign',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('percent', models.DecimalField(decimal_places=2, help_text='Réduction en pourcentage', max_digits=5)),
+                ('rounding', models.CharField(blank=True, choices=[('', 'Au centime'), ('0.90', 'Terminé par ,90'), ('0.99', 'Terminé par ,99'), ('1.00', 'Dirham entier')], default='', max_length=4)),
+                ('keep_original_price', models.BooleanField(default=True, help_text='Conserver le prix actuel comme prix original (prix barré)')),
+                ('starts_at', models.DateTimeField(blank=True, help_text='Laissez vide pour appliquer immédiatement', null=True)),
+                ('ends_at', models.DateTimeField(blank=True, help_text='Les prix sont rétablis à cette date', null=True)),
+                ('status', models.CharField(choices=[('scheduled', 'Programmée'), ('active', 'En cours'), ('ended', 'Terminée')], default='scheduled', max_length=20)),
+                ('products_count', models.PositiveIntegerField(default=0)),
+                ('applied_at', models.DateTimeField(blank=True, null=True)),
+                ('ended_at', models.DateTimeField(blank=True, null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('category', models.ForeignKey(blank=True, help_text='Laissez vide pour tout le catalogue', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='price_campaigns', to='products.category')),
+            ],
+            options={
+                'ordering': ('-created',),
+            },
+        ),
+        migrations.CreateModel(
+            name='PriceCampaignItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('old_original_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('new_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='products.pricecampaign')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_campaign_items', to='products.product')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pricecampaign',
+            index=models.Index(fields=['status', 'starts_at'], name='products_pr_status_2c09ff_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pricecampaign',
+            index=models.Index(fields=['status', 'ends_at'], name='products_pr_status_5c086f_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='pricecampaignitem',
+            constraint=models.UniqueConstraint(fields=('campaign', 'product'), name='unique_price_campaign_product'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:56
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+import django.db.models.functions.math
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_price_campaigns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='discount_amount',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(original_price__gt=models.F('price'), then=django.db.models.expressions.CombinedExpression(models.F('original_price'), '-', models.F('price'))), default=models.Value(Decimal('0.00')), output_field=models.DecimalField(decimal_places=2, max_digits=10)), output_field=models.DecimalField(decimal_places=2, max_digits=10)),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='discount_percent',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(original_price__gt=models.F('price'), then=django.db.models.functions.comparison.Cast(django.db.models.functions.math.Round(models.ExpressionWrapper(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(django.db.models.expressions.CombinedExpression(models.F('original_price'), '-', models.F('price')), models.FloatField()), '*', models.Value(100)), '/', models.F('original_price')), output_field=models.FloatField())), models.IntegerField())), default=models.Value(0), output_field=models.IntegerField()), output_field=models.IntegerField()),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['available', '-discount_percent'], name='product_available_discount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['available', '-discount_amount'], name='product_available_saving_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:54
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+# Copie de products.text.normalize à la date de la migration : ses évolutions
+# ne doivent pas modifier l'historique
+def normalized_name(name):
+    decomposed = unicodedata.normalize('NFKD', name)
+    unaccented = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return re.sub(r'\s+', ' ', unaccented.casefold()).strip()[:200]
+
+
+def fill_search_names(apps, schema_editor):
+    """
+    Nom normalisé des produits existants, par lots
+    """
+    Product = apps.get_model('products', 'Product')
+    batch = []
+    for product in Product.objects.order_by('pk').only('pk', 'name').iterator(chunk_size=1000):
+        product.search_name = normalized_name(product.name)
+        batch.append(product)
+        if len(batch) == 1000:
+            Product.objects.bulk_update(batch, ['search_name'])
+            batch = []
+    Product.objects.bulk_update(batch, ['search_name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_name',
+            field=models.CharField(default='', editable=False, max_length=200),
+        ),
+        migrations.RunPython(fill_search_names, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['search_name'], name='product_search_name_idx'),
+        ),
+    ]
@@ -1,5 +1,13 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import Case, ExpressionWrapper, F, Value, When
+from django.db.models.functions import Cast, Round
 from django.urls import reverse
+from django.utils import timezone
+
+from .text import normalize
 
 
 class Category(models.Model):
@@ -18,9 +26,16 @@ class Category(models.Model):
         return reverse('products:product_list_by_category', args=[self.slug])
 
 
+def normalized_name(name):
+    """Nom sans accents, casse ni espaces superflus (recherche par préfixe)"""
+    return normalize(name)[:200]
+
+
 class Product(models.Model):
     category = models.ForeignKey(Category, related_name='products', on_delete=models.CASCADE)
     name = models.CharField(max_length=200, db_index=True)
+    # Tenu à jour à l'enregistrement et par les imports (normalized_name)
+    search_name = models.CharField(max_length=200, default='', editable=False)
     slug = models.SlugField(max_length=200, db_index=True)
     image = models.ImageField(upload_to='products/%Y/%m/%d', blank=True)
     description = models.TextField(blank=True)
@@ -28,18 +43,82 @@ class Product(models.Model):
     original_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, help_text="Prix original avant réduction")
     available = models.BooleanField(default=True)
     stock_quantity = models.PositiveIntegerField(default=0, help_text="Quantité en stock")
+    # Réduction calculée et stockée par la base à chaque écriture du prix :
+    # filtres et tris "en promotion" directement en SQL
+    discount_amount = models.GeneratedField(
+        expression=Case(
+            When(original_price__gt=F('price'), then=F('original_price') - F('price')),
+            default=Value(Decimal('0.00')),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        ),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+    )
+    discount_percent = models.GeneratedField(
+        expression=Case(
+            When(
+                original_price__gt=F('price'),
+                # En flottant : SQLite stocke les prix ronds en entiers (division entière sinon)
+                then=Cast(Round(ExpressionWrapper(
+                    Cast(F('original_price') - F('price'), models.FloatField()) * 100 / F('original_price'),
+                    output_field=models.FloatField(),
+                )), models.IntegerField()),
+            ),
+            default=Value(0),
+            output_field=models.IntegerField(),
+        ),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
+    # Vues et ventes avec décroissance exponentielle (voir products/popularity.py)
+    view_count = models.PositiveIntegerField(default=0, editable=False)
+    popularity = models.FloatField(default=0, editable=False)
+    sales_score = models.FloatField(default=0, editable=False)
+
+    # Écrits uniquement par incréments, jamais avec la valeur chargée avec le produit
+    COUNTER_FIELDS = ('view_count', 'popularity', 'sales_score')
+    # Écrit uniquement par le journal de stock (inventory/ledger.py), après la création
+    LEDGER_FIELDS = ('stock_quantity',)
 
     class Meta:
         ordering = ('name',)
         indexes = [
             models.Index(fields=['id', 'slug']),
+            models.Index(fields=['available', '-discount_percent'], name='product_available_discount_idx'),
+            models.Index(fields=['available', '-discount_amount'], name='product_available_saving_idx'),
+            # Tris "Populaires" et "Meilleures ventes", avec ou sans le filtre de disponibilité
+            models.Index(fields=['-popularity'], name='product_popularity_idx'),
+            models.Index(fields=['-sales_score'], name='product_sales_score_idx'),
+            # Recherche par préfixe : intervalle de search_name parcouru dans l'ordre de l'index,
+            # jusqu'au nombre de produits disponibles demandé
+            models.Index(fields=['search_name'], name='product_search_name_idx'),
         ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.search_name = normalized_name(self.name)
+        if not self._state.adding:
+            # Les vues comptées et les ventes enregistrées entre le chargement et
+            # l'enregistrement ne sont pas écrasées
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and not field.generated
+                ]
+            update_fields = [
+                name for name in update_fields
+                if name not in self.COUNTER_FIELDS and name not in self.LEDGER_FIELDS
+            ]
+            if 'name' in update_fields and 'search_name' not in update_fields:
+                update_fields.append('search_name')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('products:product_detail', args=[self.id, self.slug])
     
@@ -60,8 +139,85 @@ class Product(models.Model):
     
     @property
     def discount_percentage(self):
-        """Calcule le pourcentage de réduction"""
+        """Calcule le pourcentage de réduction (arrondi comme discount_percent en SQL)"""
         if self.has_discount:
-            return round(((self.original_price - self.price) / self.original_price) * 100)
+            percent = (self.original_price - self.price) / self.original_price * 100
+            return int(percent.quantize(Decimal('1'), rounding=ROUND_HALF_UP))
         return 0
 
+
+
+class PriceCampaign(models.Model):
+    """
+    Campagne de réduction appliquée en masse aux prix d'une catégorie
+    (ou de tout le catalogue), éventuellement programmée.
+    """
+    STATUS_SCHEDULED = 'scheduled'
+    STATUS_ACTIVE = 'active'
+    STATUS_ENDED = 'ended'
+    STATUS_CHOICES = [
+        (STATUS_SCHEDULED, 'Programmée'),
+        (STATUS_ACTIVE, 'En cours'),
+        (STATUS_ENDED, 'Terminée'),
+    ]
+
+    ROUNDING_CHOICES = [
+        ('', 'Au centime'),
+        ('0.90', 'Terminé par ,90'),
+        ('0.99', 'Terminé par ,99'),
+        ('1.00', 'Dirham entier'),
+    ]
+
+    name = models.CharField(max_length=200)
+    category = models.ForeignKey(Category, related_name='price_campaigns', on_delete=models.CASCADE,
+                                 null=True, blank=True, help_text="Laissez vide pour tout le catalogue")
+    percent = models.DecimalField(max_digits=5, decimal_places=2, help_text="Réduction en pourcentage")
+    rounding = models.CharField(max_length=4, choices=ROUNDING_CHOICES, blank=True, default='')
+    keep_original_price = models.BooleanField(default=True, help_text="Conserver le prix actuel comme prix original (prix barré)")
+    starts_at = models.DateTimeField(null=True, blank=True, help_text="Laissez vide pour appliquer immédiatement")
+    ends_at = models.DateTimeField(null=True, blank=True, help_text="Les prix sont rétablis à cette date")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_SCHEDULED)
+    products_count = models.PositiveIntegerField(default=0)
+    applied_at = models.DateTimeField(null=True, blank=True)
+    ended_at = models.DateTimeField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('-created',)
+        indexes = [
+            models.Index(fields=['status', 'starts_at']),
+            models.Index(fields=['status', 'ends_at']),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        if self.percent is not None and not 0 < self.percent < 100:
+            raise ValidationError({'percent': "La réduction doit être comprise entre 0 et 100 %."})
+        if self.starts_at and self.ends_at and self.ends_at <= self.starts_at:
+            raise ValidationError({'ends_at': "La fin doit être postérieure au début."})
+
+    @property
+    def is_due(self):
+        """Vérifie si une campagne programmée doit démarrer"""
+        return self.status == self.STATUS_SCHEDULED and (self.starts_at is None or self.starts_at <= timezone.now())
+
+
+class PriceCampaignItem(models.Model):
+    """
+    Prix d'un produit avant l'application d'une campagne, pour pouvoir les rétablir
+    """
+    campaign = models.ForeignKey(PriceCampaign, related_name='items', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name='price_campaign_items', on_delete=models.CASCADE)
+    old_price = models.DecimalField(max_digits=10, decimal_places=2)
+    old_original_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    new_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['campaign', 'product'], name='unique_price_campaign_product'),
+        ]
+
+    def __str__(self):
+        return f'{self.campaign} - {self.product_id}'
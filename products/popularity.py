@@ -0,0 +1,106 @@
+"""
+Popularité des produits : vues et ventes avec décroissance exponentielle.
+
+Les scores utilisent une décroissance « vers l'avant » : un événement à la
+date t compte pour 2^((t - POPULARITY_EPOCH) / demi-vie). Tous les scores
+seraient multipliés par le même facteur en décroissant : le classement est
+celui d'une décroissance de chaque événement depuis sa date, sans jamais
+réécrire les scores. Un score se met donc à jour par simple incrément. Les
+poids grandissent sans limite : ``rebase_popularity`` rapproche l'époque et
+divise les scores d'autant (dans le même déploiement que le changement de
+``POPULARITY_EPOCH``) ; à défaut, l'exposant est plafonné à
+``MAX_EXPONENT`` demi-vies (environ 18 ans pour une demi-vie de 7 jours), en
+deçà de la limite des flottants (2^1023), et les événements suivants comptent
+tous autant.
+
+Les vues des fiches produits ne sont pas écrites pendant la requête : elles
+sont cumulées par produit dans le processus, un clic sur un résultat de
+recherche comptant ``POPULARITY_SEARCH_CLICK_WEIGHT`` vues, et ajoutées par
+lots (un ``UPDATE ... CASE`` par lot) après l'envoi d'une réponse, dès que
+``POPULARITY_BATCH_SIZE`` produits sont en attente ou que la plus ancienne vue
+a ``POPULARITY_FLUSH_INTERVAL`` secondes (``parfumerie.buffers``).
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Case, F, FloatField, IntegerField, Value, When
+from django.utils import timezone
+
+from parfumerie.buffers import WriteBuffer
+from .models import Product
+
+
+# Marge sous 2^1023 pour les sommes de poids stockées dans les scores
+MAX_EXPONENT = 960
+
+
+def decay_weight(at, half_life):
+    """Poids d'un événement à la date ``at``"""
+    return 2 ** min((at - settings.POPULARITY_EPOCH) / half_life, MAX_EXPONENT)
+
+
+def rebase_scores(epoch):
+    """
+    Exprimer les scores stockés par rapport à l'époque ``epoch`` au lieu de
+    ``POPULARITY_EPOCH`` ; retourne le nombre de produits mis à jour
+    """
+    view_buffer.flush()
+    shift = epoch - settings.POPULARITY_EPOCH
+    return Product.objects.update(
+        # 2^-x ne déborde pas : les scores trop anciens tombent à 0
+        popularity=F('popularity') * Value(2 ** -(shift / settings.POPULARITY_HALF_LIFE)),
+        sales_score=F('sales_score') * Value(2 ** -(shift / settings.SALES_HALF_LIFE)),
+    )
+
+
+def add_scores(field, scores, views=None):
+    """
+    Ajouter ``scores`` (id du produit : score) au champ ``field`` des produits,
+    et ``views`` au nombre de vues, par lots de ``POPULARITY_BATCH_SIZE``
+    """
+    product_ids = sorted(scores)
+    batch_size = settings.POPULARITY_BATCH_SIZE
+    for start in range(0, len(product_ids), batch_size):
+        batch = product_ids[start:start + batch_size]
+        values = {field: F(field) + Case(
+            *[When(pk=product_id, then=Value(scores[product_id])) for product_id in batch],
+            default=Value(0.0), output_field=FloatField(),
+        )}
+        if views:
+            values['view_count'] = F('view_count') + Case(
+                *[When(pk=product_id, then=Value(views[product_id])) for product_id in batch],
+                default=Value(0), output_field=IntegerField(),
+            )
+        Product.objects.filter(pk__in=batch).update(**values)
+
+
+class ViewBuffer(WriteBuffer):
+    """Vues des fiches produits à écrire : id du produit : [vues, score]"""
+    batch_size_setting = 'POPULARITY_BATCH_SIZE'
+    flush_interval_setting = 'POPULARITY_FLUSH_INTERVAL'
+
+    def empty(self):
+        return defaultdict(lambda: [0, 0.0])
+
+    def add(self, product_id, weight=1, at=None):
+        score = weight * decay_weight(at or timezone.now(), settings.POPULARITY_HALF_LIFE)
+        with self.adding() as pending:
+            pending[product_id][0] += 1
+            pending[product_id][1] += score
+
+    def write(self, pending):
+        views = {product_id: count for product_id, (count, _) in pending.items()}
+        add_scores('popularity', {product_id: score for product_id, (_, score) in pending.items()}, views)
+        return sum(views.values())
+
+
+view_buffer = ViewBuffer()
+
+
+def record_sales(lines, at):
+    """Ajouter les ventes ``lines`` ((id du produit, quantité)) à la date ``at``"""
+    weight = decay_weight(at, settings.SALES_HALF_LIFE)
+    scores = defaultdict(float)
+    for product_id, units in lines:
+        scores[product_id] += units * weight
+    add_scores('sales_score', scores)
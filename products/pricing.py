@@ -0,0 +1,171 @@
+"""
+Campagnes de réduction appliquées en masse.
+
+Le nouveau prix est une expression SQL (``F('price')`` multiplié par le taux
+puis arrondi) : l'aperçu l'évalue sur toutes les lignes concernées avec
+``annotate``/``aggregate``, et l'application est un seul ``UPDATE`` sur le
+catalogue, sans charger les produits. Les anciens prix sont conservés dans
+``PriceCampaignItem`` pour être rétablis en fin de campagne, également en un
+seul ``UPDATE``.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import (
+    Case, Count, DecimalField, ExpressionWrapper, F, Min, OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce, Floor, Round
+from django.utils import timezone
+
+from .models import PriceCampaign, PriceCampaignItem, Product
+from .signals import catalog_changed
+
+
+PRICE_FIELD = DecimalField(max_digits=10, decimal_places=2)
+CENT = Decimal('0.01')
+SNAPSHOT_BATCH_SIZE = 2000
+
+
+def new_price_expression(percent, rounding=''):
+    """
+    Expression SQL du prix après réduction de ``percent`` %.
+    Avec un arrondi ('0.90', '0.99', '1.00'), le prix est le plus grand prix
+    inférieur ou égal au prix réduit qui se termine par ces centimes.
+    """
+    rate = (Decimal(100) - Decimal(percent)) / Decimal(100)
+    discounted = ExpressionWrapper(F('price') * Value(rate), output_field=PRICE_FIELD)
+    if not rounding:
+        return Round(discounted, 2, output_field=PRICE_FIELD)
+    ending = Value(Decimal(rounding), output_field=PRICE_FIELD)
+    rounded = ExpressionWrapper(Floor(discounted - ending) + ending, output_field=PRICE_FIELD)
+    # Les prix trop bas pour l'arrondi gardent le prix réduit au centime
+    return Case(
+        When(Q(price__gte=Value(Decimal(rounding) / rate)), then=Round(rounded, 2, output_field=PRICE_FIELD)),
+        default=Round(discounted, 2, output_field=PRICE_FIELD),
+        output_field=PRICE_FIELD,
+    )
+
+
+def campaign_products(campaign):
+    """
+    Produits concernés par une campagne : ceux de sa catégorie (ou tout le
+    catalogue), hors produits déjà dans une autre campagne en cours
+    """
+    products = Product.objects.all()
+    if campaign.category_id:
+        products = products.filter(category_id=campaign.category_id)
+    return products.exclude(price_campaign_items__campaign__status=PriceCampaign.STATUS_ACTIVE)
+
+
+def preview_campaign(campaign, limit=20):
+    """
+    Simuler une campagne sans rien modifier : statistiques calculées par la
+    base sur toutes les lignes concernées et échantillon des plus gros écarts
+    """
+    products = campaign_products(campaign).annotate(new_price=new_price_expression(campaign.percent, campaign.rounding))
+    stats = products.aggregate(
+        count=Count('id'),
+        current_total=Sum('price'),
+        new_total=Sum('new_price'),
+        lowest_price=Min('new_price'),
+    )
+    stats['sample'] = list(
+        products.order_by('-price', 'id').values('id', 'name', 'price', 'original_price', 'new_price')[:limit]
+    )
+    # SQLite renvoie les résultats des calculs sans les ramener à deux décimales
+    for values in [stats, *stats['sample']]:
+        for key in ('current_total', 'new_total', 'lowest_price', 'new_price'):
+            if values.get(key) is not None:
+                values[key] = values[key].quantize(CENT)
+    return stats
+
+
+def apply_campaign(campaign, now=None):
+    """
+    Appliquer une campagne programmée : sauvegarde des prix actuels puis un seul UPDATE
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        campaign = PriceCampaign.objects.select_for_update().get(pk=campaign.pk)
+        if campaign.status != PriceCampaign.STATUS_SCHEDULED:
+            return campaign
+
+        expression = new_price_expression(campaign.percent, campaign.rounding)
+        rows = campaign_products(campaign).annotate(new_price=expression).order_by('id').values_list(
+            'id', 'price', 'original_price', 'new_price'
+        ).iterator(chunk_size=SNAPSHOT_BATCH_SIZE)
+        batch = []
+        for product_id, price, original_price, new_price in rows:
+            batch.append(PriceCampaignItem(
+                campaign=campaign, product_id=product_id, old_price=price,
+                old_original_price=original_price, new_price=new_price.quantize(CENT),
+            ))
+            if len(batch) >= SNAPSHOT_BATCH_SIZE:
+                PriceCampaignItem.objects.bulk_create(batch)
+                batch = []
+        PriceCampaignItem.objects.bulk_create(batch)
+
+        values = {}
+        if campaign.keep_original_price:
+            # Avant 'price' : MySQL évalue les affectations dans l'ordre, avec les valeurs déjà modifiées
+            values['original_price'] = Coalesce(F('original_price'), F('price'))
+        values['price'] = expression
+        values['updated'] = now
+        campaign.products_count = Product.objects.filter(price_campaign_items__campaign=campaign).update(**values)
+
+        campaign.status = PriceCampaign.STATUS_ACTIVE
+        campaign.applied_at = now
+        campaign.save(update_fields=['status', 'applied_at', 'products_count'])
+        catalog_changed.send(sender=PriceCampaign, campaign=campaign)
+    return campaign
+
+
+def revert_campaign(campaign, now=None):
+    """
+    Terminer une campagne en rétablissant les prix sauvegardés, en un seul UPDATE.
+    Les produits dont le prix a été modifié entre-temps gardent leur nouveau prix.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        campaign = PriceCampaign.objects.select_for_update().get(pk=campaign.pk)
+        if campaign.status == PriceCampaign.STATUS_ENDED:
+            return campaign
+
+        if campaign.status == PriceCampaign.STATUS_ACTIVE:
+            items = PriceCampaignItem.objects.filter(campaign=campaign, product=OuterRef('pk'))
+            Product.objects.filter(
+                price_campaign_items__campaign=campaign,
+                price_campaign_items__new_price=F('price'),
+            ).update(
+                price=Subquery(items.values('old_price')[:1]),
+                original_price=Subquery(items.values('old_original_price')[:1]),
+                updated=now,
+            )
+            campaign.items.all().delete()
+            catalog_changed.send(sender=PriceCampaign, campaign=campaign)
+
+        campaign.status = PriceCampaign.STATUS_ENDED
+        campaign.ended_at = now
+        campaign.save(update_fields=['status', 'ended_at'])
+    return campaign
+
+
+def run_scheduled_campaigns(now=None):
+    """
+    Terminer les campagnes arrivées à échéance puis démarrer celles dont
+    l'heure est venue. Retourne (démarrées, terminées).
+    """
+    now = now or timezone.now()
+    ended = [
+        revert_campaign(campaign, now)
+        for campaign in PriceCampaign.objects.filter(
+            status__in=[PriceCampaign.STATUS_ACTIVE, PriceCampaign.STATUS_SCHEDULED], ends_at__lte=now
+        ).order_by('ends_at')
+    ]
+    started = [
+        apply_campaign(campaign, now)
+        for campaign in PriceCampaign.objects.filter(
+            Q(starts_at__isnull=True) | Q(starts_at__lte=now), status=PriceCampaign.STATUS_SCHEDULED
+        ).order_by('starts_at', 'id')
+    ]
+    return started, ended
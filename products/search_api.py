@@ -1,71 +1,100 @@
+from django.core.cache import cache
 from django.http import JsonResponse
-from django.db.models import Q
+from .cache import CATALOG_CACHE_TIMEOUT, acatalog_cache_key
+from .fuzzy import afuzzy_search
 from .models import Product
+from .text import prefix_range
+from analytics.models import SearchLog
+from analytics.search import search_log
+import hashlib
 import json
+import time
 
 
-def search_products_api(request):
+# Vues asynchrones : servies en ASGI, une requête d'autocomplétion n'occupe
+# pas de thread pendant qu'elle attend le cache ou la base de données
+
+
+def product_json(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'slug': product.slug,
+        'price': str(product.price),
+        'category': product.category.name,
+        'image_url': product.image.url if product.image else None,
+        # Clic compté comme vue depuis la recherche (popularité)
+        'url': f'{product.get_absolute_url()}?from=search'
+    }
+
+
+async def search_products_api(request):
     """
     API pour la recherche intelligente de produits
     Retourne les produits qui commencent par la lettre ou le texte saisi
     """
+    started = time.perf_counter()
     if request.method == 'GET':
         query = request.GET.get('q', '').strip()
-        
-        if not query:
+        bounds = prefix_range(query)
+
+        if not bounds:
             return JsonResponse({'products': []})
-        
-        # Rechercher les produits qui commencent par la requête
-        products = Product.objects.filter(
-            Q(name__istartswith=query) & Q(available=True)
-        ).select_related('category')[:10]  # Limiter à 10 résultats
-        
-        # Formater les résultats
-        results = []
-        for product in products:
-            results.append({
-                'id': product.id,
-                'name': product.name,
-                'slug': product.slug,
-                'price': str(product.price),
-                'category': product.category.name,
-                'image_url': product.image.url if product.image else None,
-                'url': product.get_absolute_url()
-            })
-        
+
+        # Les mêmes préfixes reviennent sans cesse pendant la saisie : résultats
+        # mis en cache jusqu'à la prochaine modification du catalogue
+        key = await acatalog_cache_key('search', hashlib.md5(bounds[0].encode()).hexdigest())
+        results = await cache.aget(key)
+        if results is None:
+            # Rechercher les produits qui commencent par la requête, sans
+            # accents ni casse : intervalle du nom normalisé parcouru sur l'index
+            products = Product.objects.filter(
+                available=True, search_name__gte=bounds[0], search_name__lt=bounds[1]
+            ).select_related('category').order_by('search_name')[:10]  # Limiter à 10 résultats
+
+            # Formater les résultats
+            results = [product_json(product) async for product in products]
+            if not results:
+                # Aucun nom ne commence par la requête : faute de frappe probable
+                product_ids = await afuzzy_search(query)
+                found = {
+                    product.id: product
+                    async for product in Product.objects.filter(pk__in=product_ids, available=True).select_related('category')
+                }
+                results = [product_json(found[pk]) for pk in product_ids if pk in found][:10]
+            await cache.aset(key, results, CATALOG_CACHE_TIMEOUT)
+
+        # Journalisée en mémoire, écrite par lots après la réponse
+        search_log.add(SearchLog.SEARCH, query, len(results), started)
         return JsonResponse({'products': results})
-    
+
     return JsonResponse({'error': 'Méthode non autorisée'}, status=405)
 
 
-def get_product_suggestions(request):
+async def get_product_suggestions(request):
     """
     API pour obtenir des suggestions de produits basées sur les premières lettres
     """
+    started = time.perf_counter()
     if request.method == 'GET':
         letter = request.GET.get('letter', '').strip().upper()
-        
-        if not letter or len(letter) != 1:
+        bounds = prefix_range(letter) if len(letter) == 1 else None
+
+        if not bounds:
             return JsonResponse({'suggestions': []})
-        
-        # Obtenir tous les produits qui commencent par cette lettre
-        products = Product.objects.filter(
-            Q(name__istartswith=letter) & Q(available=True)
-        ).select_related('category').order_by('name')[:20]
-        
-        suggestions = []
-        for product in products:
-            suggestions.append({
-                'id': product.id,
-                'name': product.name,
-                'slug': product.slug,
-                'price': str(product.price),
-                'category': product.category.name,
-                'image_url': product.image.url if product.image else None,
-                'url': product.get_absolute_url()
-            })
-        
+
+        key = await acatalog_cache_key('suggestions', hashlib.md5(bounds[0].encode()).hexdigest())
+        suggestions = await cache.aget(key)
+        if suggestions is None:
+            # Obtenir tous les produits qui commencent par cette lettre (« e » : « Éclat » compris)
+            products = Product.objects.filter(
+                available=True, search_name__gte=bounds[0], search_name__lt=bounds[1]
+            ).select_related('category').order_by('search_name')[:20]
+
+            suggestions = [product_json(product) async for product in products]
+            await cache.aset(key, suggestions, CATALOG_CACHE_TIMEOUT)
+
+        search_log.add(SearchLog.SUGGESTIONS, letter, len(suggestions), started)
         return JsonResponse({'suggestions': suggestions})
-    
-    return JsonResponse({'error': 'Méthode non autorisée'}, status=405)
 
+    return JsonResponse({'error': 'Méthode non autorisée'}, status=405)
@@ -0,0 +1,326 @@
+"""
+Génération de données synthétiques (catalogue, clients, commandes) pour les
+benchmarks et les tests à grande échelle.
+
+Les lignes sont générées par blocs de ``GENERATION_BLOCK`` lignes dans des
+processus séparés : chaque bloc possède son propre générateur aléatoire
+dérivé de ``seed`` et de sa position, le résultat est donc identique quel que
+soit le nombre de processus ou la taille des lots d'insertion. Le processus
+principal insère les blocs dans l'ordre avec ``bulk_create`` (SQLite
+n'accepte qu'un seul écrivain à la fois).
+"""
+import math
+import random
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.text import slugify
+
+from analytics.rollups import backfill as backfill_sales
+from customers.models import Customer
+from inventory.models import StockSnapshot
+from orders.models import Order, OrderItem
+from .models import Category, Product, normalized_name
+
+
+SEED_PASSWORD = 'parfumerie-seed-2025'
+
+# Lignes par bloc généré (et par transaction), fixe pour que les données
+# générées ne dépendent pas de batch_size
+GENERATION_BLOCK = 5000
+
+# Marques par ordre de popularité : la distribution des préfixes de noms
+# suit une loi de Zipf, comme dans un vrai catalogue.
+BRANDS = [
+    'Chanel', 'Dior', 'Yves Saint Laurent', 'Lattafa', 'Guerlain', 'Hermès',
+    'Chloé', 'Lancôme', 'Givenchy', 'Armani', 'Versace', 'Paco Rabanne',
+    'Rasasi', 'Ajmal', 'Montblanc', 'Boucheron', 'Cacharel', 'Kenzo',
+    'Carolina Herrera', 'Jean Paul Gaultier', 'Azzaro', 'Nina Ricci',
+    'Mugler', 'Issey Miyake', 'Hugo Boss', 'Calvin Klein', 'Bvlgari',
+    'Cartier', 'Tom Ford', 'Creed', 'Amouage', 'Maison Francis Kurkdjian',
+]
+LINES = [
+    'Éclat', 'Nuit', 'Oud', 'Ambre', 'Musc', 'Rose', 'Vétiver', 'Iris',
+    'Santal', 'Jasmin', 'Cuir', 'Néroli', 'Vanille', 'Bois', 'Fleur', 'Intense',
+    'Absolu', 'Élixir', 'Sauvage', 'Mystère', 'Lumière', 'Secret', 'Royal', 'Noir',
+]
+CONCENTRATIONS = ['Eau de Parfum', 'Eau de Toilette', 'Parfum', 'Extrait', 'Eau de Cologne']
+CONCENTRATION_WEIGHTS = [50, 30, 10, 5, 5]
+SIZES = [30, 50, 75, 100, 125, 200]
+SIZE_WEIGHTS = [10, 25, 10, 40, 5, 10]
+DISCOUNT_RATES = [10, 15, 20, 25, 30, 40, 50]
+DISCOUNT_WEIGHTS = [25, 20, 25, 10, 10, 6, 4]
+CATEGORY_NAMES = [
+    'Femmes parfums', 'Homme parfums', 'Unisexe', 'Coffrets', 'Orientaux',
+    'Eaux de Cologne', 'Musc', 'Oud', 'Floraux', 'Boisés', 'Gourmands', 'Agrumes',
+]
+FIRST_NAMES = [
+    'Yasmine', 'Omar', 'Salma', 'Youssef', 'Imane', 'Mehdi', 'Khadija', 'Hamza',
+    'Sara', 'Adam', 'Nadia', 'Karim', 'Leïla', 'Amine', 'Hajar', 'Anas',
+]
+LAST_NAMES = [
+    'Alaoui', 'Benali', 'El Idrissi', 'Tazi', 'Bennani', 'Chraibi', 'Fassi',
+    'Amrani', 'Berrada', 'Lahlou', 'Sefrioui', 'Naciri', 'Ouazzani', 'Kettani',
+]
+CITIES = ['Casablanca', 'Rabat', 'Marrakech', 'Fès', 'Tanger', 'Agadir', 'Oujda', 'Meknès']
+CITY_WEIGHTS = [35, 15, 12, 10, 10, 8, 5, 5]
+
+_BRAND_WEIGHTS = [1 / rank for rank in range(1, len(BRANDS) + 1)]
+
+
+def skewed_index(rng, count, skew=3):
+    """
+    Index dans ``[0, count)`` favorisant les premiers éléments (quelques
+    best-sellers, une longue traîne).
+    """
+    return min(int(count * rng.random() ** skew), count - 1)
+
+
+def customer_identity(user_id):
+    """Identité déterministe du client généré pour l'utilisateur ``user_id``"""
+    first_name = FIRST_NAMES[user_id % len(FIRST_NAMES)]
+    last_name = LAST_NAMES[(user_id // len(FIRST_NAMES)) % len(LAST_NAMES)]
+    return first_name, last_name, f"client{user_id}@example.com"
+
+
+# Générateurs de lignes, exécutés dans les processus de travail.
+# Ils ne touchent pas à l'ORM et ne retournent que des tuples.
+
+def _product_rows(seed, start, stop, category_count):
+    rng = random.Random(f"{seed}:products:{start}")
+    rows = []
+    for index in range(start, stop):
+        brand = rng.choices(BRANDS, _BRAND_WEIGHTS)[0]
+        size = rng.choices(SIZES, SIZE_WEIGHTS)[0]
+        name = (
+            f"{brand} {rng.choice(LINES)} "
+            f"{rng.choices(CONCENTRATIONS, CONCENTRATION_WEIGHTS)[0]} {size}ml"
+        )
+        # Prix log-normal (médiane ~450 DH), arrondi à ,00 ou ,90
+        price = min(max(int(rng.lognormvariate(math.log(450), 0.6)), 49), 9000)
+        price_cents = price * 100 + (90 if rng.random() < 0.6 else 0)
+        original_cents = None
+        if rng.random() < 0.2:
+            rate = rng.choices(DISCOUNT_RATES, DISCOUNT_WEIGHTS)[0]
+            original_cents = int(round(price_cents / (1 - rate / 100), -2))
+        if rng.random() < 0.08:
+            stock = 0
+        elif rng.random() < 0.05:
+            stock = rng.randrange(500, 5000)
+        else:
+            stock = int(rng.expovariate(1 / 40)) + 1
+        rows.append((
+            index, skewed_index(rng, category_count, skew=2), name, slugify(name),
+            f"{name} : un parfum de la maison {brand}.",
+            price_cents, original_cents, rng.random() < 0.95, stock,
+        ))
+    return rows
+
+
+def _customer_rows(seed, start, stop):
+    rng = random.Random(f"{seed}:customers:{start}")
+    rows = []
+    for index in range(start, stop):
+        rows.append((
+            index,
+            f"{rng.randint(1, 300)} {rng.choice(['avenue', 'rue', 'boulevard'])} "
+            f"{rng.choice(['Hassan II', 'Mohammed V', 'Zerktouni', 'Anfa', 'des FAR'])}",
+            f"06{rng.randrange(10000000, 99999999)}",
+        ))
+    return rows
+
+
+def _order_rows(seed, start, stop, total, customer_count, product_count, seconds):
+    rng = random.Random(f"{seed}:orders:{start}")
+    rows = []
+    for index in range(start, stop):
+        customer = skewed_index(rng, customer_count, skew=2)
+        method = 'cash_on_delivery' if rng.random() < 0.6 else 'online'
+        if method == 'online':
+            status = rng.choices(['completed', 'pending', 'failed', 'cancelled'], [85, 8, 5, 2])[0]
+        else:
+            status = rng.choices(['pending', 'completed'], [30, 70])[0]
+        # Commandes réparties sur la période, de la plus ancienne à la plus récente
+        offset = seconds * (index + rng.random()) / total
+        items = [
+            (skewed_index(rng, product_count), rng.choices([1, 2, 3], [80, 15, 5])[0])
+            for _ in range(rng.choices([1, 2, 3, 4, 5], [45, 30, 15, 7, 3])[0])
+        ]
+        rows.append((
+            index, customer, method, status == 'completed', status, offset,
+            str(rng.randrange(10000, 99999)), rng.choices(CITIES, CITY_WEIGHTS)[0], items,
+        ))
+    return rows
+
+
+def _chunks(count, size):
+    return [(start, min(start + size, count)) for start in range(0, count, size)]
+
+
+def _generate(executor, workers, func, chunks, seed, *args):
+    """
+    Générer les blocs en parallèle, dans l'ordre, avec un nombre borné de
+    blocs en attente pour garder une mémoire constante.
+    """
+    if executor is None:
+        for start, stop in chunks:
+            yield func(seed, start, stop, *args)
+        return
+    pending = []
+    for start, stop in chunks:
+        pending.append(executor.submit(func, seed, start, stop, *args))
+        if len(pending) >= workers * 2:
+            yield pending.pop(0).result()
+    for future in pending:
+        yield future.result()
+
+
+@contextmanager
+def _explicit_timestamps(model, *field_names):
+    """Désactiver temporairement auto_now/auto_now_add pour dater les lignes générées"""
+    fields = [model._meta.get_field(name) for name in field_names]
+    saved = [(f.auto_now, f.auto_now_add) for f in fields]
+    for f in fields:
+        f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, (auto_now, auto_now_add) in zip(fields, saved):
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+def _next_id(model):
+    return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+
+def _ids(queryset):
+    values = array('q')
+    values.extend(queryset.order_by('id').values_list('id', flat=True).iterator(chunk_size=10000))
+    return values
+
+
+def seed_catalog(categories=8, products=500, customers=20, orders=100, seed=42,
+                 batch_size=5000, workers=1, days=365, progress=None):
+    """
+    Générer un catalogue et un historique de commandes déterministes à partir de ``seed``.
+    Retourne le nombre d'objets créés par type.
+    """
+    progress = progress or (lambda kind, done, total: None)
+    counts = dict.fromkeys(['categories', 'products', 'customers', 'orders', 'order_items'], 0)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        names = [
+            CATEGORY_NAMES[i] if i < len(CATEGORY_NAMES) else f"{CATEGORY_NAMES[i % len(CATEGORY_NAMES)]} {i // len(CATEGORY_NAMES) + 1}"
+            for i in range(categories)
+        ]
+        existing = set(Category.objects.filter(slug__in=[slugify(n) for n in names]).values_list('slug', flat=True))
+        counts['categories'] = len(Category.objects.bulk_create(
+            [Category(name=name, slug=slugify(name)) for name in names if slugify(name) not in existing]
+        ))
+        category_ids = _ids(Category.objects.all())
+
+        if products and category_ids:
+            next_id = _next_id(Product)
+            for rows in _generate(executor, workers, _product_rows, _chunks(products, GENERATION_BLOCK), seed, len(category_ids)):
+                with transaction.atomic():
+                    Product.objects.bulk_create([
+                        Product(
+                            id=next_id + index,
+                            category_id=category_ids[category],
+                            name=name,
+                            search_name=normalized_name(name),
+                            slug=f"{slug}-{next_id + index}",
+                            description=description,
+                            price=Decimal(price) / 100,
+                            original_price=Decimal(original) / 100 if original else None,
+                            available=available,
+                            stock_quantity=stock,
+                        )
+                        for index, category, name, slug, description, price, original, available, stock in rows
+                    ], batch_size=batch_size)
+                    # Ouverture du journal de stock des produits générés
+                    StockSnapshot.objects.bulk_create([
+                        StockSnapshot(product_id=next_id + row[0], quantity=row[-1], last_movement_id=0)
+                        for row in rows
+                    ], batch_size=batch_size)
+                counts['products'] += len(rows)
+                progress('products', counts['products'], products)
+
+        if customers:
+            password = make_password(SEED_PASSWORD)
+            next_id = _next_id(User)
+            for rows in _generate(executor, workers, _customer_rows, _chunks(customers, GENERATION_BLOCK), seed):
+                with transaction.atomic():
+                    users = []
+                    for index, _, _ in rows:
+                        first_name, last_name, email = customer_identity(next_id + index)
+                        users.append(User(
+                            id=next_id + index, username=f"client{next_id + index}",
+                            first_name=first_name, last_name=last_name, email=email, password=password,
+                        ))
+                    User.objects.bulk_create(users, batch_size=batch_size)
+                    Customer.objects.bulk_create([
+                        Customer(user_id=next_id + index, address=address, phone_number=phone)
+                        for index, address, phone in rows
+                    ], batch_size=batch_size)
+                counts['customers'] += len(rows)
+                progress('customers', counts['customers'], customers)
+
+        customer_ids, user_ids = array('q'), array('q')
+        if orders:
+            for customer_id, user_id in Customer.objects.order_by('id').values_list('id', 'user_id').iterator(chunk_size=10000):
+                customer_ids.append(customer_id)
+                user_ids.append(user_id)
+        product_ids = _ids(Product.objects.all()) if orders else []
+        if orders and customer_ids and product_ids:
+            # Prix en centimes, indexés comme product_ids
+            prices = array('q', (
+                int(price * 100) for price in
+                Product.objects.order_by('id').values_list('price', flat=True).iterator(chunk_size=10000)
+            ))
+            next_id = _next_id(Order)
+            start_date = timezone.now() - timedelta(days=days)
+            chunks = _chunks(orders, GENERATION_BLOCK)
+            args = (seed, orders, len(customer_ids), len(product_ids), days * 86400)
+            with _explicit_timestamps(Order, 'created', 'updated'):
+                for rows in _generate(executor, workers, _order_rows, chunks, *args):
+                    order_objs, item_objs = [], []
+                    for index, customer, method, paid, status, offset, postal_code, city, items in rows:
+                        customer_id = customer_ids[customer]
+                        first_name, last_name, email = customer_identity(user_ids[customer])
+                        created = start_date + timedelta(seconds=offset)
+                        total = sum(prices[product] * quantity for product, quantity in items)
+                        order_objs.append(Order(
+                            id=next_id + index, customer_id=customer_id,
+                            first_name=first_name, last_name=last_name, email=email,
+                            address=f"{index % 300 + 1} avenue Hassan II", postal_code=postal_code, city=city,
+                            payment_method=method, paid=paid, payment_status=status,
+                            total_cost=Decimal(total) / 100, created=created, updated=created,
+                        ))
+                        item_objs.extend(
+                            OrderItem(
+                                order_id=next_id + index, product_id=product_ids[product],
+                                price=Decimal(prices[product]) / 100, quantity=quantity,
+                            )
+                            for product, quantity in items
+                        )
+                    with transaction.atomic():
+                        Order.objects.bulk_create(order_objs, batch_size=batch_size)
+                        OrderItem.objects.bulk_create(item_objs, batch_size=batch_size)
+                    counts['orders'] += len(order_objs)
+                    counts['order_items'] += len(item_objs)
+                    progress('orders', counts['orders'], orders)
+            # Les commandes générées ne passent pas par les signaux : totaux de ventes recalculés
+            backfill_sales(timezone.localdate(start_date))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return counts
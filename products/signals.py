@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .cache import bump_catalog_version
+from .facets import bump_deletions_version
+from .live import notify
+from .models import Category, Product
+
+
+# Envoyé après les modifications en masse du catalogue (QuerySet.update,
+# bulk_create...) qui ne déclenchent pas post_save
+catalog_changed = Signal()
+
+
+@receiver(catalog_changed)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache(sender, **kwargs):
+    """
+    Invalider les réponses mises en cache qui dépendent du catalogue
+    """
+    bump_catalog_version()
+    # Une réponse calculée avant le commit sur les anciennes données ne doit
+    # pas survivre à la transaction : nouvelle version au commit
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_facets(sender, **kwargs):
+    """
+    Reconstruire les facettes : une suppression n'apparaît pas parmi les
+    produits modifiés que relit la mise à jour incrémentale
+    """
+    bump_deletions_version()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(bump_deletions_version)
+
+
+@receiver(catalog_changed)
+@receiver(post_save, sender=Product)
+def notify_live_updates(sender, **kwargs):
+    """
+    Prévenir les pages ouvertes (flux SSE) d'un changement de prix ou de stock
+    """
+    transaction.on_commit(notify)
+
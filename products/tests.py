@@ -1,3 +1,724 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import threading
+from unittest import mock
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from customers.models import Customer
+from inventory.ledger import balance_discrepancies, record_sale
+from inventory.models import StockMovement, StockSnapshot
+from orders.models import Order, OrderItem
+from . import bulk
+from .bulk import export_products, import_products
+from . import facets
+from .facets import facet_counts, price_band, price_band_filter
+from . import fuzzy, seeding
+from .fuzzy import fuzzy_search
+from .cache import catalog_version
+from .live import LIVE_VERSION_KEY, broker, notify
+from .popularity import decay_weight, view_buffer
+from .models import Category, PriceCampaign, Product
+from .pricing import apply_campaign, preview_campaign, revert_campaign, run_scheduled_campaigns
+
+
+class BulkImportExportTests(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Homme parfums', slug='homme-parfums')
+        self.product = Product.objects.create(
+            category=self.category, name='Sauvage', slug='sauvage',
+            price=Decimal('900.00'), stock_quantity=3
+        )
+
+    def test_import_upserts_by_slug(self):
+        data = io.StringIO(
+            "slug,name,category,price,stock_quantity\n"
+            "sauvage,Sauvage EDT,homme-parfums,850.00,7\n"
+            "oud-royal,Oud Royal,orientaux,1200.00,2\n"
+            "oud-royal,Oud Royal,orientaux,1100.00,4\n"
+            "sans-prix,Sans prix,orientaux,,1\n"
+        )
+        result = import_products(data, 'csv')
+
+        self.assertEqual((result.created, result.updated, result.error_count), (1, 1, 1))
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.name, self.product.price, self.product.stock_quantity),
+                         ('Sauvage EDT', Decimal('850.00'), 7))
+        # Le dernier enregistrement d'un même slug l'emporte, la catégorie est créée
+        oud = Product.objects.get(slug='oud-royal')
+        self.assertEqual((oud.price, oud.category.slug), (Decimal('1100.00'), 'orientaux'))
+
+    def test_non_finite_prices_are_rejected(self):
+        data = io.StringIO(
+            "slug,name,category,price\n"
+            "nan,NaN,orientaux,NaN\n"
+            "infini,Infini,orientaux,Infinity\n"
+            "snan,sNaN,orientaux,sNaN\n"
+        )
+        result = import_products(data, 'csv')
+        self.assertEqual((result.created, result.error_count), (0, 3))
+
+    def test_field_validators_run_per_record(self):
+        data = io.StringIO(
+            "slug,name,category,price,stock_quantity\n"
+            "bad slug/é,X,c,10,1\n"
+            f"long,{'N' * 201},c,10,1\n"
+            "cher,Cher,c,123456789.00,1\n"
+            "centimes,Centimes,c,10.005,1\n"
+            "categorie,Catégorie,c d,10,1\n"
+            "valide,Valide,c,10,1\n"
+        )
+        result = import_products(data, 'csv')
+        self.assertEqual((result.created, result.error_count), (1, 5))
+        self.assertTrue(result.errors[0].startswith("Ligne 2 : slug invalide"))
+        self.assertEqual(list(Product.objects.filter(category__slug='c').values_list('slug', flat=True)), ['valide'])
+        self.assertFalse(Category.objects.filter(slug='c d').exists())
+
+    def test_stock_change_goes_through_ledger(self):
+        StockSnapshot.objects.create(product=self.product, quantity=3)
+        resolve_categories = bulk._resolve_categories
+
+        def sale_during_import(*args):
+            # Vente enregistrée entre la lecture des produits du lot et leur mise à jour
+            record_sale(None, [(self.product, 1)])
+            return resolve_categories(*args)
+
+        with mock.patch.object(bulk, '_resolve_categories', side_effect=sale_during_import):
+            import_products(io.StringIO("slug,price,stock_quantity\nsauvage,850.00,10\n"), 'csv')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 9)
+        self.assertEqual(StockMovement.objects.get(kind=StockMovement.ADJUSTMENT).quantity, 7)
+        self.assertFalse(balance_discrepancies().exists())
+
+        # Sortie que le stock ne couvre plus : signalée, le reste de la ligne est importé
+        with mock.patch.object(bulk, '_resolve_categories', side_effect=sale_during_import):
+            result = import_products(io.StringIO("slug,price,stock_quantity\nsauvage,800.00,0\n"), 'csv')
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.price, self.product.stock_quantity, result.error_count),
+                         (Decimal('800.00'), 8, 1))
+
+    def test_partial_update_keeps_other_columns(self):
+        import_products(io.StringIO('{"slug": "sauvage", "price": "799.90"}\n'), 'jsonl')
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.name, self.product.price, self.product.stock_quantity),
+                         ('Sauvage', Decimal('799.90'), 3))
+
+    def test_dry_run_writes_nothing(self):
+        data = io.StringIO("slug,name,category,price\nnouveau,Nouveau,nouvelle-categorie,10\n")
+        result = import_products(data, 'csv', dry_run=True)
+        self.assertEqual(result.created, 1)
+        self.assertFalse(Product.objects.filter(slug='nouveau').exists())
+        self.assertFalse(Category.objects.filter(slug='nouvelle-categorie').exists())
+
+    def test_export_round_trip(self):
+        lines = list(export_products(fmt='jsonl'))
+        self.assertEqual(json.loads(lines[0])['category'], 'homme-parfums')
+        Product.objects.all().delete()
+        result = import_products(lines, 'jsonl')
+        self.assertEqual(result.created, 1)
+        self.assertEqual(Product.objects.get().price, Decimal('900.00'))
+
+    def test_export_view_streams(self):
+        staff = User.objects.create_user(username='staff', password='complexpassword123', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('products:product_export'), {'format': 'csv'})
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        self.assertTrue(content.startswith('slug,name,category'))
+        self.assertIn('sauvage,Sauvage,homme-parfums', content)
+
+
+class AsyncApiTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Oud', slug='oud')
+        Product.objects.create(category=category, name='Oud Royal', slug='oud-royal', price=Decimal('500.00'))
+        Product.objects.create(category=category, name='Oud Noir', slug='oud-noir', price=Decimal('300.00'),
+                               available=False)
+
+    def test_endpoints_are_async(self):
+        for name in ('products:search_api', 'products:suggestions_api', 'cart:cart_summary',
+                     'customers:check_username', 'customers:check_email'):
+            self.assertTrue(iscoroutinefunction(resolve(reverse(name)).func), name)
+
+    async def test_search_and_suggestions(self):
+        response = await self.async_client.get(reverse('products:search_api'), {'q': 'oud'})
+        self.assertEqual([p['name'] for p in response.json()['products']], ['Oud Royal'])
+        response = await self.async_client.get(reverse('products:suggestions_api'), {'letter': 'o'})
+        self.assertEqual([p['slug'] for p in response.json()['suggestions']], ['oud-royal'])
+
+    def test_cached_search_runs_no_query(self):
+        self.client.get(reverse('products:search_api'), {'q': 'oud'})
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('products:search_api'), {'q': 'OUD'})
+        self.assertEqual(len(response.json()['products']), 1)
+
+
+class NormalizedNameTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Femmes parfums', slug='femmes-parfums')
+        self.eclat = Product.objects.create(category=self.category, name="Éclat  d'Arpège", slug='eclat',
+                                            price=Decimal('600.00'))
+        Product.objects.create(category=self.category, name='Elixir', slug='elixir', price=Decimal('700.00'))
+        Product.objects.create(category=self.category, name='Fleur', slug='fleur', price=Decimal('500.00'))
+
+    def test_maintained_on_save_and_import(self):
+        self.assertEqual(self.eclat.search_name, "eclat d'arpege")
+        self.eclat.name = 'ÉCLAT Intense'
+        self.eclat.save(update_fields=['name'])
+        self.assertEqual(Product.objects.get(pk=self.eclat.pk).search_name, 'eclat intense')
+
+        import_products(io.StringIO("slug,name\neclat,Éclat Sport\n"), 'csv')
+        self.assertEqual(Product.objects.get(pk=self.eclat.pk).search_name, 'eclat sport')
+
+    def test_accent_folded_prefixes(self):
+        response = self.client.get(reverse('products:search_api'), {'q': 'ECLAT '})
+        self.assertEqual([p['slug'] for p in response.json()['products']], ['eclat'])
+        # Lettre « É » et lettre « e » : mêmes suggestions, dans l'ordre du nom normalisé
+        for letter in ('e', 'É'):
+            response = self.client.get(reverse('products:suggestions_api'), {'letter': letter})
+            self.assertEqual([p['slug'] for p in response.json()['suggestions']], ['eclat', 'elixir'])
+
+    def test_prefix_search_uses_index_range(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("Plans d'exécution au format SQLite")
+        products = Product.objects.filter(
+            available=True, search_name__gte='ec', search_name__lt='ed'
+        ).order_by('search_name')[:10]
+        plan = products.explain()
+        self.assertIn('product_search_name_idx', plan)
+        self.assertIn('search_name>? AND search_name<?', plan.replace('"', ''))
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class FuzzySearchTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Parfums', slug='parfums')
+        self.products = {
+            slug: Product.objects.create(category=category, name=name, slug=slug,
+                                         price=Decimal('100.00'), stock_quantity=5)
+            for slug, name in (
+                ('terre', "Hermès Terre d'Hermès"),
+                ('libre', 'Yves Saint Laurent Libre'),
+                ('nomade', 'Chloé Nomade'),
+                ('sauvage', 'Dior Sauvage'),
+            )
+        }
+
+    def names(self, query):
+        names = dict(Product.objects.values_list('id', 'name'))
+        return [names[pk] for pk in fuzzy_search(query)]
+
+    def test_typos_accents_and_case(self):
+        self.assertEqual(self.names('herms')[0], "Hermès Terre d'Hermès")
+        self.assertEqual(self.names('yves sant lorent'), ['Yves Saint Laurent Libre'])
+        self.assertEqual(self.names('CHLOE'), ['Chloé Nomade'])
+        self.assertEqual(self.names('xyzw'), [])
+
+    def test_index_follows_catalog(self):
+        self.assertEqual(self.names('bleu'), [])
+        Product.objects.create(category=self.products['libre'].category, name='Bleu de Chanel',
+                               slug='bleu', price=Decimal('100.00'), stock_quantity=5)
+        self.assertEqual(self.names('bleu chanell'), ['Bleu de Chanel'])
+
+    def test_rebuilt_in_background_outside_transactions(self):
+        # Index du processus construit explicitement (les recherches du test sont dans une transaction)
+        fuzzy.index.state = fuzzy.index.build(catalog_version())
+        Product.objects.create(category=self.products['libre'].category, name='Bleu de Chanel',
+                               slug='bleu', price=Decimal('100.00'), stock_quantity=5)
+        built = threading.Event()
+        atomic = mock.patch.object(connection, 'in_atomic_block', False)
+        previous = fuzzy.index.state
+        with atomic, mock.patch.object(fuzzy.index, 'build', side_effect=lambda version: built.wait(5) and previous):
+            # Index précédent servi pendant la reconstruction, lancée une seule fois
+            self.assertEqual(self.names('sauvge'), ['Dior Sauvage'])
+            builder = fuzzy.index.builder
+            self.assertNotEqual(builder, threading.current_thread())
+            self.assertEqual(self.names('sauvge'), ['Dior Sauvage'])
+            self.assertIs(fuzzy.index.builder, builder)
+            built.set()
+            builder.join()
+        self.assertIsNone(fuzzy.index.builder)
+
+    def test_transaction_index_not_published(self):
+        # Recherche dans la transaction du test : index local, l'index du processus est inchangé
+        state = fuzzy.index.state
+        self.assertEqual(self.names('nomad'), ['Chloé Nomade'])
+        self.assertIs(fuzzy.index.state, state)
+
+    @override_settings(FUZZY_SEARCH_BUDGET=0)
+    def test_budget_keeps_rarest_trigrams(self):
+        # Budget épuisé après la première liste : la plus sélective
+        self.assertEqual(self.names('sauvge')[0], 'Dior Sauvage')
+
+    def test_fallback_in_search_api_and_catalog(self):
+        response = self.client.get(reverse('products:search_api'), {'q': 'Hermes Tere'})
+        self.assertEqual([p['slug'] for p in response.json()['products']], ['terre'])
+
+        response = self.client.get(reverse('products:product_list'), {'query': 'chloe nomad'})
+        self.assertTrue(response.context['fuzzy'])
+        self.assertEqual([p.slug for p in response.context['products']], ['nomade'])
+        self.assertContains(response, 'les noms les plus proches')
+
+        response = self.client.get(reverse('products:product_list'), {'query': 'Sauvage'})
+        self.assertFalse(response.context['fuzzy'])
+        self.assertEqual([p.slug for p in response.context['products']], ['sauvage'])
+
+
+class FacetTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.femme = Category.objects.create(name='Femme', slug='femme')
+        self.homme = Category.objects.create(name='Homme', slug='homme')
+        for i, (category, price, stock, original, available) in enumerate((
+            (self.femme, '150.00', 5, None, True),
+            (self.femme, '350.00', 0, '400.00', True),
+            (self.femme, '1200.00', 2, '1500.00', False),
+            (self.homme, '150.00', 0, None, True),
+            (self.homme, '450.00', 3, '600.00', True),
+            (self.homme, '800.00', 1, None, True),
+        )):
+            Product.objects.create(category=category, name=f'Parfum {i}', slug=f'parfum-{i}',
+                                   price=Decimal(price), stock_quantity=stock, available=available,
+                                   original_price=Decimal(original) if original else None)
+
+    def expected(self, selection):
+        """Mêmes nombres calculés en SQL"""
+        filters = {
+            'category': lambda value: {'category_id': value},
+            'price': price_band_filter,
+            'in_stock': lambda value: {'stock_quantity__gt': 0},
+            'on_sale': lambda value: {'discount_amount__gt': 0},
+            'available': lambda value: {'available': True},
+        }
+
+        def matching(exclude=None):
+            products = Product.objects.all()
+            for facet, value in selection.items():
+                if facet != exclude and value is not None and value is not False:
+                    products = products.filter(**filters[facet](value))
+            return products
+
+        counts = {'total': matching().count()}
+        for facet in ('category', 'price'):
+            counts[facet] = {}
+            for product in matching(facet):
+                key = product.category_id if facet == 'category' else price_band(product.price)
+                counts[facet][key] = counts[facet].get(key, 0) + 1
+        for facet in ('in_stock', 'on_sale', 'available'):
+            counts[facet] = {True: matching(facet).filter(**filters[facet](True)).count()}
+        return counts
+
+    def assertCountsMatch(self, selection, restrict=None):
+        counts = facet_counts(selection, restrict)
+        for facet in ('category', 'price'):
+            counts[facet] = {key: n for key, n in counts[facet].items() if n}
+        self.assertEqual(counts, self.expected(selection))
+
+    def test_counts_match_sql(self):
+        for selection in (
+            {},
+            {'available': True},
+            {'category': self.femme.id},
+            {'price': 0, 'in_stock': True},
+            {'category': self.homme.id, 'price': 1, 'on_sale': True, 'available': True},
+        ):
+            with self.subTest(selection=selection):
+                self.assertCountsMatch(selection)
+        # Produits déjà filtrés par ailleurs (recherche texte)
+        counts = facet_counts({'in_stock': True}, Product.objects.filter(slug__in=['parfum-0', 'parfum-1'])
+                              .values_list('id', flat=True))
+        self.assertEqual((counts['total'], counts['in_stock'][True], counts['category'][self.femme.id]), (1, 1, 1))
+
+    def test_stock_movement_updates_counts(self):
+        self.assertEqual(facet_counts({})['in_stock'][True], 4)
+        product = Product.objects.get(slug='parfum-1')
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=product.pk).update(stock_quantity=4, updated=timezone.now())
+            transaction.on_commit(notify)
+        self.assertEqual(facet_counts({})['in_stock'][True], 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            record_sale(None, [(Product.objects.get(slug='parfum-5'), 1)])
+        self.assertCountsMatch({'in_stock': True})
+
+    def test_product_changes_update_incrementally(self):
+        self.assertCountsMatch({})
+        build = mock.patch.object(facets.index, 'build', wraps=facets.index.build)
+        with build as rebuilt:
+            # Modifications dans l'admin : relecture des seuls produits modifiés
+            product = Product.objects.get(slug='parfum-2')
+            product.available = True
+            product.save()
+            Product.objects.get(slug='parfum-0').save()
+            self.assertCountsMatch({'available': True})
+            self.assertFalse(rebuilt.called)
+
+            # Suppression : reconstruction
+            Product.objects.filter(slug='parfum-4').delete()
+            self.assertCountsMatch({'available': True})
+            self.assertEqual(rebuilt.call_count, 1)
+
+            # Nouveau produit ou changement de tranche de prix : reconstruction
+            Product.objects.create(category=self.homme, name='Nouveau', slug='nouveau',
+                                   price=Decimal('90.00'), stock_quantity=1)
+            self.assertCountsMatch({'price': 0})
+            product.price = Decimal('100.00')
+            product.save()
+            self.assertCountsMatch({'price': 0})
+            self.assertEqual(rebuilt.call_count, 3)
+
+    def test_product_list_facets(self):
+        response = self.client.get(reverse('products:product_list'), {
+            'available_only': 'on', 'price_band': 0, 'in_stock': 'on'
+        })
+        self.assertEqual([p.slug for p in response.context['products']], ['parfum-0'])
+        groups = {group['label']: group['options'] for group in response.context['facets']}
+        self.assertEqual([(o['label'], o['count']) for o in groups['Catégorie']], [('Femme', 1)])
+        prices = {o['label']: (o['count'], o['active']) for o in groups['Prix']}
+        self.assertEqual(prices['Moins de 200 DH'], (1, True))
+        self.assertEqual(prices['200 à 500 DH'], (1, False))
+        self.assertContains(response, 'Moins de 200 DH (1)')
+
+        response = self.client.get(reverse('products:product_list'), {'query': 'Parfum 4', 'available_only': 'on'})
+        self.assertEqual(response.context['facet_total'], 1)
+
+    @override_settings(FACET_RESTRICT_LIMIT=2)
+    def test_text_filter_ids_capped(self):
+        url = reverse('products:product_list')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'query': 'Parfum', 'available_only': 'on'})
+        self.assertTrue(any('LIMIT 3' in query['sql'] for query in queries))
+        # Plus de produits retenus que la limite : facettes proposées sans nombres
+        self.assertIsNone(response.context['facet_total'])
+        groups = {group['label']: group['options'] for group in response.context['facets']}
+        self.assertEqual([(o['label'], o['count']) for o in groups['Catégorie']], [('Femme', None), ('Homme', None)])
+        self.assertNotContains(response, 'Femme (')
+
+        response = self.client.get(url, {'query': 'Parfum 1', 'available_only': 'on'})
+        self.assertEqual(response.context['facet_total'], 1)
+
+    def test_warm_builds_index(self):
+        index = facets.FacetIndex()
+        index.warm()
+        self.assertEqual(index.count({})['total'], 6)
+        with mock.patch.object(index, 'build') as build:
+            index.current()
+        self.assertFalse(build.called)
+
+
+class LiveUpdatesTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Oud', slug='oud')
+        self.oud = Product.objects.create(category=category, name='Oud Royal', slug='oud-royal',
+                                          price=Decimal('500.00'), stock_quantity=3)
+        self.musc = Product.objects.create(category=category, name='Musc', slug='musc',
+                                           price=Decimal('120.00'), stock_quantity=5)
+
+    async def test_one_channel_per_product(self):
+        first = broker.subscribe([self.oud.pk, self.musc.pk])
+        second = broker.subscribe([self.oud.pk])
+        try:
+            self.assertEqual(len(broker.channels[self.oud.pk].subscribers), 2)
+            # État de référence, puis une vente et un changement de prix
+            self.assertEqual(await broker.refresh(), 0)
+            await sync_to_async(record_sale)(None, [(self.oud, 3)])
+            self.musc.price = Decimal('99.00')
+            await self.musc.asave()
+            self.assertEqual(await broker.refresh(), 2)
+
+            sold_out = second.get_nowait()
+            self.assertEqual((sold_out['id'], sold_out['stock'], sold_out['in_stock']), (self.oud.pk, 0, False))
+            self.assertEqual({first.get_nowait()['id'], first.get_nowait()['id']}, {self.oud.pk, self.musc.pk})
+            self.assertTrue(second.empty())
+        finally:
+            broker.unsubscribe(first, [self.oud.pk, self.musc.pk])
+            broker.unsubscribe(second, [self.oud.pk])
+        self.assertEqual(broker.channels, {})
+
+    def test_writes_bump_shared_version(self):
+        version = cache.get(LIVE_VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            record_sale(None, [(self.musc, 1)])
+        self.assertNotEqual(cache.get(LIVE_VERSION_KEY), version)
+
+    async def test_event_stream(self):
+        response = await self.async_client.get(reverse('products:product_events'), {'ids': f'{self.oud.pk},x'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = response.streaming_content
+        self.assertEqual(await anext(events), b'retry: 2000\n\n')
+        await broker.refresh()
+        self.oud.price = Decimal('450.00')
+        await self.oud.asave()
+        await broker.refresh()
+        event = (await anext(events)).decode()
+        self.assertTrue(event.startswith('event: product\n'))
+        self.assertEqual(json.loads(event.split('data: ', 1)[1])['price'], '450.00')
+
+        # Déconnexion du navigateur : le serveur annule la lecture du flux
+        pending = asyncio.ensure_future(anext(events))
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertNotIn(self.oud.pk, broker.channels)
+
+    def test_stream_requires_asgi(self):
+        response = self.client.get(reverse('products:product_events'), {'ids': self.oud.pk})
+        self.assertEqual(response.status_code, 204)
+
+
+class PopularityTests(TestCase):
+
+    def setUp(self):
+        view_buffer.flush()
+        category = Category.objects.create(name='Oud', slug='oud')
+        self.oud = Product.objects.create(category=category, name='Oud Royal', slug='oud-royal',
+                                          price=Decimal('500.00'), stock_quantity=3)
+        self.musc = Product.objects.create(category=category, name='Musc', slug='musc',
+                                           price=Decimal('120.00'), stock_quantity=5)
+
+    def test_views_buffered_then_flushed_in_one_update(self):
+        for _ in range(3):
+            self.client.get(self.musc.get_absolute_url())
+        self.client.get(self.oud.get_absolute_url(), {'from': 'search'})
+        self.assertEqual(Product.objects.get(pk=self.musc.pk).view_count, 0)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(view_buffer.flush(), 4)
+        musc, oud = Product.objects.get(pk=self.musc.pk), Product.objects.get(pk=self.oud.pk)
+        self.assertEqual((musc.view_count, oud.view_count), (3, 1))
+        # Clic depuis la recherche : deux vues
+        self.assertAlmostEqual(oud.popularity / musc.popularity, 2 / 3, places=3)
+
+    def test_score_decays(self):
+        now = timezone.now()
+        half_life = settings.POPULARITY_HALF_LIFE
+        self.assertAlmostEqual(decay_weight(now - half_life, half_life) / decay_weight(now, half_life), 0.5)
+        # Trois vues il y a deux semaines comptent moins qu'une vue aujourd'hui
+        for _ in range(3):
+            view_buffer.add(self.musc.pk, at=now - 2 * half_life)
+        view_buffer.add(self.oud.pk, at=now)
+        view_buffer.flush()
+        response = self.client.get(reverse('products:product_list'), {'sort_by': '-popularity', 'available_only': 'on'})
+        self.assertEqual([p.slug for p in response.context['products']], ['oud-royal', 'musc'])
+
+    def test_weight_capped_and_rebased(self):
+        half_life = settings.POPULARITY_HALF_LIFE
+        far = settings.POPULARITY_EPOCH + 2000 * half_life
+        self.assertEqual(decay_weight(far, half_life), decay_weight(far + half_life, half_life))
+
+        now = timezone.now()
+        view_buffer.add(self.oud.pk, at=now)
+        view_buffer.add(self.musc.pk, at=now - half_life)
+        view_buffer.flush()
+        epoch = settings.POPULARITY_EPOCH + 10 * half_life
+        call_command('rebase_popularity', epoch.isoformat(), stdout=io.StringIO())
+        oud, musc = Product.objects.get(pk=self.oud.pk), Product.objects.get(pk=self.musc.pk)
+        with self.settings(POPULARITY_EPOCH=epoch):
+            self.assertAlmostEqual(oud.popularity / decay_weight(now, half_life), 1)
+        self.assertAlmostEqual(musc.popularity / oud.popularity, 0.5)
+
+    def test_save_keeps_counted_views(self):
+        product = Product.objects.get(pk=self.oud.pk)
+        view_buffer.add(self.oud.pk)
+        view_buffer.flush()
+        product.price = Decimal('450.00')
+        product.save()
+        self.assertEqual(Product.objects.get(pk=self.oud.pk).view_count, 1)
+
+    def test_sorts_read_indexes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("Plans d'exécution au format SQLite")
+        for field, index in (('-popularity', 'product_popularity_idx'), ('-sales_score', 'product_sales_score_idx')):
+            for products in (Product.objects.filter(available=True), Product.objects.all()):
+                plan = products.order_by(field).explain()
+                self.assertIn(index, plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+
+class PriceCampaignTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Femmes parfums', slug='femmes-parfums')
+        other = Category.objects.create(name='Homme parfums', slug='homme-parfums')
+        self.rose = Product.objects.create(category=self.category, name='Rose', slug='rose', price=Decimal('900.00'))
+        self.iris = Product.objects.create(
+            category=self.category, name='Iris', slug='iris',
+            price=Decimal('450.00'), original_price=Decimal('500.00')
+        )
+        self.cuir = Product.objects.create(category=other, name='Cuir', slug='cuir', price=Decimal('300.00'))
+
+    def campaign(self, **kwargs):
+        values = {'name': 'Soldes', 'category': self.category, 'percent': Decimal('20'), 'rounding': '0.90'}
+        values.update(kwargs)
+        return PriceCampaign.objects.create(**values)
+
+    def prices(self):
+        return dict(Product.objects.values_list('slug', 'price'))
+
+    def test_preview_writes_nothing(self):
+        stats = preview_campaign(self.campaign())
+        self.assertEqual(stats['count'], 2)
+        self.assertEqual(stats['new_total'], Decimal('1079.80'))
+        self.assertEqual([row['new_price'] for row in stats['sample']], [Decimal('719.90'), Decimal('359.90')])
+        self.assertEqual(self.prices()['rose'], Decimal('900.00'))
+
+    def test_apply_then_revert(self):
+        campaign = self.campaign()
+        # Verrou, lecture des prix, sauvegarde, UPDATE, statut (+ points de sauvegarde)
+        with self.assertNumQueries(7):
+            campaign = apply_campaign(campaign)
+        self.assertEqual(campaign.products_count, 2)
+        self.rose.refresh_from_db()
+        self.iris.refresh_from_db()
+        self.assertEqual((self.rose.price, self.rose.original_price), (Decimal('719.90'), Decimal('900.00')))
+        # Le prix barré existant est conservé
+        self.assertEqual((self.iris.price, self.iris.original_price), (Decimal('359.90'), Decimal('500.00')))
+        self.assertEqual(self.prices()['cuir'], Decimal('300.00'))
+
+        # Un prix modifié pendant la campagne n'est pas écrasé au rétablissement
+        Product.objects.filter(pk=self.iris.pk).update(price=Decimal('400.00'))
+        revert_campaign(campaign)
+        self.rose.refresh_from_db()
+        self.assertEqual((self.rose.price, self.rose.original_price), (Decimal('900.00'), None))
+        self.assertEqual(self.prices()['iris'], Decimal('400.00'))
+        self.assertFalse(campaign.items.exists())
+
+    def test_active_campaign_products_are_excluded(self):
+        apply_campaign(self.campaign())
+        second = apply_campaign(self.campaign(category=None, percent=Decimal('10'), rounding=''))
+        self.assertEqual(second.products_count, 1)
+        self.assertEqual(self.prices()['cuir'], Decimal('270.00'))
+
+    def test_scheduled_campaign(self):
+        now = timezone.now()
+        campaign = self.campaign(starts_at=now + timedelta(hours=1), ends_at=now + timedelta(hours=2))
+        self.assertEqual(run_scheduled_campaigns(now), ([], []))
+        started, _ = run_scheduled_campaigns(now + timedelta(hours=1))
+        self.assertEqual([c.pk for c in started], [campaign.pk])
+        self.assertEqual(self.prices()['rose'], Decimal('719.90'))
+        _, ended = run_scheduled_campaigns(now + timedelta(hours=2))
+        self.assertEqual([c.status for c in ended], [PriceCampaign.STATUS_ENDED])
+        self.assertEqual(self.prices()['rose'], Decimal('900.00'))
+
+    def test_search_cache_invalidated(self):
+        url = reverse('products:search_api')
+        self.assertEqual(self.client.get(url, {'q': 'Ros'}).json()['products'][0]['price'], '900.00')
+        with self.assertNumQueries(0):
+            self.client.get(url, {'q': 'Ros'})
+        apply_campaign(self.campaign())
+        self.assertEqual(self.client.get(url, {'q': 'Ros'}).json()['products'][0]['price'], '719.90')
+
+    def test_staff_view_preview_then_apply(self):
+        staff = User.objects.create_user(username='staff', password='complexpassword123', is_staff=True)
+        self.client.force_login(staff)
+        url = reverse('products:price_campaign_list')
+        data = {'name': 'Soldes', 'category': self.category.pk, 'percent': '20', 'rounding': '0.90',
+                'keep_original_price': 'on'}
+
+        response = self.client.post(url, {**data, 'preview': ''})
+        self.assertEqual(response.context['preview']['count'], 2)
+        self.assertFalse(PriceCampaign.objects.exists())
+
+        response = self.client.post(url, {**data, 'save': ''})
+        self.assertRedirects(response, url)
+        self.assertEqual(PriceCampaign.objects.get().status, PriceCampaign.STATUS_ACTIVE)
+        self.assertEqual(self.prices()['rose'], Decimal('719.90'))
+
+
+class DiscountColumnTests(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Homme parfums', slug='homme-parfums')
+        for slug, price, original_price in [
+            ('le-male', '1700.00', '2600.00'),
+            ('aventus', '3800.00', '4500.00'),
+            ('sauvage', '900.00', None),
+            ('boss', '700.00', '650.00'),
+            ('eros', '87.50', '100.00'),
+        ]:
+            Product.objects.create(
+                category=self.category, name=slug.capitalize(), slug=slug, price=Decimal(price),
+                original_price=Decimal(original_price) if original_price else None, stock_quantity=1
+            )
+
+    def test_columns_computed_by_database(self):
+        rows = dict((slug, (amount, percent)) for slug, amount, percent in
+                    Product.objects.values_list('slug', 'discount_amount', 'discount_percent'))
+        self.assertEqual(rows['le-male'], (Decimal('900.00'), 35))
+        self.assertEqual(rows['sauvage'], (Decimal('0.00'), 0))
+        # Prix original inférieur au prix : pas de réduction
+        self.assertEqual(rows['boss'], (Decimal('0.00'), 0))
+        self.assertEqual(rows['eros'], (Decimal('12.50'), 13))
+        for product in Product.objects.all():
+            self.assertEqual(product.discount_percentage, product.discount_percent)
+
+    def test_columns_follow_bulk_updates(self):
+        Product.objects.filter(slug='sauvage').update(original_price=Decimal('1200.00'))
+        self.assertEqual(Product.objects.get(slug='sauvage').discount_percent, 25)
+
+    def test_on_sale_filter_and_sort(self):
+        url = reverse('products:product_list')
+        response = self.client.get(url, {'on_sale': 'on', 'available_only': 'on', 'sort_by': '-discount_percent'})
+        self.assertEqual([p.slug for p in response.context['products']], ['le-male', 'aventus', 'eros'])
+        response = self.client.get(url, {'min_discount': 20, 'available_only': 'on'})
+        self.assertEqual([p.slug for p in response.context['products']], ['le-male'])
+        response = self.client.get(url, {'available_only': 'on', 'sort_by': '-discount_amount'})
+        self.assertEqual(response.context['products'][0].slug, 'le-male')
+
+    def test_admin_discount_filter(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'complexpassword123')
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse('admin:products_product_changelist'), {'discount': '25'}, secure=True)
+        self.assertEqual([p.slug for p in response.context['cl'].result_list], ['le-male'])
+
+
+class SeedCatalogTests(TestCase):
+
+    def rows(self):
+        return (
+            list(Product.objects.order_by('id').values_list(
+                'id', 'category__slug', 'name', 'search_name', 'slug', 'price', 'original_price',
+                'available', 'stock_quantity')),
+            list(Customer.objects.order_by('id').values_list('user__email', 'address', 'phone_number')),
+            list(Order.objects.order_by('id').values_list(
+                'customer__user_id', 'email', 'city', 'postal_code', 'payment_status', 'total_cost')),
+            list(OrderItem.objects.order_by('id').values_list('order_id', 'product_id', 'price', 'quantity')),
+        )
+
+    def clear(self):
+        OrderItem.objects.all().delete()
+        Order.objects.all().delete()
+        Product.objects.all().delete()
+        User.objects.all().delete()
+
+    @mock.patch.object(seeding, 'GENERATION_BLOCK', 7)
+    def test_same_rows_whatever_workers_and_batch_size(self):
+        options = dict(categories=3, products=30, customers=10, orders=25, seed=7)
+        seeding.seed_catalog(workers=1, batch_size=4, **options)
+        first = self.rows()
+        self.clear()
+        seeding.seed_catalog(workers=2, batch_size=50, **options)
+        self.assertEqual(self.rows(), first)
+        self.assertEqual([len(rows) for rows in first[:3]], [30, 10, 25])
@@ -0,0 +1,26 @@
+"""
+Normalisation du texte : recherches des clients et noms de produits.
+"""
+import re
+import unicodedata
+
+
+_SPACES = re.compile(r'\s+')
+
+
+def normalize(value):
+    """Texte sans accents, sans casse (casefold) et aux espaces regroupés"""
+    decomposed = unicodedata.normalize('NFKD', value)
+    unaccented = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return _SPACES.sub(' ', unaccented.casefold()).strip()
+
+
+def prefix_range(prefix):
+    """
+    Bornes (incluse, exclue) des textes normalisés commençant par ``prefix`` :
+    un intervalle que la base parcourt sur un index, contrairement à ``LIKE``
+    """
+    prefix = normalize(prefix)
+    if not prefix:
+        return None
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
@@ -7,16 +7,23 @@ app_name = 'products'
 urlpatterns = [
     # URLs publiques
     path('', views.product_list, name='product_list'),
-    path('<slug:category_slug>/', views.product_list, name='product_list_by_category'),
     path('<int:id>/<slug:slug>/', views.product_detail, name='product_detail'),
     
     # APIs de recherche
     path('api/search/', search_api.search_products_api, name='search_api'),
     path('api/suggestions/', search_api.get_product_suggestions, name='suggestions_api'),
+    path('api/live/', views.product_events, name='product_events'),
     
     # URLs de gestion des produits (pour le personnel)
     path('manage/', views.product_manage_list, name='product_manage_list'),
     path('manage/create/', views.product_create, name='product_create'),
+    path('manage/export/', views.product_export, name='product_export'),
+    path('manage/import/', views.product_import, name='product_import'),
+    path('manage/pricing/', views.price_campaign_list, name='price_campaign_list'),
+    path('manage/pricing/<int:id>/apply/', views.price_campaign_apply, name='price_campaign_apply'),
+    path('manage/pricing/<int:id>/revert/', views.price_campaign_revert, name='price_campaign_revert'),
+    path('manage/sales/', views.sales_dashboard, name='sales_dashboard'),
+    path('manage/searches/', views.search_dashboard, name='search_dashboard'),
     path('manage/<int:id>/', views.product_manage_detail, name='product_manage_detail'),
     path('manage/<int:id>/edit/', views.product_update, name='product_update'),
     path('manage/<int:id>/delete/', views.product_delete, name='product_delete'),
@@ -27,5 +34,8 @@ urlpatterns = [
     path('categories/create/', views.category_create, name='category_create'),
     path('categories/<int:id>/edit/', views.category_update, name='category_update'),
     path('categories/<int:id>/delete/', views.category_delete, name='category_delete'),
+
+    # En dernier : le slug de catégorie ne doit pas masquer 'manage/' ou 'categories/'
+    path('<slug:category_slug>/', views.product_list, name='product_list_by_category'),
 ]
 
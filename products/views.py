@@ -1,18 +1,103 @@
+import asyncio
+import io
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.core.paginator import Paginator
-from django.db.models import Q
-from django.http import JsonResponse
-from .models import Category, Product
-from .forms import ProductForm, CategoryForm, ProductSearchForm
+from django.db.models import Case, Count, Q, Value, When
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from .bulk import FORMATS, export_products, import_products
+from .facets import facet_counts, price_band_filter, price_bands
+from .fuzzy import fuzzy_search
+from .live import broker
+from .popularity import view_buffer
+from .models import Category, Product, PriceCampaign
+from .forms import ProductForm, CategoryForm, ProductSearchForm, ProductImportForm, PriceCampaignForm, SalesReportForm
+from .pricing import apply_campaign, preview_campaign, revert_campaign
+from analytics.models import SearchLog
+from analytics.reports import sales_report
+from analytics.search import search_log, search_report
 from cart.forms import CartAddProductForm
 
 
+def filter_discount(products, cleaned_data):
+    """
+    Filtrer les produits en promotion sur les colonnes de réduction stockées
+    """
+    min_discount = cleaned_data.get('min_discount')
+    if min_discount:
+        return products.filter(discount_percent__gte=min_discount)
+    if cleaned_data.get('on_sale'):
+        return products.filter(discount_amount__gt=0)
+    return products
+
+
+def facet_groups(request, counts, selection, categories):
+    """
+    Valeurs des facettes avec leur nombre de produits (None si ``counts`` est
+    None : toutes les valeurs sont proposées) et le lien qui les sélectionne
+    ou les désélectionne
+    """
+    def link(path, **changes):
+        params = request.GET.copy()
+        params.pop('page', None)
+        for name, value in changes.items():
+            params.pop(name, None)
+            if value is not None:
+                params[name] = value
+        return f'{path}?{params.urlencode()}' if params else path
+
+    def option(label, count, active, url):
+        return {'label': label, 'count': count, 'active': active, 'url': url}
+
+    def number(facet, value=True):
+        return None if counts is None else counts[facet].get(value, 0)
+
+    # Le filtre de catégorie remplace la catégorie de l'adresse (/<slug>/)
+    root = reverse('products:product_list')
+    groups = [
+        {'label': 'Catégorie', 'options': [
+            option(c.name, number('category', c.id), selection.get('category') == c.id,
+                   link(root, category=None if selection.get('category') == c.id else c.id))
+            for c in categories
+        ]},
+        {'label': 'Prix', 'options': [
+            option(label, number('price', band), selection.get('price') == band,
+                   link(request.path, price_band=None if selection.get('price') == band else band))
+            for band, label, _, _ in price_bands()
+        ]},
+        {'label': 'Filtres', 'options': [
+            option(label, number(facet), bool(selection.get(facet)),
+                   link(request.path, **{param: None if selection.get(facet) else 'on'}))
+            for facet, param, label in (
+                ('in_stock', 'in_stock', 'En stock'),
+                ('on_sale', 'on_sale', 'En promotion'),
+                ('available', 'available_only', 'Disponibles'),
+            )
+        ]},
+    ]
+    for group in groups:
+        group['options'] = [o for o in group['options'] if o['count'] is None or o['count'] or o['active']]
+    return groups
+
+
 def product_list(request, category_slug=None):
     """
     Afficher la liste des produits avec filtrage et recherche
     """
+    started = time.perf_counter()
+    query = None
+    matches = None
+    # Filtres des facettes (nombres de produits calculés en mémoire)
+    selection = {'available': True}
     category = None
     categories = Category.objects.all()
     products = Product.objects.filter(available=True)
@@ -31,12 +116,6 @@ def product_list(request, category_slug=None):
         sort_by = search_form.cleaned_data.get('sort_by')
         
         # Appliquer les filtres de recherche
-        if query:
-            products = products.filter(
-                Q(name__icontains=query) | 
-                Q(description__icontains=query)
-            )
-        
         if search_category:
             products = products.filter(category=search_category)
             category = search_category
@@ -46,23 +125,87 @@ def product_list(request, category_slug=None):
             if category_slug or search_category:
                 products = products.filter(category=category)
         
+        # Réduction stockée en base : filtre sans charger les produits
+        products = filter_discount(products, search_form.cleaned_data)
+        
+        band = search_form.cleaned_data.get('price_band')
+        if band is not None:
+            products = products.filter(**price_band_filter(band))
+        in_stock = search_form.cleaned_data.get('in_stock')
+        if in_stock:
+            products = products.filter(stock_quantity__gt=0)
+        
+        selection = {
+            'available': available_only,
+            'on_sale': search_form.cleaned_data.get('on_sale') or search_form.cleaned_data.get('min_discount'),
+            'in_stock': in_stock,
+            'price': band,
+        }
+        
         if sort_by:
             products = products.order_by(sort_by)
+        
+        # Texte filtré en dernier : la recherche approchée repart des autres filtres
+        if query:
+            matches = products.filter(
+                Q(name__icontains=query) | 
+                Q(description__icontains=query)
+            )
     
     # Pagination
-    paginator = Paginator(products, 12)  # 12 produits par page
+    paginator = Paginator(products if matches is None else matches, 12)  # 12 produits par page
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
+    # Aucun produit ne contient la requête : recherche approchée (fautes de frappe)
+    fuzzy = False
+    if matches is not None and not paginator.count:
+        ranked = fuzzy_search(query)
+        if ranked:
+            products = products.filter(pk__in=ranked)
+            if not search_form.cleaned_data.get('sort_by'):
+                products = products.order_by(Case(
+                    *[When(pk=pk, then=Value(rank)) for rank, pk in enumerate(ranked)]
+                ))
+            paginator = Paginator(products, 12)
+            page_obj = paginator.get_page(page_number)
+            fuzzy = True
+    
+    # Filtres hors facettes (texte, réduction minimale) : produits retenus lus par id
+    if category:
+        selection['category'] = category.id
+    narrowing = Product.objects.all()
+    if matches is not None:
+        narrowing = narrowing.filter(pk__in=ranked) if fuzzy else narrowing.filter(
+            Q(name__icontains=query) | Q(description__icontains=query)
+        )
+    min_discount = search_form.is_valid() and search_form.cleaned_data.get('min_discount')
+    if min_discount:
+        narrowing = narrowing.filter(discount_percent__gte=min_discount)
+    restrict = None
+    if matches is not None or min_discount:
+        # Au plus FACET_RESTRICT_LIMIT ids lus : au-delà, facettes sans nombres
+        limit = settings.FACET_RESTRICT_LIMIT
+        restrict = list(narrowing.values_list('id', flat=True)[:limit + 1])
+    counts = facet_counts(selection, restrict) if restrict is None or len(restrict) <= limit else None
+    
     context = {
         'category': category,
         'categories': categories,
         'products': page_obj,
         'search_form': search_form,
         'page_obj': page_obj,
+        'fuzzy': fuzzy,
+        'query': query,
+        'facets': facet_groups(request, counts, selection, categories),
+        'facet_total': counts and counts['total'],
     }
     
-    return render(request, 'products/product/list.html', context)
+    response = render(request, 'products/product/list.html', context)
+    if query:
+        # Nombre de résultats déjà compté par la pagination
+        search_log.add(SearchLog.CATALOG, query, paginator.count, started)
+    return response
 
 
 def product_detail(request, id, slug):
@@ -71,6 +214,9 @@ def product_detail(request, id, slug):
     """
     product = get_object_or_404(Product, id=id, slug=slug)
     cart_product_form = CartAddProductForm()
+    # Vue comptée en mémoire, écrite plus tard par lots
+    from_search = request.GET.get('from') == 'search'
+    view_buffer.add(product.id, weight=settings.POPULARITY_SEARCH_CLICK_WEIGHT if from_search else 1)
     
     # Produits similaires (même catégorie)
     similar_products = Product.objects.filter(
@@ -87,6 +233,37 @@ def product_detail(request, id, slug):
     return render(request, 'products/product/detail.html', context)
 
 
+async def product_events(request):
+    """
+    Flux SSE des changements de prix et de stock des produits ``ids``
+    (produits de la page et du panier)
+    """
+    product_ids = sorted({int(pk) for pk in request.GET.get('ids', '').split(',') if pk.isdigit()})
+    # Flux infini : uniquement en ASGI. 204 : le navigateur ne se reconnecte pas
+    if not product_ids or not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    product_ids = product_ids[:settings.LIVE_MAX_PRODUCTS]
+
+    async def events():
+        queue = broker.subscribe(product_ids)
+        try:
+            yield f'retry: {settings.LIVE_POLL_INTERVAL * 1000}\n\n'
+            while True:
+                try:
+                    state = await asyncio.wait_for(queue.get(), settings.LIVE_HEARTBEAT)
+                except TimeoutError:
+                    yield ': ping\n\n'
+                    continue
+                yield f'event: product\ndata: {json.dumps(state)}\n\n'
+        finally:
+            broker.unsubscribe(queue, product_ids)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 # Vues CRUD pour l'administration des produits (nécessitent une authentification)
 
 def is_staff_user(user):
@@ -123,6 +300,8 @@ def product_manage_list(request):
         if available_only:
             products = products.filter(available=True)
         
+        products = filter_discount(products, search_form.cleaned_data)
+        
         if sort_by:
             products = products.order_by(sort_by)
     
@@ -224,6 +403,116 @@ def product_manage_detail(request, id):
     return render(request, 'products/manage/product_detail.html', context)
 
 
+@user_passes_test(is_staff_user)
+def product_export(request):
+    """
+    Exporter le catalogue en CSV ou JSON Lines (réponse envoyée en flux)
+    """
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        fmt = 'csv'
+    products = Product.objects.all()
+    category_slug = request.GET.get('category')
+    if category_slug:
+        products = products.filter(category__slug=category_slug)
+
+    content_type = 'text/csv; charset=utf-8' if fmt == 'csv' else 'application/x-ndjson; charset=utf-8'
+    response = StreamingHttpResponse(export_products(products, fmt), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="produits.{fmt}"'
+    return response
+
+
+@user_passes_test(is_staff_user)
+def product_import(request):
+    """
+    Importer des produits en masse : mise à jour par slug, création sinon
+    """
+    result = None
+    if request.method == 'POST':
+        form = ProductImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            # Lecture ligne par ligne du fichier envoyé (stocké sur disque s'il est volumineux)
+            stream = io.TextIOWrapper(form.cleaned_data['file'].file, encoding='utf-8-sig', newline='')
+            result = import_products(
+                stream,
+                form.cleaned_data['format'],
+                dry_run=form.cleaned_data['dry_run']
+            )
+            prefix = "Simulation : " if form.cleaned_data['dry_run'] else ""
+            messages.success(
+                request,
+                f"{prefix}{result.created} produit(s) créé(s), {result.updated} mis à jour, "
+                f"{result.error_count} ligne(s) rejetée(s)."
+            )
+    else:
+        form = ProductImportForm()
+
+    context = {
+        'form': form,
+        'result': result,
+        'title': 'Importer des produits',
+    }
+
+    return render(request, 'products/manage/product_import.html', context)
+
+
+@user_passes_test(is_staff_user)
+def price_campaign_list(request):
+    """
+    Campagnes de réduction : création avec aperçu, suivi des campagnes
+    """
+    preview = None
+    if request.method == 'POST':
+        form = PriceCampaignForm(request.POST)
+        if form.is_valid():
+            campaign = form.save(commit=False)
+            if 'preview' in request.POST:
+                preview = preview_campaign(campaign)
+            else:
+                campaign.save()
+                if campaign.is_due:
+                    campaign = apply_campaign(campaign)
+                    messages.success(request, f"Campagne '{campaign.name}' appliquée à {campaign.products_count} produit(s).")
+                else:
+                    messages.success(request, f"Campagne '{campaign.name}' programmée.")
+                return redirect('products:price_campaign_list')
+    else:
+        form = PriceCampaignForm()
+
+    context = {
+        'form': form,
+        'preview': preview,
+        'campaigns': PriceCampaign.objects.select_related('category')[:50],
+        'title': 'Campagnes de prix',
+    }
+
+    return render(request, 'products/manage/price_campaigns.html', context)
+
+
+@user_passes_test(is_staff_user)
+def price_campaign_apply(request, id):
+    """
+    Démarrer immédiatement une campagne programmée
+    """
+    campaign = get_object_or_404(PriceCampaign, id=id, status=PriceCampaign.STATUS_SCHEDULED)
+    if request.method == 'POST':
+        campaign = apply_campaign(campaign)
+        messages.success(request, f"Campagne '{campaign.name}' appliquée à {campaign.products_count} produit(s).")
+    return redirect('products:price_campaign_list')
+
+
+@user_passes_test(is_staff_user)
+def price_campaign_revert(request, id):
+    """
+    Terminer une campagne et rétablir les prix
+    """
+    campaign = get_object_or_404(PriceCampaign, id=id)
+    if request.method == 'POST':
+        revert_campaign(campaign)
+        messages.success(request, f"Campagne '{campaign.name}' terminée, prix rétablis.")
+    return redirect('products:price_campaign_list')
+
+
 # Vues CRUD pour les catégories
 
 @user_passes_test(is_staff_user)
@@ -231,7 +520,7 @@ def category_list(request):
     """
     Liste des catégories pour la gestion
     """
-    categories = Category.objects.all().order_by('name')
+    categories = Category.objects.annotate(products_count=Count('products')).order_by('name')
     
     context = {
         'categories': categories,
@@ -334,3 +623,42 @@ def product_toggle_availability(request, id):
     
     return JsonResponse({'success': False})
 
+
+@user_passes_test(is_staff_user)
+def sales_dashboard(request):
+    """
+    Tableau de bord des ventes, calculé depuis les totaux journaliers
+    """
+    today = timezone.localdate()
+    form = SalesReportForm(request.GET or {'date_from': today - timedelta(days=29), 'date_to': today})
+    report = None
+    if form.is_valid():
+        report = sales_report(form.cleaned_data['date_from'], form.cleaned_data['date_to'])
+
+    context = {
+        'form': form,
+        'report': report,
+        'title': 'Ventes',
+    }
+
+    return render(request, 'products/manage/sales_dashboard.html', context)
+
+
+@user_passes_test(is_staff_user)
+def search_dashboard(request):
+    """
+    Recherches les plus fréquentes et sans résultat, depuis les totaux journaliers
+    """
+    today = timezone.localdate()
+    form = SalesReportForm(request.GET or {'date_from': today - timedelta(days=29), 'date_to': today})
+    report = None
+    if form.is_valid():
+        report = search_report(form.cleaned_data['date_from'], form.cleaned_data['date_to'])
+
+    context = {
+        'form': form,
+        'report': report,
+        'title': 'Recherches',
+    }
+
+    return render(request, 'products/manage/search_dashboard.html', context)
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from retention.policies import apply_policies, expired
+
+
+class Command(BaseCommand):
+    help = "Supprimer par lots les données expirées (sessions, journaux de connexion, notifications PayPal)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('policies', nargs='*', help="Politiques à appliquer (toutes par défaut)")
+        parser.add_argument('--batch-size', type=int, help="Lignes supprimées par transaction")
+        parser.add_argument('--pause', type=float, help="Pause entre deux lots, en secondes")
+        parser.add_argument('--dry-run', action='store_true', help="Compter les lignes expirées sans les supprimer")
+
+    def handle(self, *args, **options):
+        unknown = set(options['policies']) - set(settings.RETENTION_POLICIES)
+        if unknown:
+            raise CommandError(f"Politique(s) inconnue(s) : {', '.join(sorted(unknown))}")
+
+        if options['dry_run']:
+            report = {label: expired(label).count() for label in options['policies'] or settings.RETENTION_POLICIES}
+            verb = 'à supprimer'
+        else:
+            report = apply_policies(options['policies'], options['batch_size'], options['pause'])
+            verb = 'supprimée(s)'
+        for label, count in report.items():
+            policy = settings.RETENTION_POLICIES[label]
+            self.stdout.write(f"{label} ({policy['days']} j) : {count} ligne(s) {verb}")
+        self.stdout.write(self.style.SUCCESS(f"Total : {sum(report.values())} ligne(s) {verb}."))
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+
+# Index des dates d'expiration des tables d'applications tierces (sans Meta
+# modifiable) : les lots de suppression de retention.policies les parcourent
+INDEXES = [
+    ('axes', 'AccessAttempt', models.Index(fields=['attempt_time'], name='axes_attempt_time_idx')),
+    ('axes', 'AccessLog', models.Index(fields=['attempt_time'], name='axes_log_attempt_time_idx')),
+    ('axes', 'AccessFailureLog', models.Index(fields=['attempt_time'], name='axes_failure_time_idx')),
+    ('ipn', 'PayPalIPN', models.Index(fields=['created_at'], name='ipn_created_at_idx')),
+]
+
+
+def add_indexes(apps, schema_editor):
+    for app_label, model_name, index in INDEXES:
+        schema_editor.add_index(apps.get_model(app_label, model_name), index)
+
+
+def remove_indexes(apps, schema_editor):
+    for app_label, model_name, index in INDEXES:
+        schema_editor.remove_index(apps.get_model(app_label, model_name), index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('axes', '0010_accessattemptexpiration'),
+        ('ipn', '0008_auto_20181128_1032'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_indexes, remove_indexes),
+    ]
@@ -0,0 +1,55 @@
+"""
+Suppression des données expirées, table par table.
+
+Chaque politique de ``settings.RETENTION_POLICIES`` associe un modèle
+(``app_label.Model``) à son champ de date et à une durée de conservation en
+jours : les lignes dont la date est antérieure à maintenant moins cette durée
+sont supprimées. La suppression se fait par lots de ``RETENTION_BATCH_SIZE``
+clés lues dans l'index du champ de date, une transaction courte par lot, avec
+une pause de ``RETENTION_PAUSE`` secondes entre deux lots : sous SQLite, le
+verrou d'écriture n'est jamais gardé longtemps et les requêtes du site
+passent entre les lots.
+"""
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+
+def expired(label, now=None):
+    """Lignes expirées d'une politique"""
+    policy = settings.RETENTION_POLICIES[label]
+    cutoff = (now or timezone.now()) - timedelta(days=policy['days'])
+    return apps.get_model(label).objects.filter(**{f"{policy['field']}__lt": cutoff})
+
+
+def purge(label, batch_size=None, pause=None, now=None):
+    """Supprimer les lignes expirées d'une politique ; retourne leur nombre"""
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    pause = settings.RETENTION_PAUSE if pause is None else pause
+    field = settings.RETENTION_POLICIES[label]['field']
+    rows = expired(label, now)
+    deleted = 0
+    while True:
+        # Plus anciennes d'abord : parcours de l'index du champ de date
+        keys = list(rows.order_by(field).values_list('pk', flat=True)[:batch_size])
+        if not keys:
+            return deleted
+        with transaction.atomic():
+            _, per_model = rows.model.objects.filter(pk__in=keys).delete()
+        # Lignes supprimées en cascade non comptées
+        deleted += per_model.get(rows.model._meta.label, 0)
+        if len(keys) < batch_size:
+            return deleted
+        time.sleep(pause)
+
+
+def apply_policies(labels=None, batch_size=None, pause=None, now=None):
+    """Appliquer les politiques (toutes par défaut) ; retourne {politique : lignes supprimées}"""
+    return {
+        label: purge(label, batch_size, pause, now)
+        for label in labels or settings.RETENTION_POLICIES
+    }
@@ -0,0 +1,63 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+
+from axes.models import AccessLog
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from paypal.standard.ipn.models import PayPalIPN
+from .policies import apply_policies, expired, purge
+
+
+class RetentionTests(TestCase):
+
+    def setUp(self):
+        now = timezone.now()
+        Session.objects.bulk_create([
+            Session(session_key=f'expiree{n}', session_data='', expire_date=now - timedelta(hours=n + 1))
+            for n in range(5)
+        ] + [Session(session_key='active', session_data='', expire_date=now + timedelta(days=1))])
+        # attempt_time et created_at sont remplis à la création : dates reculées ensuite
+        for username, days in (('amina', 1), ('yassine', 200)):
+            log = AccessLog.objects.create(username=username, user_agent='', http_accept='', path_info='/')
+            AccessLog.objects.filter(pk=log.pk).update(attempt_time=now - timedelta(days=days))
+        ipn = PayPalIPN.objects.create(txn_id='TXN-1')
+        PayPalIPN.objects.filter(pk=ipn.pk).update(created_at=now - timedelta(days=400))
+
+    def test_purge_in_batches(self):
+        with mock.patch('retention.policies.time.sleep') as sleep:
+            self.assertEqual(purge('sessions.Session', batch_size=2, pause=0.5), 5)
+        # Pause entre deux lots complets uniquement
+        self.assertEqual(sleep.call_count, 2)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['active'])
+
+    def test_apply_policies_report(self):
+        report = apply_policies(pause=0)
+        self.assertEqual(report['axes.AccessLog'], 1)
+        self.assertEqual(report['ipn.PayPalIPN'], 1)
+        self.assertEqual(report['axes.AccessAttempt'], 0)
+        self.assertEqual(AccessLog.objects.get().username, 'amina')
+
+    @skipUnless(connection.vendor == 'sqlite', "Plans d'exécution au format SQLite")
+    def test_batches_read_date_indexes(self):
+        for label, index in (('axes.AccessLog', 'axes_log_attempt_time_idx'),
+                             ('ipn.PayPalIPN', 'ipn_created_at_idx'),
+                             ('sessions.Session', 'django_session_expire_date')):
+            field = 'expire_date' if label == 'sessions.Session' else (
+                'created_at' if label == 'ipn.PayPalIPN' else 'attempt_time')
+            plan = expired(label).order_by(field).values('pk').explain()
+            self.assertIn(index, plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('apply_retention', 'sessions.Session', '--dry-run', stdout=out)
+        self.assertIn('sessions.Session (0 j) : 5 ligne(s) à supprimer', out.getvalue())
+        self.assertEqual(Session.objects.count(), 6)
+
+        call_command('apply_retention', '--pause', '0', stdout=out)
+        self.assertIn('Total : 7 ligne(s) supprimée(s).', out.getvalue())
@@ -0,0 +1,40 @@
+/**
+ * Mises à jour en direct du stock et des prix (Server-Sent Events)
+ * Les éléments [data-live-product] sont mis à jour quand le produit change :
+ * prix ([data-live-price]), rupture de stock (classe out-of-stock) et boutons
+ * d'achat ([data-live-buy])
+ */
+
+(function() {
+    const url = document.currentScript.dataset.url;
+
+    document.addEventListener('DOMContentLoaded', function() {
+        const elements = document.querySelectorAll('[data-live-product]');
+        if (!elements.length || !window.EventSource) {
+            return;
+        }
+        const ids = [...new Set([...elements].map(el => el.dataset.liveProduct))];
+        const source = new EventSource(`${url}?ids=${ids.join(',')}`);
+
+        source.addEventListener('product', function(event) {
+            const state = JSON.parse(event.data);
+            const purchasable = state.available && state.in_stock;
+            let wasPurchasable = false;
+
+            document.querySelectorAll(`[data-live-product="${state.id}"]`).forEach(function(element) {
+                wasPurchasable = wasPurchasable || !element.classList.contains('out-of-stock');
+                element.classList.toggle('out-of-stock', !purchasable);
+                element.querySelectorAll('[data-live-price]').forEach(function(price) {
+                    price.textContent = `${state.price} DH`;
+                });
+                element.querySelectorAll('[data-live-buy]').forEach(function(button) {
+                    button.disabled = !purchasable;
+                });
+            });
+
+            if (wasPurchasable && !purchasable && window.notify) {
+                window.notify.warning(`${state.name} n'est plus disponible`);
+            }
+        });
+    });
+})();
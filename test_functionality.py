@@ -1,10 +1,19 @@
 #!/usr/bin/env python3
 """
-Script de test des fonctionnalités principales de la plateforme e-commerce
+Tests des fonctionnalités principales de la plateforme e-commerce
+
+Chaque vue est exécutée sur des données de deux tailles différentes : le test
+échoue si le nombre de requêtes SQL dépasse le budget de la vue
+(settings.QUERY_BUDGETS) ou s'il augmente avec le volume de données.
+
+Lancement : python manage.py test test_functionality
+        ou  python test_functionality.py
 """
 
 import os
 import sys
+import time
+from unittest import mock
 
 # Configuration Django AVANT les imports
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'parfumerie.settings')
@@ -12,44 +21,82 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'parfumerie.settings')
 import django
 django.setup()
 
-from django.test import TestCase, Client
+from decimal import Decimal
+
 from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.test import Client, TestCase
 from django.urls import reverse
 
-from products.models import Category, Product
-from customers.models import Customer
+from analytics.models import SearchLog
+from analytics.search import search_log
 from cart.cart import Cart
+from customers.models import Customer
+from orders.models import Order, OrderItem
+from parfumerie.buffers import flush_buffers, flush_buffers_at_exit
+from parfumerie.querybudget import QueryBudgetTestCase, QueryRecorder
+from products.models import Category, Product, normalized_name
+from products.popularity import view_buffer
 
 
-def test_models():
+class CatalogSeedMixin:
+    """
+    Complète le catalogue jusqu'à ``size`` produits et ``size`` catégories.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(name="Test Parfums", slug="test-parfums")
+        self.product = Product.objects.create(
+            category=self.category,
+            name="Test Parfum",
+            slug="test-parfum",
+            price=Decimal('50.00'),
+            original_price=Decimal('70.00'),
+            description="Un parfum de test",
+            stock_quantity=10,
+            available=True
+        )
+
+    def seed(self, size):
+        categories = Category.objects.count()
+        Category.objects.bulk_create([
+            Category(name=f"Catégorie {i}", slug=f"categorie-{i}")
+            for i in range(categories, size)
+        ])
+        products = Product.objects.count()
+        Product.objects.bulk_create([
+            Product(
+                category=self.category,
+                name=f"Test Parfum {i}",
+                slug=f"test-parfum-{i}",
+                search_name=normalized_name(f"Test Parfum {i}"),
+                price=Decimal('40.00') + i,
+                original_price=Decimal('90.00') if i % 2 else None,
+                stock_quantity=10,
+                available=True
+            )
+            for i in range(products, size)
+        ])
+
+
+class ModelTests(TestCase):
     """Test des modèles"""
-    print("🧪 Test des modèles...")
-    
-    # Test Category
-    try:
+
+    def test_category_and_product(self):
         category = Category.objects.create(name="Test Parfums", slug="test-parfums")
-        print("✅ Modèle Category : OK")
-    except Exception as e:
-        print(f"❌ Modèle Category : {e}")
-        return False
-    
-    # Test Product
-    try:
         product = Product.objects.create(
             category=category,
             name="Test Parfum",
             slug="test-parfum",
-            price=50.00,
+            price=Decimal('50.00'),
             description="Un parfum de test",
             available=True
         )
-        print("✅ Modèle Product : OK")
-    except Exception as e:
-        print(f"❌ Modèle Product : {e}")
-        return False
-    
-    # Test User et Customer
-    try:
+        self.assertEqual(product.category, category)
+        self.assertFalse(product.is_in_stock)
+
+    def test_user_and_customer(self):
         user = User.objects.create_user(
             username="testuser",
             email="test@example.com",
@@ -57,117 +104,145 @@ def test_models():
             first_name="Test",
             last_name="User"
         )
-        customer = Customer.objects.create(
-            user=user,
-            phone_number="0123456789",
-            address="123 Test Street"
-        )
-        print("✅ Modèles User et Customer : OK")
-    except Exception as e:
-        print(f"❌ Modèles User et Customer : {e}")
-        return False
-    
-    return True
-
-
-def test_urls():
-    """Test des URLs principales"""
-    print("\n🌐 Test des URLs...")
-    
-    client = Client()
-    
-    # URLs à tester
-    urls_to_test = [
-        ('products:product_list', 200),
-        ('customers:login', 200),
-        ('customers:register', 200),
-        ('cart:cart_detail', 200),
-    ]
-    
-    for url_name, expected_status in urls_to_test:
-        try:
-            url = reverse(url_name)
-            response = client.get(url)
-            if response.status_code == expected_status:
-                print(f"✅ URL {url_name} : OK (Status: {response.status_code})")
-            else:
-                print(f"❌ URL {url_name} : Status {response.status_code} (attendu: {expected_status})")
-                return False
-        except Exception as e:
-            print(f"❌ URL {url_name} : {e}")
-            return False
-    
-    return True
-
-
-def test_cart_functionality():
+        # Profil client créé avec le compte
+        self.assertEqual(Customer.objects.get(user=user), user.customer)
+
+
+class StorefrontQueryBudgetTests(CatalogSeedMixin, QueryBudgetTestCase):
+    """Test des URLs publiques et de leur budget de requêtes"""
+
+    def test_product_list(self):
+        self.assertQueriesConstant(reverse('products:product_list'))
+
+    def test_product_list_by_category(self):
+        self.assertQueriesConstant(self.category.get_absolute_url())
+
+    def test_product_list_search(self):
+        self.assertQueriesConstant(reverse('products:product_list'), data={
+            'query': 'parfum', 'available_only': 'on', 'sort_by': '-price'
+        })
+
+    def test_product_detail(self):
+        self.assertQueriesConstant(self.product.get_absolute_url())
+
+    def test_search_api(self):
+        self.assertQueriesConstant(reverse('products:search_api'), data={'q': 'Test'})
+        # Produits générés trouvés par préfixe de leur nom normalisé
+        response = self.client.get(reverse('products:search_api'), {'q': 'test parfum 1'})
+        self.assertEqual(len(response.json()['products']), 3)
+
+    def test_suggestions_api(self):
+        self.assertQueriesConstant(reverse('products:suggestions_api'), data={'letter': 'T'})
+
+    def test_auth_pages(self):
+        self.assertWithinBudget(reverse('customers:login'))
+        self.assertWithinBudget(reverse('customers:register'))
+
+
+class CartQueryBudgetTests(CatalogSeedMixin, QueryBudgetTestCase):
     """Test des fonctionnalités du panier"""
-    print("\n🛒 Test des fonctionnalités du panier...")
-    
-    try:
-        # Créer une session de test
-        from django.contrib.sessions.backends.db import SessionStore
+
+    def seed(self, size):
+        super().seed(size)
+        session = self.client.session
+        session['cart'] = {
+            str(product.id): {
+                'quantity': 1,
+                'price': str(product.price),
+                'name': product.name,
+                'available': True,
+            }
+            for product in Product.objects.all()[:size]
+        }
+        session.save()
+
+    def test_cart_detail(self):
+        self.assertQueriesConstant(reverse('cart:cart_detail'))
+
+    def test_cart_summary(self):
+        client = Client(HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        client.cookies = self.client.cookies
+        self.assertQueriesConstant(reverse('cart:cart_summary'), client=client)
+        self.assertEqual(client.get(reverse('cart:cart_summary')).json()['cart_count'], 12)
+
+        # Visiteur sans panier : aucune session créée
+        response, recorder = self.record(
+            reverse('cart:cart_summary'), client=Client(HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        )
+        self.assertEqual((response.json(), len(recorder)), ({'cart_count': 0, 'cart_total': '0'}, 0))
+        self.assertNotIn('sessionid', response.cookies)
+
+    def test_order_create_form(self):
+        user = User.objects.create_user(username='buyer', password='complexpassword123')
+        self.client.force_login(user)
+        self.assertQueriesConstant(reverse('orders:order_create'))
+
+    def test_cart_operations(self):
         session = SessionStore()
         session.create()
-        
-        # Simuler une requête avec session
+
         class MockRequest:
             def __init__(self, session):
                 self.session = session
-        
-        request = MockRequest(session)
-        cart = Cart(request)
-        
-        # Créer un produit de test
-        category = Category.objects.get_or_create(name="Test", slug="test")[0]
-        product = Product.objects.get_or_create(
-            name="Test Product",
-            slug="test-product",
-            category=category,
-            price=25.00,
-            defaults={'available': True}
-        )[0]
-        
-        # Test ajout au panier
-        cart.add(product, quantity=2)
-        if len(cart) == 2:
-            print("✅ Ajout au panier : OK")
-        else:
-            print(f"❌ Ajout au panier : Quantité incorrecte ({len(cart)})")
-            return False
-        
-        # Test prix total
-        total = cart.get_total_price()
-        if total == 50.00:
-            print("✅ Calcul du prix total : OK")
-        else:
-            print(f"❌ Calcul du prix total : {total} (attendu: 50.00)")
-            return False
-        
-        # Test suppression du panier
-        cart.remove(product)
-        if len(cart) == 0:
-            print("✅ Suppression du panier : OK")
-        else:
-            print(f"❌ Suppression du panier : Quantité incorrecte ({len(cart)})")
-            return False
-        
-    except Exception as e:
-        print(f"❌ Test du panier : {e}")
-        return False
-    
-    return True
-
-
-def test_authentication():
+
+        cart = Cart(MockRequest(session))
+        cart.add(self.product, quantity=2)
+        self.assertEqual(len(cart), 2)
+        self.assertEqual(cart.get_total_price(), Decimal('100.00'))
+
+        # Le panier ne recharge pas les produits à chaque itération
+        with QueryRecorder() as recorder:
+            list(cart)
+            list(cart)
+        self.assertEqual(len(recorder), 1, recorder.report())
+
+        cart.remove(self.product)
+        self.assertEqual(len(cart), 0)
+
+
+class OrderHistoryQueryBudgetTests(CatalogSeedMixin, QueryBudgetTestCase):
+    """Test de l'historique des commandes d'un client"""
+
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user(username='buyer', password='complexpassword123')
+        self.customer = user.customer
+        self.client.force_login(user)
+
+    def seed(self, size):
+        super().seed(size)
+        products = list(Product.objects.all()[:size])
+        for i in range(Order.objects.count(), size):
+            order = Order.objects.create(
+                customer=self.customer, first_name='A', last_name='B', email='a@example.com',
+                address='1 rue du Test', postal_code='20000', city='Casablanca'
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, price=product.price, quantity=1)
+                for product in products
+            ])
+            order.update_total_cost()
+
+    def test_order_history(self):
+        self.assertQueriesConstant(reverse('orders:order_history'))
+
+    def test_order_detail(self):
+        self.assertQueriesConstant(lambda: reverse('orders:order_detail', args=[Order.objects.first().pk]))
+
+
+class DefaultSeedQueryBudgetTests(QueryBudgetTestCase):
+    """Budget mesuré avec le catalogue généré par défaut"""
+
+    def test_product_list(self):
+        self.assertQueriesConstant(reverse('products:product_list'))
+        self.assertEqual(Product.objects.count(), self.seed_sizes[-1])
+
+
+class AuthenticationTests(QueryBudgetTestCase):
     """Test des fonctionnalités d'authentification"""
-    print("\n🔐 Test des fonctionnalités d'authentification...")
-    
-    client = Client()
-    
-    try:
-        # Test inscription
-        response = client.post(reverse('customers:register'), {
+
+    def test_register_and_login(self):
+        response = self.client.post(reverse('customers:register'), {
             'username': 'newtestuser',
             'email': 'newtest@example.com',
             'password1': 'complexpassword123',
@@ -177,109 +252,111 @@ def test_authentication():
             'phone_number': '0987654321',
             'address': '456 New Street'
         })
-        
-        if response.status_code in [200, 302]:  # 302 = redirection après succès
-            print("✅ Inscription : OK")
-        else:
-            print(f"❌ Inscription : Status {response.status_code}")
-            return False
-        
-        # Test connexion
-        response = client.post(reverse('customers:login'), {
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Customer.objects.filter(user__username='newtestuser').exists())
+
+        self.client.logout()
+        response = self.client.post(reverse('customers:login'), {
             'username': 'newtestuser',
             'password': 'complexpassword123'
         })
-        
-        if response.status_code in [200, 302]:
-            print("✅ Connexion : OK")
-        else:
-            print(f"❌ Connexion : Status {response.status_code}")
-            return False
-        
-    except Exception as e:
-        print(f"❌ Test d'authentification : {e}")
-        return False
-    
-    return True
-
-
-def test_admin_functionality():
+        self.assertEqual(response.status_code, 302)
+
+    def test_profile(self):
+        user = User.objects.create_user(username='profile', password='complexpassword123')
+        self.client.force_login(user)
+        self.assertWithinBudget(reverse('customers:profile'))
+
+
+class AdminQueryBudgetTests(CatalogSeedMixin, QueryBudgetTestCase):
     """Test des fonctionnalités d'administration"""
-    print("\n⚙️ Test des fonctionnalités d'administration...")
-    
-    try:
-        # Créer un superutilisateur
-        admin_user = User.objects.create_superuser(
+
+    def setUp(self):
+        super().setUp()
+        self.admin_user = User.objects.create_superuser(
             username='admin',
             email='admin@example.com',
             password='adminpass123'
         )
-        
-        client = Client()
-        client.login(username='admin', password='adminpass123')
-        
-        # Test accès aux pages d'administration
-        admin_urls = [
-            'products:product_manage_list',
-            'products:category_list',
-            'products:product_create',
-            'products:category_create',
-        ]
-        
-        for url_name in admin_urls:
-            response = client.get(reverse(url_name))
-            if response.status_code == 200:
-                print(f"✅ Page admin {url_name} : OK")
-            else:
-                print(f"❌ Page admin {url_name} : Status {response.status_code}")
-                return False
-        
-    except Exception as e:
-        print(f"❌ Test d'administration : {e}")
-        return False
-    
-    return True
+        self.customer = self.admin_user.customer
+        self.client.force_login(self.admin_user)
+
+    def seed(self, size):
+        super().seed(size)
+        for i in range(Order.objects.count(), size):
+            order = Order.objects.create(
+                customer=self.customer,
+                first_name='Admin',
+                last_name='User',
+                email='admin@example.com',
+                address='1 rue du Test',
+                postal_code='20000',
+                city='Casablanca'
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=self.product, price=self.product.price, quantity=2),
+                OrderItem(order=order, product=self.product, price=Decimal('10.00'), quantity=1),
+            ])
+
+    def test_product_manage_list(self):
+        self.assertQueriesConstant(reverse('products:product_manage_list'))
+
+    def test_category_list(self):
+        self.assertQueriesConstant(reverse('products:category_list'))
+
+    def test_manage_forms(self):
+        self.assertWithinBudget(reverse('products:product_create'))
+        self.assertWithinBudget(reverse('products:category_create'))
+
+    def test_admin_order_changelist(self):
+        self.assertQueriesConstant(reverse('admin:orders_order_changelist'))
+
+    def test_admin_product_changelist(self):
+        self.assertQueriesConstant(reverse('admin:products_product_changelist'))
+
+    def test_admin_order_total(self):
+        self.seed(1)
+        order = Order.objects.get()
+        self.assertEqual(order.get_total_cost(), Decimal('110.00'))
+
+
+class WriteBufferTests(TestCase):
+    """Écritures différées restant en file à l'arrêt du processus"""
+
+    def setUp(self):
+        flush_buffers()
+        SearchLog.objects.all().delete()
+
+    def test_pending_entries_written_at_exit(self):
+        search_log.add(SearchLog.CATALOG, 'oud', 3, time.perf_counter())
+        view_buffer.add(self.product().pk)
+        flush_buffers_at_exit()
+        self.assertEqual(SearchLog.objects.get().query, 'oud')
+        self.assertEqual(Product.objects.get().view_count, 1)
+        self.assertEqual(len(search_log) + len(view_buffer), 0)
+
+    def test_entries_for_another_database_dropped_at_exit(self):
+        search_log.add(SearchLog.CATALOG, 'oud', 3, time.perf_counter())
+        with mock.patch('parfumerie.buffers._database', return_value='autre.sqlite3'):
+            flush_buffers_at_exit()
+        self.assertFalse(SearchLog.objects.exists())
+        self.assertEqual(len(search_log), 0)
+
+    def product(self):
+        category = Category.objects.create(name="Boisés", slug="boises")
+        return Product.objects.create(category=category, name="Oud", slug="oud", price=Decimal('90.00'))
 
 
 def main():
-    """Fonction principale de test"""
-    print("🚀 Démarrage des tests de la plateforme e-commerce\n")
-    
-    tests = [
-        test_models,
-        test_urls,
-        test_cart_functionality,
-        test_authentication,
-        test_admin_functionality,
-    ]
-    
-    passed = 0
-    failed = 0
-    
-    for test in tests:
-        try:
-            if test():
-                passed += 1
-            else:
-                failed += 1
-        except Exception as e:
-            print(f"❌ Erreur lors du test : {e}")
-            failed += 1
-    
-    print(f"\n📊 Résultats des tests:")
-    print(f"✅ Tests réussis : {passed}")
-    print(f"❌ Tests échoués : {failed}")
-    print(f"📈 Taux de réussite : {(passed/(passed+failed)*100):.1f}%")
-    
-    if failed == 0:
-        print("\n🎉 Tous les tests sont passés avec succès!")
-        return True
-    else:
-        print(f"\n⚠️ {failed} test(s) ont échoué. Veuillez vérifier les erreurs ci-dessus.")
-        return False
+    """Lancer les tests avec le runner de Django"""
+    from django.conf import settings
+    from django.test.utils import get_runner
+
+    runner = get_runner(settings)(verbosity=2)
+    failures = runner.run_tests(['test_functionality'])
+    return failures == 0
 
 
 if __name__ == '__main__':
     success = main()
     sys.exit(0 if success else 1)
-